@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+'''
+description:    Benchmark the daily archive step (cylc/archive.py) on
+                synthetic WRF output, reporting wall clock time and peak
+                memory of every step as json
+license:        APACHE 2.0
+'''
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from wrfpy import utils
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_wrf import generate  # noqa: E402
+
+STARTDATE = datetime(2017, 1, 1)
+
+
+def write_config(basedir, ndoms, options_archive):
+    '''
+    Write config.json and namelist.input for the archive step
+    '''
+    for subdir in ['run', 'archive']:
+        utils._create_directory(os.path.join(basedir, subdir))
+    namelist = os.path.join(basedir, 'namelist.input')
+    with open(namelist, 'w') as outfile:
+        outfile.write('&domains\n max_dom = %i\n/\n' % ndoms)
+    config = {
+        'filesystem': {'wrf_run_dir': os.path.join(basedir, 'run'),
+                       'archive_dir': os.path.join(basedir, 'archive'),
+                       'work_dir': basedir},
+        'options_general': {'date_start': STARTDATE.strftime('%Y-%m-%d_%H'),
+                            'date_end': (STARTDATE + timedelta(days=1)
+                                         ).strftime('%Y-%m-%d_%H'),
+                            'boundary_interval': 1, 'run_hours': '24'},
+        'options_wrf': {'namelist.input': namelist},
+        'options_wps': {'namelist.wps': os.path.join(
+            utils.get_wrfpy_path(), 'examples', 'namelist.wps'),
+                        'run_hours': '24'},
+        'options_wrfda': {'wrfda': ''},
+        'options_upp': {'upp': ''},
+        'options_urbantemps': {},
+        'options_archive': options_archive}
+    with open(os.path.join(basedir, 'config.json'), 'w') as outfile:
+        json.dump(config, outfile, indent=4)
+
+
+def load_archive():
+    '''
+    Import the cylc archive task script as a module
+    '''
+    path = os.path.join(utils.get_wrfpy_path(), 'cylc', 'archive.py')
+    spec = importlib.util.spec_from_file_location('wrfpy_cylc_archive', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def profile(function):
+    '''
+    Return wall clock time and peak traced memory of a function call.
+    Only memory allocated in this process is traced, not in workers.
+    '''
+    tracemalloc.start()
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': elapsed, 'peak_memory_mb': peak / 1024.**2}
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, filename))
+               for root, _, files in os.walk(path) for filename in files)
+
+
+def main(args):
+    domains = [tuple(int(size) for size in domain.split('x'))
+               for domain in args.domains.split(',')]
+    basedir = tempfile.mkdtemp(prefix='wrfpy_archive_benchmark_')
+    try:
+        write_config(basedir, len(domains),
+                     {'workers': args.workers, 'transfer': args.transfer})
+        os.environ['CYLC_SUITE_DEF_PATH'] = basedir
+        archive = load_archive()
+        post = archive.postprocess(STARTDATE, STARTDATE + timedelta(days=1),
+                                   run=False)
+        input_size = generate(post.rundir, STARTDATE, post.hour_var,
+                              post.minute_var, post.static_var,
+                              post.deac_var, domains=domains,
+                              levels=args.levels,
+                              wrfvar_size=args.wrfvar_size)
+        steps = {}
+        for step in ['archive', 'archive_wrfvar_input', 'archive_static',
+                     'cleanup']:
+            steps[step] = profile(getattr(post, step))
+        steps['archive']['throughput_mb_s'] = (
+            input_size / 1024.**2 / steps['archive']['seconds'])
+        report = {'date': datetime.now().isoformat(),
+                  'python': platform.python_version(),
+                  'numpy': np.__version__,
+                  'domains': domains,
+                  'levels': args.levels,
+                  'workers': args.workers,
+                  'transfer': args.transfer,
+                  'input_size_mb': input_size / 1024.**2,
+                  'archive_size_mb': directory_size(
+                      post.config['filesystem']['archive_dir']) / 1024.**2,
+                  'steps': steps}
+    finally:
+        if not args.keep:
+            shutil.rmtree(basedir)
+    output = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            outfile.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmark the archive step on synthetic WRF output')
+    parser.add_argument('--domains', default='60x60,60x60,60x60',
+                        help='comma separated ny x nx of the nested domains')
+    parser.add_argument('--levels', type=int, default=10,
+                        help='number of vertical levels')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of archive worker processes')
+    parser.add_argument('--transfer', default='copy',
+                        help='transfer strategy for wrfvar_input files')
+    parser.add_argument('--wrfvar-size', type=float, default=1,
+                        help='size of each wrfvar_input file in MB')
+    parser.add_argument('--output', help='write json report to file')
+    parser.add_argument('--keep', action='store_true',
+                        help='keep the generated files')
+    main(parser.parse_args())
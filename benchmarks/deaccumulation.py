@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+'''
+description:    Benchmark deaccumulation and time axis construction of the
+                archive step for a full day of minute data
+license:        APACHE 2.0
+'''
+
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas
+from netCDF4 import date2num
+
+from wrfpy.timeseries import deaccumulator, time_axis
+
+UNITS = 'minutes since 2010-01-01 00:00:00'
+
+
+def slabs(ny, nx, nslabs=12, records=121):
+    '''
+    Generate 2-hourly slabs of an accumulated minute variable, the first
+    record of each slab repeats the last record of the previous slab
+    '''
+    rng = np.random.RandomState(0)
+    last = np.zeros((ny, nx), dtype='f4')
+    for _ in range(nslabs):
+        slab = np.empty((records, ny, nx), dtype='f4')
+        slab[0] = last
+        slab[1:] = last + np.cumsum(
+            rng.rand(records - 1, ny, nx).astype('f4'), axis=0)
+        last = slab[-1]
+        yield slab
+
+
+def deaccumulate_vstack(ny, nx):
+    '''
+    Deaccumulation by growing the output with np.vstack
+    '''
+    for tmp in slabs(ny, nx):
+        try:
+            output = np.vstack((output, np.diff(tmp, axis=0)))
+        except NameError:
+            output = np.vstack((tmp[0, :][np.newaxis, :],
+                                np.diff(tmp, axis=0)))
+    return output
+
+
+def deaccumulate_engine(ny, nx):
+    '''
+    Deaccumulation with wrfpy.timeseries.deaccumulator into a
+    preallocated output array
+    '''
+    deaccumulate = deaccumulator()
+    output = np.empty((12 * 120 + 1, ny, nx), dtype='f4')
+    tidx = 0
+    for tmp in slabs(ny, nx):
+        increments = deaccumulate(tmp)
+        output[tidx:tidx + len(increments)] = increments
+        tidx += len(increments)
+    return output
+
+
+def time_axis_loop(dt):
+    return [date2num(d.to_pydatetime(), units=UNITS, calendar='gregorian')
+            for d in dt]
+
+
+def timeit(function, *args, repeat=3):
+    '''
+    Return best wall clock time of repeat calls and the last result
+    '''
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(ny, nx, repeat):
+    # generating the input slabs is part of both timings
+    t_gen, _ = timeit(lambda: [s for s in slabs(ny, nx)], repeat=repeat)
+    t_vstack, reference = timeit(deaccumulate_vstack, ny, nx, repeat=repeat)
+    t_engine, result = timeit(deaccumulate_engine, ny, nx, repeat=repeat)
+    assert np.array_equal(reference, result)
+    dt = pandas.date_range('2017-01-01', '2017-01-02', freq='1min')
+    t_loop, reference = timeit(time_axis_loop, dt, repeat=repeat)
+    t_vector, result = timeit(time_axis, dt, UNITS, repeat=repeat)
+    assert np.allclose(reference, result)
+    report = {'grid': [ny, nx],
+              'records': len(dt),
+              'deaccumulate_vstack_s': t_vstack - t_gen,
+              'deaccumulate_engine_s': t_engine - t_gen,
+              'time_axis_loop_s': t_loop,
+              'time_axis_vectorised_s': t_vector}
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmark deaccumulation of a day of minute data')
+    parser.add_argument('--ny', type=int, default=150,
+                        help='number of gridpoints in south_north direction')
+    parser.add_argument('--nx', type=int, default=150,
+                        help='number of gridpoints in west_east direction')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of repetitions, best time is reported')
+    args = parser.parse_args()
+    main(args.ny, args.nx, args.repeat)
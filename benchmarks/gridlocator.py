@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+'''
+description:    Benchmark the nearest gridpoint search of bumpskin for a
+                large number of observation stations
+license:        APACHE 2.0
+'''
+
+import argparse
+import json
+import time
+
+import numpy as np
+from geopy.distance import vincenty
+
+from wrfpy.gridlocator import gridlocator
+
+
+def grid(ny, nx):
+    '''
+    Rotated curvilinear grid of roughly 1 km
+    '''
+    y, x = np.meshgrid(np.arange(ny), np.arange(nx), indexing='ij')
+    lat = (50 + 0.009 * y + 0.002 * x).astype('f4')
+    lon = (3 + 0.014 * x - 0.003 * y).astype('f4')
+    return lat, lon
+
+
+def find_gridpoint_scan(lat_in, lon_in, lat, lon):
+    '''
+    Original search, vincenty distance to every gridpoint in the window.
+    Returns indices and distance of the closest gridpoint.
+    '''
+    window = ((lon >= lon_in - 0.10) & (lon <= lon_in + 0.10) &
+              (lat >= lat_in - 0.10) & (lat <= lat_in + 0.10))
+    if not window.any():
+        return -1, -1, np.nan
+    distance = [vincenty((lat_in, lon_in), (la, lo)).km
+                for la, lo in zip(lat[window], lon[window])]
+    # the original lookup of the index by latitude value, the first
+    # gridpoint with an equal latitude is not necessarily the closest
+    lat.reshape(-1).tolist().index(lat[window][np.argmin(distance)])
+    i_idx, j_idx = np.unravel_index(np.flatnonzero(window)[
+        np.argmin(distance)], np.shape(lat))
+    return i_idx, j_idx, min(distance)
+
+
+def main(ny, nx, stations, scan_stations):
+    lat, lon = grid(ny, nx)
+    rng = np.random.RandomState(0)
+    lat_in = rng.uniform(lat.min(), lat.max(), stations)
+    lon_in = rng.uniform(lon.min(), lon.max(), stations)
+    start = time.perf_counter()
+    locator = gridlocator(lat, lon)
+    t_build = time.perf_counter() - start
+    start = time.perf_counter()
+    i_idx, j_idx, _ = locator.query(lat_in, lon_in)
+    t_query = time.perf_counter() - start
+    # the original search is only timed for a subset of the stations
+    start = time.perf_counter()
+    reference = [find_gridpoint_scan(lat_in[n], lon_in[n], lat, lon)
+                 for n in range(scan_stations)]
+    t_scan = (time.perf_counter() - start) * stations / scan_stations
+    # near ties can resolve differently on the sphere and the ellipsoid,
+    # report the extra vincenty distance of the selected gridpoint
+    mismatch = 0
+    penalty = 0.
+    for n, (i_ref, j_ref, d_ref) in enumerate(reference):
+        if (i_idx[n], j_idx[n]) != (i_ref, j_ref):
+            mismatch += 1
+            penalty = max(penalty, vincenty(
+                (lat_in[n], lon_in[n]),
+                (lat[i_idx[n], j_idx[n]], lon[i_idx[n], j_idx[n]])).km - d_ref)
+    report = {'grid': [ny, nx],
+              'stations': stations,
+              'kdtree_build_s': t_build,
+              'kdtree_query_s': t_query,
+              'scan_estimated_s': t_scan,
+              'scan_stations': scan_stations,
+              'mismatches': mismatch,
+              'max_mismatch_distance_km': penalty}
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmark nearest gridpoint search')
+    parser.add_argument('--ny', type=int, default=300,
+                        help='number of gridpoints in south_north direction')
+    parser.add_argument('--nx', type=int, default=300,
+                        help='number of gridpoints in west_east direction')
+    parser.add_argument('--stations', type=int, default=5000,
+                        help='number of stations')
+    parser.add_argument('--scan-stations', type=int, default=100,
+                        help='number of stations timed with the original '
+                             'search')
+    args = parser.parse_args()
+    main(args.ny, args.nx, args.stations, args.scan_stations)
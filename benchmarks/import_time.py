@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+'''
+description:    Benchmark the import time of the cylc task scripts, every
+                script is imported in a fresh interpreter like a cylc task
+license:        APACHE 2.0
+'''
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+
+from wrfpy import utils
+
+# import the script as a module, without running its main block
+LOADER = '''
+import importlib.util
+spec = importlib.util.spec_from_file_location('cylc_task', {script!r})
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+'''
+
+
+def run(code):
+    '''
+    Run code in a fresh interpreter with -X importtime, return wall clock
+    time, return code and stderr
+    '''
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                             stdout=subprocess.DEVNULL,
+                             stderr=subprocess.PIPE, universal_newlines=True)
+    return time.perf_counter() - start, process.returncode, process.stderr
+
+
+def slowest_imports(stderr, number):
+    '''
+    Return the top level imports with the largest cumulative import time
+    in ms from -X importtime output
+    '''
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # nested imports are indented
+        if not name.startswith('  '):
+            imports.append((name.strip(), int(cumulative) / 1000.))
+    return dict(sorted(imports, key=lambda item: -item[1])[:number])
+
+
+def benchmark(script, repeat, number):
+    '''
+    Return best wall clock time and slowest imports of a cylc script
+    '''
+    code = LOADER.format(script=script)
+    best = None
+    for _ in range(repeat):
+        elapsed, returncode, stderr = run(code)
+        if returncode:
+            # missing optional dependency or other error on import
+            return {'error': stderr.strip().splitlines()[-1]}
+        if best is None or elapsed < best[0]:
+            best = (elapsed, stderr)
+    return {'seconds': best[0],
+            'slowest_imports_ms': slowest_imports(best[1], number)}
+
+
+def main(scripts, repeat, number, output):
+    if not scripts:
+        scripts = sorted(glob.glob(os.path.join(utils.get_wrfpy_path(),
+                                                'cylc', '*.py')))
+    # startup time of the interpreter itself
+    interpreter = min(run('pass')[0] for _ in range(repeat))
+    report = {'python': sys.version.split()[0],
+              'interpreter_seconds': interpreter,
+              'scripts': {os.path.basename(script):
+                          benchmark(script, repeat, number)
+                          for script in scripts}}
+    report = json.dumps(report, indent=4)
+    if output:
+        with open(output, 'w') as outfile:
+            outfile.write(report)
+    print(report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmark import time of the cylc task scripts')
+    parser.add_argument('scripts', nargs='*',
+                        help='scripts to benchmark, default all cylc scripts')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of repetitions, best time is reported')
+    parser.add_argument('--number', type=int, default=5,
+                        help='number of slowest imports reported')
+    parser.add_argument('--output', help='write json report to file')
+    args = parser.parse_args()
+    main(args.scripts, args.repeat, args.number, args.output)
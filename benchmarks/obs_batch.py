@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+'''
+description:    Benchmark extracting urban station observations for all
+                cycles of a hindcast period
+license:        APACHE 2.0
+'''
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from netCDF4 import Dataset
+
+from wrfpy import readObsTemperature as obsmodule
+
+
+def write_stations(directory, stations, days):
+    '''
+    Station files with one observation per minute
+    '''
+    rng = np.random.RandomState(0)
+    times = np.arange(0, days * 86400, 60, dtype=np.float64)
+    filelist = []
+    for n in range(stations):
+        filename = os.path.join(directory, 'station%05i.nc' % n)
+        ncfile = Dataset(filename, 'w')
+        ncfile.stationtype = ['netatmo', 'davis'][n % 2]
+        ncfile.createDimension('time', len(times))
+        ncfile.createDimension('location', 1)
+        ncfile.createVariable('latitude', 'f8', ('location',))[:] = (
+            52.3 + 0.1 * rng.rand())
+        ncfile.createVariable('longitude', 'f8', ('location',))[:] = (
+            4.9 + 0.1 * rng.rand())
+        dt = ncfile.createVariable('time', 'f8', ('time',))
+        dt.units = 'seconds since 2017-01-01 00:00:00'
+        dt.calendar = 'gregorian'
+        dt[:] = times + rng.randint(0, 60)
+        ncfile.createVariable('temperature', 'f4', ('time',))[:] = (
+            280 + rng.rand(len(times)))
+        ncfile.close()
+        filelist.append(filename)
+    return filelist
+
+
+def main(stations, days, interval, workers, pool):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        filelist = write_stations(tmpdir, stations, days)
+        dates = [datetime(2017, 1, 1, 1) + timedelta(hours=interval * n)
+                 for n in range(int((days * 24 - 2) // interval))]
+        obs = obsmodule.readObsTemperature.__new__(
+            obsmodule.readObsTemperature)
+        obs.config = {'options_urbantemps': {'workers': workers,
+                                             'pool': pool}}
+        obs.filelist = filelist
+        obs.nstationtypes = None
+        obs.dstationtypes = ['davis']
+        # start the pool before timing
+        obs.obs_temp_p(dates[0])
+        start = time.perf_counter()
+        reference = []
+        for dtobj in dates:
+            obs.obs_temp_p(dtobj)
+            reference.append(obs.obs)
+        t_cycles = time.perf_counter() - start
+        start = time.perf_counter()
+        result = obs.obs_times_p(dates)
+        t_batch = time.perf_counter() - start
+    finally:
+        shutil.rmtree(tmpdir)
+        for workerpool in obsmodule.pools.values():
+            workerpool.close()
+            workerpool.join()
+            workerpool.clear()
+    report = {'stations': stations,
+              'days': days,
+              'cycles': len(dates),
+              'workers': workers,
+              'pool': pool,
+              'per_cycle_total_s': t_cycles,
+              'batch_total_s': t_batch,
+              'identical': result == reference}
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmark station observations for many cycles')
+    parser.add_argument('--stations', type=int, default=200,
+                        help='number of station files')
+    parser.add_argument('--days', type=int, default=30,
+                        help='days of minute observations per station')
+    parser.add_argument('--interval', type=int, default=2,
+                        help='hours between cycles')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='number of workers of the pool')
+    parser.add_argument('--pool', default='process',
+                        choices=['process', 'thread'],
+                        help='kind of pool')
+    args = parser.parse_args()
+    main(args.stations, args.days, args.interval, args.workers, args.pool)
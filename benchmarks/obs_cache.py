@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+'''
+description:    Benchmark reading the per-cycle station observation cache
+                of readObsTemperature in csv and binary format
+license:        APACHE 2.0
+'''
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from wrfpy.readObsTemperature import readObsTemperature
+
+
+def main(stations, repeat):
+    rng = np.random.RandomState(0)
+    obs = [(52.3 + 0.1 * rng.rand(), 4.9 + 0.1 * rng.rand(),
+            np.float32(280 + rng.rand()), ['netatmo', 'davis'][n % 2],
+            '/data/urban_stations/station%05i.nc' % n)
+           for n in range(stations)]
+    tmpdir = tempfile.mkdtemp()
+    try:
+        reader = readObsTemperature.__new__(readObsTemperature)
+        reader.wrf_rundir = tmpdir
+        reader.cache_files('2017-01-01_00:00:00')
+        reader.obs = obs
+        timings = {}
+        for fmt, write, read in [('csv', reader.write_csv, reader.read_csv),
+                                 ('binary', reader.write_cache,
+                                  reader.read_cache)]:
+            start = time.perf_counter()
+            write('2017-01-01_00:00:00')
+            timings[fmt + '_write_s'] = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in range(repeat):
+                read('2017-01-01_00:00:00')
+            timings[fmt + '_read_s'] = (time.perf_counter() - start) / repeat
+            timings[fmt + '_bytes'] = os.path.getsize(
+                reader.csvfile if fmt == 'csv' else reader.cachefile)
+            timings[fmt + '_rows'] = len(reader.obs)
+            reader.obs = obs
+    finally:
+        shutil.rmtree(tmpdir)
+    report = {'stations': stations}
+    report.update(timings)
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmark observation cache formats')
+    parser.add_argument('--stations', type=int, default=5000,
+                        help='number of stations in the table')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='number of reads timed')
+    args = parser.parse_args()
+    main(args.stations, args.repeat)
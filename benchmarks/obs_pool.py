@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+'''
+description:    Benchmark reading urban station observations in parallel
+                with readObsTemperature.obs_temp_p
+license:        APACHE 2.0
+'''
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+from netCDF4 import Dataset
+
+from wrfpy import readObsTemperature as obsmodule
+
+
+def write_stations(directory, stations, days):
+    '''
+    Station files with one observation per minute
+    '''
+    rng = np.random.RandomState(0)
+    times = np.arange(0, days * 86400, 60, dtype=np.float64)
+    filelist = []
+    for n in range(stations):
+        filename = os.path.join(directory, 'station%05i.nc' % n)
+        ncfile = Dataset(filename, 'w')
+        ncfile.stationtype = ['netatmo', 'davis'][n % 2]
+        ncfile.createDimension('time', len(times))
+        ncfile.createDimension('location', 1)
+        ncfile.createVariable('latitude', 'f8', ('location',))[:] = (
+            52.3 + 0.1 * rng.rand())
+        ncfile.createVariable('longitude', 'f8', ('location',))[:] = (
+            4.9 + 0.1 * rng.rand())
+        dt = ncfile.createVariable('time', 'f8', ('time',))
+        dt.units = 'seconds since 2017-01-01 00:00:00'
+        dt.calendar = 'gregorian'
+        dt[:] = times + rng.randint(0, 60)
+        ncfile.createVariable('temperature', 'f4', ('time',))[:] = (
+            280 + rng.rand(len(times)))
+        ncfile.close()
+        filelist.append(filename)
+    return filelist
+
+
+def reader(filelist, options):
+    '''
+    readObsTemperature instance without reading config.json, the config
+    dictionary is padded to the size of a typical config.json
+    '''
+    obs = obsmodule.readObsTemperature.__new__(
+        obsmodule.readObsTemperature)
+    obs.config = {'options_urbantemps': options,
+                  'padding': {str(n): 'x' * 64 for n in range(200)}}
+    obs.filelist = filelist
+    obs.nstationtypes = None
+    obs.dstationtypes = ['davis']
+    return obs
+
+
+def obs_temp_p_fresh(obs, dtobj):
+    '''
+    Original implementation: a new pool per call and one task per
+    station file, each pickling the readObsTemperature instance
+    '''
+    from pathos.multiprocessing import ProcessPool as Pool
+    obs.dtobjP = dtobj
+    pool = Pool(nodes=int(obs.config['options_urbantemps']['workers']))
+    result = pool.map(obs.obs_temp, obs.filelist)
+    pool.close()
+    pool.join()
+    pool.clear()
+    return [ob for ob in result if ob is not None]
+
+
+def timed(function, calls):
+    '''
+    Return result of the last call and the time of each call
+    '''
+    times = []
+    for call in range(calls):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return result, times
+
+
+def main(counts, days, workers, calls):
+    dtobj = datetime(2017, 1, 1, 12)
+    report = {'days': days, 'workers': workers, 'calls': calls,
+              'cpus': os.cpu_count(), 'results': []}
+    for count in counts:
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filelist = write_stations(tmpdir, count, days)
+            entry = {'stations': count}
+            obs = reader(filelist, {'workers': workers})
+            reference, entry['fresh_pool_s'] = timed(
+                lambda: obs_temp_p_fresh(obs, dtobj), calls)
+            for kind in ['process', 'thread']:
+                obs = reader(filelist, {'workers': workers, 'pool': kind})
+
+                def run():
+                    obs.obs_temp_p(dtobj)
+                    return obs.obs
+                result, entry[kind + '_pool_s'] = timed(run, calls)
+                entry[kind + '_identical'] = (
+                    [ob[4] for ob in result] == [ob[4] for ob in reference])
+            report['results'].append(entry)
+        finally:
+            shutil.rmtree(tmpdir)
+    for pool in obsmodule.pools.values():
+        pool.close()
+        pool.join()
+        pool.clear()
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmark parallel reading of station observations')
+    parser.add_argument('--stations', type=int, nargs='+',
+                        default=[100, 1000, 5000],
+                        help='numbers of station files')
+    parser.add_argument('--days', type=int, default=7,
+                        help='days of minute observations per station')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='number of workers of the pools')
+    parser.add_argument('--calls', type=int, default=2,
+                        help='number of calls timed, the first call '
+                             'includes starting the pool')
+    args = parser.parse_args()
+    main(args.stations, args.days, args.workers, args.calls)
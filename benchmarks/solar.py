@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+'''
+description:    Benchmark the day/night station type selection of
+                readObsTemperature for a large number of stations
+license:        APACHE 2.0
+'''
+
+import argparse
+import json
+import time
+from datetime import datetime
+
+import astral
+import numpy as np
+
+from wrfpy.readObsTemperature import station_mask
+
+
+def use_station_astral(lat, lon, stationtype, dtobj, nstationtypes,
+                       dstationtypes):
+    '''
+    Original selection, an astral Location per station
+    '''
+    loc = astral.Location(info=('name', 'region', lat, lon, 'UTC', 0))
+    if loc.solar_elevation(dtobj) > 0:
+        types = dstationtypes
+    else:
+        types = nstationtypes
+    if not types:
+        return True
+    return any([x.lower() in stationtype.lower() for x in types])
+
+
+def main(stations, repeat):
+    rng = np.random.RandomState(0)
+    lat = rng.uniform(50, 54, stations)
+    lon = rng.uniform(3, 7, stations)
+    stationtypes = [['netatmo', 'davis vantage'][n % 2]
+                    for n in range(stations)]
+    nstationtypes = ['netatmo', 'davis']
+    dstationtypes = ['davis']
+    dates = [datetime(2017, 6, 21, hour) for hour in range(0, 24, 6)]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        masks = [station_mask(lat, lon, stationtypes, dtobj, nstationtypes,
+                              dstationtypes) for dtobj in dates]
+    t_vector = (time.perf_counter() - start) / (repeat * len(dates))
+    start = time.perf_counter()
+    reference = [[use_station_astral(la, lo, st, dtobj, nstationtypes,
+                                     dstationtypes)
+                  for la, lo, st in zip(lat, lon, stationtypes)]
+                 for dtobj in dates]
+    t_astral = (time.perf_counter() - start) / len(dates)
+    mismatch = int(sum(np.sum(mask != ref) for mask, ref in
+                       zip(masks, reference)))
+    report = {'stations': stations,
+              'cycles': len(dates),
+              'vectorised_per_cycle_s': t_vector,
+              'astral_per_cycle_s': t_astral,
+              'mismatches': mismatch}
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmark day/night station type selection')
+    parser.add_argument('--stations', type=int, default=1000,
+                        help='number of stations')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='number of repetitions of the vectorised '
+                             'selection')
+    args = parser.parse_args()
+    main(args.stations, args.repeat)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+'''
+description:    Benchmark selecting urban station observations per cycle
+                from the station files and from the station store
+license:        APACHE 2.0
+'''
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from netCDF4 import Dataset, date2num
+
+from wrfpy.readObsTemperature import select_time
+from wrfpy.stationstore import ingest, stationstore
+
+
+def write_stations(directory, stations, days):
+    '''
+    Station files with one observation per minute
+    '''
+    rng = np.random.RandomState(0)
+    times = np.arange(0, days * 86400, 60, dtype=np.float64)
+    filelist = []
+    for n in range(stations):
+        filename = os.path.join(directory, 'station%05i.nc' % n)
+        ncfile = Dataset(filename, 'w')
+        ncfile.stationtype = 'netatmo'
+        ncfile.createDimension('time', len(times))
+        ncfile.createDimension('location', 1)
+        ncfile.createVariable('latitude', 'f8', ('location',))[:] = (
+            52.3 + 0.1 * rng.rand())
+        ncfile.createVariable('longitude', 'f8', ('location',))[:] = (
+            4.9 + 0.1 * rng.rand())
+        dt = ncfile.createVariable('time', 'f8', ('time',))
+        dt.units = 'seconds since 2017-01-01 00:00:00'
+        dt.calendar = 'gregorian'
+        dt[:] = times + rng.randint(0, 60)
+        ncfile.createVariable('temperature', 'f4', ('time',))[:] = (
+            280 + rng.rand(len(times)))
+        ncfile.close()
+        filelist.append(filename)
+    return filelist
+
+
+def obs_scan(filelist, dtobj):
+    '''
+    Original selection, every station file is opened and its full time
+    axis is read (without the day/night station type filter)
+    '''
+    obs = []
+    for filename in filelist:
+        with Dataset(filename, 'r') as ncfile:
+            lat = ncfile.variables['latitude'][0]
+            lon = ncfile.variables['longitude'][0]
+            dt = ncfile.variables['time']
+            idx = select_time(dt[:], date2num(dtobj, units=dt.units,
+                                              calendar=dt.calendar))
+            if idx is None:
+                continue
+            obs.append((lat, lon, ncfile.variables['temperature'][idx]))
+    return obs
+
+
+def main(stations, days, cycles):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        filelist = write_stations(tmpdir, stations, days)
+        storedir = os.path.join(tmpdir, 'store')
+        dates = [datetime(2017, 1, 1, 1) + timedelta(
+            hours=(days * 24 - 2) * n / float(cycles)) for n in range(cycles)]
+        start = time.perf_counter()
+        ingest(storedir, filelist)
+        t_ingest = time.perf_counter() - start
+        start = time.perf_counter()
+        reference = [obs_scan(filelist, dtobj) for dtobj in dates]
+        t_scan = (time.perf_counter() - start) / cycles
+        start = time.perf_counter()
+        store = stationstore(storedir)
+        t_open = time.perf_counter() - start
+        start = time.perf_counter()
+        selected = [store.select(dtobj) for dtobj in dates]
+        t_query = (time.perf_counter() - start) / cycles
+        mismatch = sum(
+            not np.array_equal([ob[2] for ob in ref], temperature)
+            for ref, (_, temperature) in zip(reference, selected))
+    finally:
+        shutil.rmtree(tmpdir)
+    report = {'stations': stations,
+              'days': days,
+              'cycles': cycles,
+              'ingest_s': t_ingest,
+              'scan_per_cycle_s': t_scan,
+              'store_open_s': t_open,
+              'store_query_per_cycle_s': t_query,
+              'mismatches': mismatch}
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmark station observation selection')
+    parser.add_argument('--stations', type=int, default=200,
+                        help='number of station files')
+    parser.add_argument('--days', type=int, default=30,
+                        help='days of minute observations per station')
+    parser.add_argument('--cycles', type=int, default=10,
+                        help='number of cycles timed')
+    args = parser.parse_args()
+    main(args.stations, args.days, args.cycles)
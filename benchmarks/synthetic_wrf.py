@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+'''
+description:    Generate synthetic per-variable WRF output files with the
+                naming expected by the archive step (cylc/archive.py)
+license:        APACHE 2.0
+'''
+
+import os
+from datetime import timedelta
+
+import numpy as np
+import pandas
+from netCDF4 import Dataset
+
+# variables with a vertical dimension, and the kind of vertical levels
+LEVEL_VARS = {'U': 'bottom_top', 'V': 'bottom_top', 'W': 'bottom_top_stag',
+              'PH': 'bottom_top_stag', 'PHB': 'bottom_top_stag',
+              'T': 'bottom_top', 'P': 'bottom_top', 'PB': 'bottom_top',
+              'P_HYD': 'bottom_top', 'QVAPOR': 'bottom_top',
+              'QCLOUD': 'bottom_top', 'QRAIN': 'bottom_top',
+              'QICE': 'bottom_top', 'QSNOW': 'bottom_top',
+              'QGRAUP': 'bottom_top', 'CLDFRA': 'bottom_top',
+              'TSLB': 'soil_layers', 'SMOIS': 'soil_layers',
+              'SMCREL': 'soil_layers', 'ZS': 'soil_layers',
+              'DZS': 'soil_layers'}
+SOIL_LAYERS = 4
+
+
+def var_shape(var, records, levels, ny, nx):
+    '''
+    Return shape of a WRF output variable, including staggering
+    '''
+    if var == 'U':
+        horizontal = [ny, nx + 1]
+    elif var == 'V':
+        horizontal = [ny + 1, nx]
+    else:
+        horizontal = [ny, nx]
+    vertical = {'bottom_top': [levels], 'bottom_top_stag': [levels + 1],
+                'soil_layers': [SOIL_LAYERS]}.get(LEVEL_VARS.get(var), [])
+    return [records] + vertical + horizontal
+
+
+def write_var(filename, var, data):
+    '''
+    Write a single variable to a netCDF file
+    '''
+    ncfile = Dataset(filename, 'w')
+    dims = []
+    for idx, size in enumerate(np.shape(data)):
+        ncfile.createDimension('dim%i' % idx, size)
+        dims.append('dim%i' % idx)
+    ncfile.createVariable(var, 'f4', dims)[:] = data
+    ncfile.close()
+
+
+def write_wrfout(filename, ny, nx, rng):
+    '''
+    Write wrfout file with the coordinates and urban fraction read by the
+    archive step
+    '''
+    ncfile = Dataset(filename, 'w')
+    ncfile.createDimension('Time', 1)
+    for name, size in [('south_north', ny), ('west_east', nx),
+                       ('south_north_stag', ny + 1),
+                       ('west_east_stag', nx + 1)]:
+        ncfile.createDimension(name, size)
+    lat, lon = np.meshgrid(52 + 0.01 * np.arange(ny + 1),
+                           4.8 + 0.01 * np.arange(nx + 1), indexing='ij')
+    variables = {'XLAT': ('south_north', 'west_east', lat[:-1, :-1]),
+                 'XLONG': ('south_north', 'west_east', lon[:-1, :-1]),
+                 'XLAT_U': ('south_north', 'west_east_stag', lat[:-1]),
+                 'XLONG_U': ('south_north', 'west_east_stag', lon[:-1]),
+                 'XLAT_V': ('south_north_stag', 'west_east', lat[:, :-1]),
+                 'XLONG_V': ('south_north_stag', 'west_east', lon[:, :-1]),
+                 'FRC_URB2D': ('south_north', 'west_east',
+                               rng.uniform(0.1, 0.9, (ny, nx)))}
+    for var, (ydim, xdim, data) in variables.items():
+        ncfile.createVariable(var, 'f4', ('Time', ydim, xdim))[:] = data
+    ncfile.close()
+
+
+def generate(rundir, startdate, hour_vars, minute_vars, static_vars,
+             deac_vars, domains=((60, 60), (60, 60), (60, 60)), levels=10,
+             wrfvar_size=1, minute_records=121, hour_records=3, seed=0):
+    '''
+    Generate a day of synthetic WRF output in rundir, starting at
+    startdate (datetime), for nested domains of shape (ny, nx):
+        - VAR_d0N_<date> files for every 2-hourly output period, with
+          minute output for minute_vars in the inner domain
+        - wrfout_d0N_<date> files with coordinates
+        - wrfvar_input_d0N_<date> files of wrfvar_size MB
+        - static VAR_d0N_<startdate> files
+    Accumulated variables (deac_vars) increase monotonically and the
+    first record of every file repeats the last record of the previous
+    file, like WRF output.
+    Returns the total size of the generated files in bytes.
+    '''
+    rng = np.random.RandomState(seed)
+    dates = pandas.date_range(startdate, startdate + timedelta(days=1),
+                              freq='2h')[:-1]
+    ndoms = len(domains)
+    for domain, (ny, nx) in enumerate(domains, start=1):
+        write_wrfout(os.path.join(rundir, 'wrfout_d0%i_%s' % (
+            domain, dates[0].strftime('%Y-%m-%d_%H:%M:%S'))), ny, nx, rng)
+        for var in static_vars:
+            write_var(os.path.join(rundir, '%s_d0%i_%s' % (
+                var, domain, dates[0].strftime('%Y-%m-%d_%H:%M:%S'))), var,
+                rng.rand(*var_shape(var, 1, levels, ny, nx)).astype('f4'))
+        last = {}  # last record of each variable in the previous file
+        for cdate in dates:
+            datestr = cdate.strftime('%Y-%m-%d_%H:%M:%S')
+            for var in hour_vars + minute_vars:
+                if var in minute_vars and domain == ndoms:
+                    records = minute_records
+                else:
+                    records = hour_records
+                shape = var_shape(var, records, levels, ny, nx)
+                if var in deac_vars:
+                    data = np.cumsum(rng.rand(*shape), axis=0,
+                                     dtype='f4') * 0.01
+                else:
+                    data = (280 + rng.rand(*shape)).astype('f4')
+                if var in last:
+                    if var in deac_vars:
+                        data += last[var] - data[0]
+                    data[0] = last[var]
+                last[var] = data[-1]
+                write_var(os.path.join(rundir, '%s_d0%i_%s' % (
+                    var, domain, datestr)), var, data)
+            with open(os.path.join(rundir, 'wrfvar_input_d0%i_%s' % (
+                    domain, datestr)), 'wb') as outfile:
+                outfile.write(os.urandom(int(wrfvar_size * 1024**2)))
+    return sum(os.path.getsize(os.path.join(rundir, filename))
+               for filename in os.listdir(rundir))
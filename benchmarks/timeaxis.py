@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+'''
+description:    Benchmark the time lookup in a station file with a long
+                record of observations
+license:        APACHE 2.0
+'''
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from netCDF4 import Dataset
+
+from wrfpy.readObsTemperature import select_time, timeaxis
+
+
+def write_station(filename, years, gaps):
+    '''
+    Station file with one observation per minute, optionally with
+    missing periods
+    '''
+    rng = np.random.RandomState(0)
+    times = np.arange(0, years * 365 * 86400, 60, dtype=np.float64)
+    if gaps:
+        # remove random periods of up to a week
+        keep = np.ones(len(times), dtype=bool)
+        for start in rng.randint(0, len(times), gaps):
+            keep[start:start + rng.randint(60, 7 * 1440)] = False
+        times = times[keep]
+    ncfile = Dataset(filename, 'w')
+    ncfile.createDimension('time', None)
+    dt = ncfile.createVariable('time', 'f8', ('time',))
+    dt.units = 'seconds since 2015-01-01 00:00:00'
+    dt[:] = times
+    ncfile.close()
+    return times
+
+
+def main(years, gaps, lookups):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmpdir, 'station.nc')
+        times = write_station(filename, years, gaps)
+        rng = np.random.RandomState(1)
+        values = rng.uniform(times[0], times[-1], lookups)
+        with Dataset(filename, 'r') as ncfile:
+            dt = ncfile.variables['time']
+            start = time.perf_counter()
+            reference = [select_time(dt[:], value) for value in values]
+            t_full = (time.perf_counter() - start) / lookups
+            reads = []
+            result = []
+            start = time.perf_counter()
+            for value in values:
+                axis = timeaxis(dt)
+                result.append(select_time(axis, value))
+                reads.append(axis.reads)
+            t_window = (time.perf_counter() - start) / lookups
+    finally:
+        shutil.rmtree(tmpdir)
+    report = {'years': years,
+              'times': len(times),
+              'gaps': gaps,
+              'lookups': lookups,
+              'full_read_per_lookup_s': t_full,
+              'full_read_values': len(times),
+              'windowed_per_lookup_s': t_window,
+              'windowed_values_mean': float(np.mean(reads)),
+              'windowed_values_max': int(np.max(reads)),
+              'mismatches': sum(a != b for a, b in zip(result, reference))}
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmark time lookup in station files')
+    parser.add_argument('--years', type=int, default=3,
+                        help='years of minute observations')
+    parser.add_argument('--gaps', type=int, default=50,
+                        help='number of missing periods')
+    parser.add_argument('--lookups', type=int, default=200,
+                        help='number of lookups timed')
+    args = parser.parse_args()
+    main(args.years, args.gaps, args.lookups)
@@ -26,7 +26,7 @@ setup(
         "License :: OSI Approved :: Apache Software License",
     ],
     install_requires=['numpy', 'Jinja2', 'MarkupSafe', 'PyYAML', 'f90nml',
-                      'python-dateutil', 'astropy', 'pathos', 'netCDF4',
+                      'python-dateutil', 'pathos', 'netCDF4',
                       'pyOpenSSL'],
 )
 
@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+
+"""
+description:    Tests for the archive module
+license:        APACHE 2.0
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+import pandas
+from netCDF4 import Dataset, num2date
+
+from wrfpy import utils
+from wrfpy.cylc.archive import postprocess, slabcache
+from wrfpy.manifest import manifest
+
+
+def archiver(ndoms=2, config=None):
+    """Return postprocess instance without reading config.json."""
+    post = postprocess.__new__(postprocess)
+    post.config = config or {}
+    post.ndoms = ndoms
+    post.define_vars_static()
+    post.define_vars_hourly()
+    post.define_vars_minute()
+    post.define_vars_deac()
+    post.define_vars_derived()
+    return post
+
+
+class TestArchive(unittest.TestCase):
+    """Tests for the archive module."""
+
+    def setUp(self):
+        utils.start_logging(os.devnull)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_chunk_shape(self):
+        """Test chunk shapes of hourly and minute output."""
+        hourly = [25, 40, 120, 150]
+        minute = [1441, 120, 150]
+        self.assertIsNone(postprocess.chunk_shape(None, hourly))
+        # full time axis, horizontal tiles of at most ~1 MB of f4
+        self.assertEqual(postprocess.chunk_shape('timeseries', hourly),
+                         [25, 1, 102, 102])
+        self.assertEqual(postprocess.chunk_shape('timeseries', minute),
+                         [1441, 13, 13])
+        self.assertEqual(postprocess.chunk_shape('map', hourly),
+                         [1, 40, 120, 150])
+        self.assertEqual(postprocess.chunk_shape('map', minute),
+                         [1, 120, 150])
+        # explicit chunks are limited to the size of the dimension
+        self.assertEqual(postprocess.chunk_shape([60, 200, 64], minute),
+                         [60, 120, 64])
+        for chunking in ['tiles', [60, 64]]:
+            self.assertRaises(ValueError, postprocess.chunk_shape,
+                              chunking, minute)
+
+    def test_get_encoding(self):
+        """Test precedence of variable, class and default encoding."""
+        post = archiver(config={'options_archive': {'encoding': {
+            'default': {'complevel': 1},
+            'minute': {'chunking': 'timeseries', 'complevel': 2},
+            'RAINNC': {'least_significant_digit': 2}}}})
+        self.assertEqual(post.get_encoding('T2', 2), {
+            'complevel': 1, 'shuffle': True, 'chunking': None,
+            'least_significant_digit': None})
+        self.assertEqual(post.get_encoding('RAINNC', 2), {
+            'complevel': 2, 'shuffle': True, 'chunking': 'timeseries',
+            'least_significant_digit': 2})
+        # minute variables of the outer domain are hourly output
+        self.assertEqual(post.get_encoding('RAINNC', 1)['complevel'], 1)
+        self.assertEqual(archiver().get_encoding('T2', 1)['complevel'], 4)
+
+    def test_slabcache(self):
+        """Test least recently used eviction at the cache size."""
+        slab = np.zeros((4, 4, 4), dtype='f8')  # 512 bytes
+        cache = slabcache(3 * slab.nbytes)
+        for key in 'abc':
+            cache.put(key, slab + ord(key))
+        self.assertEqual(cache.nbytes, 3 * slab.nbytes)
+        # a is used again, b is now least recently used
+        cached = cache.get('a')
+        np.testing.assert_array_equal(cached, slab + ord('a'))
+        # returned slabs are copies
+        cached[:] = 0
+        np.testing.assert_array_equal(cache.get('a'), slab + ord('a'))
+        cache.put('d', slab)
+        self.assertEqual(list(cache.slabs), ['c', 'a', 'd'])
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        self.assertLessEqual(cache.nbytes, cache.maxbytes)
+        # slabs larger than the cache are not cached
+        cache.put('e', np.zeros(4 * slab.size))
+        self.assertIsNone(cache.get('e'))
+        self.assertEqual(cache.nbytes, 3 * slab.nbytes)
+
+    def test_create_netcdf(self):
+        """Test preallocated time axis and chunking of the output file."""
+        post = archiver()
+        lat, lon = np.meshgrid(52 + np.arange(3.), 4 + np.arange(4.),
+                               indexing='ij')
+        dt = [datetime(2017, 1, 1, 0, minute) for minute in range(10)]
+        encoding = {'complevel': 0, 'shuffle': False,
+                    'chunking': 'timeseries',
+                    'least_significant_digit': None}
+        outfile = os.path.join(self.tmpdir, 'RAINNC.nc')
+        ncfile, data = post.create_netcdf(
+            'RAINNC', [10, 3, 4], lat[np.newaxis], lon[np.newaxis],
+            pandas.DatetimeIndex(dt), outfile, encoding=encoding)
+        try:
+            self.assertEqual(data.shape, (10, 3, 4))
+            self.assertEqual(data.chunking(), [10, 3, 4])
+            self.assertEqual(data.filters()['zlib'], False)
+            data[4:6] = np.ones((2, 3, 4))
+        finally:
+            ncfile.close()
+        with Dataset(outfile, 'r') as ncfile:
+            self.assertEqual(ncfile.variables['time'][-1] -
+                             ncfile.variables['time'][0], 9)
+            rainnc = ncfile.variables['RAINNC'][:]
+            self.assertEqual(rainnc[4:6].sum(), 24)
+            # slices that were not written are fill values
+            self.assertTrue(rainnc.mask[:4].all())
+
+    def test_archive_var(self):
+        """Test streaming input slabs into the preallocated time axis."""
+        post = archiver(ndoms=1)
+        post.rundir = self.tmpdir
+        post.archivedir = self.tmpdir
+        post.cache = slabcache(2**20)
+        post.startdate = datetime(2017, 1, 1, 0)
+        post.enddate = datetime(2017, 1, 1, 6)
+        rng = np.random.RandomState(0)
+        # hourly values, the input files overlap by one record
+        expected = rng.rand(7, 3, 4).astype('f4')
+        lat, lon = np.meshgrid(52 + np.arange(3.), 4 + np.arange(4.),
+                               indexing='ij')
+        coords = {'XLAT': lat[np.newaxis], 'XLONG': lon[np.newaxis],
+                  'FRC_URB2D': np.ones((1, 3, 4))}
+        for hour in [0, 2, 4]:
+            self.write_input('T2_d01_2017-01-01_0%i:00:00' % hour,
+                             expected[hour:hour + 3])
+        stats = post.archive_var('T2', 1, coords)
+        self.assertEqual(stats['size_raw'], expected.nbytes)
+        with Dataset(stats['file'], 'r') as ncfile:
+            np.testing.assert_array_equal(ncfile.variables['T2'][:],
+                                          expected)
+            time = ncfile.variables['time']
+            np.testing.assert_array_equal(
+                num2date(time[:], time.units, time.calendar),
+                [datetime(2017, 1, 1, hour) for hour in range(7)])
+            np.testing.assert_array_equal(ncfile.variables['latitude'][:],
+                                          lat)
+        # a short input slab leaves the time axis incomplete
+        self.write_input('T2_d01_2017-01-01_04:00:00', expected[4:6])
+        post.cache = slabcache(2**20)  # T2 input slabs are cached
+        self.assertRaises(ValueError, post.archive_var, 'T2', 1, coords)
+
+    def run_archiver(self, variables, workers=1):
+        """Return archiver for variables of two domains in tmpdir."""
+        post = archiver(config={'options_archive': {'workers': workers}})
+        post.hour_var = list(variables)
+        post.minute_var = []
+        post.rundir = self.tmpdir
+        post.archivedir = os.path.join(self.tmpdir, 'archive')
+        os.mkdir(post.archivedir)
+        post.cache = slabcache(2**20)
+        post.manifest = manifest(os.path.join(post.archivedir,
+                                              'manifest.json'))
+        post.startdate = datetime(2017, 1, 1, 0)
+        post.enddate = datetime(2017, 1, 1, 4)
+        lat, lon = np.meshgrid(52 + np.arange(3.), 4 + np.arange(4.),
+                               indexing='ij')
+        for domain in [1, 2]:
+            filename = os.path.join(self.tmpdir,
+                                    'wrfout_d0%i_2017-01-01_00:00:00' %
+                                    domain)
+            with Dataset(filename, 'w') as ncfile:
+                ncfile.createDimension('Time', 1)
+                ncfile.createDimension('south_north', 3)
+                ncfile.createDimension('west_east', 4)
+                for name, value in [('XLAT', lat), ('XLONG', lon),
+                                    ('XLAT_U', lat), ('XLONG_U', lon),
+                                    ('XLAT_V', lat), ('XLONG_V', lon),
+                                    ('FRC_URB2D', np.ones((3, 4)))]:
+                    ncfile.createVariable(
+                        name, 'f4', ('Time', 'south_north', 'west_east'))[
+                            :] = value[np.newaxis]
+            for var in [var for var in variables
+                        if var not in post.derived_var]:
+                for hour in [0, 2]:
+                    self.write_input('%s_d0%i_2017-01-01_0%i:00:00' %
+                                     (var, domain, hour),
+                                     np.ones((3, 3, 4)) * hour, var)
+        return post
+
+    def test_archive_workers(self):
+        """Test archiving on a pool of processes with a failing job."""
+        variables = ['T2', 'Q2', 'U10']
+        post = self.run_archiver(variables, workers=2)
+        results = post.archive()
+        self.assertEqual([(result['var'], result['domain'])
+                          for result in results],
+                         [(var, domain) for domain in [1, 2]
+                          for var in variables])
+        self.assertTrue(all(result['error'] is None for result in results))
+        shutil.rmtree(post.archivedir)
+        # Q2 input is missing in domain 2
+        post = self.run_archiver(variables, workers=2)
+        os.remove(os.path.join(self.tmpdir, 'Q2_d02_2017-01-01_02:00:00'))
+        with self.assertRaises(RuntimeError) as context:
+            post.archive()
+        self.assertIn('1 of 6 variables: Q2_d02', str(context.exception))
+        # the other jobs are completed and recorded
+        for domain in [1, 2]:
+            for var in variables:
+                self.assertEqual(post.manifest.complete(
+                    post.output_name(var, domain), verify=True),
+                    (var, domain) != ('Q2', 2))
+
+    def test_archive_resume(self):
+        """Test that a rerun only archives the failed outputs."""
+        variables = ['T2', 'Q2', 'U10']
+        post = self.run_archiver(variables)
+        missing = os.path.join(self.tmpdir, 'Q2_d02_2017-01-01_02:00:00')
+        os.rename(missing, missing + '.bak')
+        self.assertRaises(RuntimeError, post.archive)
+        # the partly written output of the failed job is not recorded
+        mtimes = {name: os.path.getmtime(os.path.join(post.archivedir, name))
+                  for name in os.listdir(post.archivedir)
+                  if post.manifest.complete(name)}
+        self.assertEqual(len(mtimes), 5)
+        os.rename(missing + '.bak', missing)
+        # a new session reads the manifest written by the first run
+        post.manifest = manifest(post.manifest.filename)
+        results = post.archive()
+        self.assertEqual([(result['var'], result['domain'])
+                          for result in results], [('Q2', 2)])
+        for name, mtime in mtimes.items():
+            self.assertEqual(os.path.getmtime(
+                os.path.join(post.archivedir, name)), mtime)
+        self.assertTrue(post.manifest.complete(post.output_name('Q2', 2),
+                                               verify=True))
+
+    def test_cleanup(self):
+        """Test that inputs of incomplete outputs are not removed."""
+        post = self.run_archiver(['T2', 'TP2M_URB', 'TC2M_URB', 'Q2'])
+        post.config['options_general'] = {'date_start': '2017-01-01_00'}
+        post.archive()
+        # TC2M_URB output of domain 1 is lost, Q2 of domain 2 is corrupt
+        os.remove(os.path.join(post.archivedir,
+                               post.output_name('TC2M_URB', 1)))
+        with open(os.path.join(post.archivedir,
+                               post.output_name('Q2', 2)), 'r+b') as out:
+            out.seek(-1, os.SEEK_END)
+            last = out.read(1)
+            out.seek(-1, os.SEEK_END)
+            out.write(bytes([(last[0] + 1) % 256]))
+        post.manifest = manifest(post.manifest.filename)
+        post.cleanup()
+        kept = sorted(name.rsplit('_', 2)[0] for name
+                      in os.listdir(self.tmpdir) if name.endswith('00:00'))
+        self.assertEqual(kept, sorted(
+            ['wrfout_d01', 'wrfout_d02', 'Q2_d02', 'Q2_d02'] +
+            2 * ['T2_d01', 'TP2M_URB_d01']))
+
+    def test_store_failure(self):
+        """Test that a failing store does not fail the archive."""
+        post = self.run_archiver(['T2', 'Q2'])
+        post.config['options_archive']['store'] = {'variables': ['T2']}
+        post.config['filesystem'] = {'archive_dir': post.archivedir}
+        # the store directory cannot be created
+        with open(os.path.join(post.archivedir, 'store'), 'w') as out:
+            out.write('')
+        results = post.archive()
+        self.assertTrue(all(result['error'] is None for result in results))
+        self.assertEqual([bool(result.get('store_error'))
+                          for result in results], [True, False] * 2)
+        for domain in [1, 2]:
+            self.assertTrue(post.manifest.complete(
+                post.output_name('T2', domain), verify=True))
+
+    def test_transfer(self):
+        """Test that only copied files are checksummed."""
+        post = self.run_archiver([])
+        for strategy, md5 in [('copy', True), ('hardlink', False),
+                              ('move', False)]:
+            infile = os.path.join(self.tmpdir, 'wrfvar_input_' + strategy)
+            with open(infile, 'wb') as out:
+                out.write(b'wrfvar')
+            outfile = os.path.join(post.archivedir, os.path.basename(infile))
+            post.transfer(strategy, infile, outfile, strategy)
+            self.assertEqual(post.manifest.entries[strategy]['md5'] is not
+                             None, md5)
+            self.assertTrue(manifest(post.manifest.filename).complete(
+                strategy, verify=True))
+
+    def write_input(self, filename, data, var='T2'):
+        """Write WRF output file of var to the run directory."""
+        with Dataset(os.path.join(self.tmpdir, filename), 'w') as ncfile:
+            ncfile.createDimension('Time', None)
+            ncfile.createDimension('south_north', data.shape[1])
+            ncfile.createDimension('west_east', data.shape[2])
+            ncfile.createVariable(
+                var, 'f4', ('Time', 'south_north', 'west_east'))[:] = data
+
+    def test_job_groups(self):
+        """Test that derived variables are grouped with their inputs."""
+        post = archiver()
+        groups = post.job_groups()
+        self.assertEqual(groups[0], ['T2', 'TP2M_URB', 'TC2M_URB'])
+        # every variable is archived exactly once
+        archived = [var for group in groups for var in group]
+        self.assertEqual(sorted(archived),
+                         sorted(post.hour_var + post.minute_var))
+        self.assertIn(['Q2'], groups)
+        # inputs that are not archived themselves are not grouped
+        post.hour_var.remove('TP2M_URB')
+        self.assertEqual(post.job_groups()[0], ['T2', 'TC2M_URB'])
+        # derived variables sharing an input are grouped together
+        post.derived_var['TH2'] = ['T2', 'PSFC']
+        groups = post.job_groups()
+        self.assertEqual(groups[0], ['T2', 'PSFC', 'TH2', 'TC2M_URB'])
+        self.assertNotIn(['T2'], groups)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+
+"""
+description:    Tests for the bumpskin module
+license:        APACHE 2.0
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import numpy as np
+import statsmodels.api as sm
+from netCDF4 import Dataset, num2date
+
+from wrfpy import utils
+from wrfpy.bumpskin import bumpskin, bumpskinbatch, reg_m, wrfvarsession
+
+
+class stationbumpskin(bumpskin):
+    """bumpskin with model temperatures at the stations 1 K too warm."""
+
+    def __init__(self, session):
+        self.nstationtypes = None
+        self.dstationtypes = None
+        self.sessions = {1: session}
+        self.locators = {}
+
+    def get_urban_temp(self, session, ams):
+        nobs = len(ams)
+        rng = np.random.RandomState(nobs)
+        shape = np.shape(session.lat)
+        return (np.array([ob[2] for ob in ams]) + 1, 300 * rng.rand(nobs),
+                3 * rng.rand(nobs), np.ones(nobs), np.ones(shape),
+                np.full(shape, 300.), np.full(shape, 2.))
+
+
+class TestBumpskin(unittest.TestCase):
+    """Tests for the bumpskin module."""
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'wrfvar_output')
+        self.data = (280 + rng.rand(1, 4, 5, 6)).astype('f4')
+        self.before = (270 + rng.rand(1, 4, 5, 6)).astype('f4')
+        self.diffT = rng.rand(1, 5, 6)
+        self.mask = rng.rand(5, 6) > 0.5
+        ncfile = Dataset(self.filename, 'w')
+        for dim, size in zip(['Time', 'lev', 'y', 'x'], self.data.shape):
+            ncfile.createDimension(dim, size)
+        for var, data in [('TSLB', self.data), ('TSLB_IN', self.before)]:
+            ncfile.createVariable(var, 'f4', ('Time', 'lev', 'y', 'x'))
+            ncfile.variables[var][:] = data
+        for var in ['XLAT', 'XLONG', 'LU_INDEX', 'T2']:
+            ncfile.createVariable(var, 'f4', ('Time', 'y', 'x'))
+            ncfile.variables[var][:] = rng.rand(1, 5, 6)
+        ncfile.createDimension('DateStrLen', 19)
+        ncfile.createVariable('Times', 'S1', ('Time', 'DateStrLen'))
+        ncfile.variables['Times'][:] = np.array(
+            [list(b'2017-01-01_06:00:00')], dtype='u1').view('S1')
+        ncfile.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _increment(self, factors, reset=None):
+        """Apply increment_levels and return the result."""
+        ncfile = Dataset(self.filename, 'r+')
+        bumpskin.increment_levels(ncfile.variables['TSLB'], self.diffT,
+                                  factors, reset=reset)
+        ncfile.close()
+        with Dataset(self.filename, 'r') as ncfile:
+            return ncfile.variables['TSLB'][:]
+
+    def test_increment_levels(self):
+        """Test increments for levels with a factor only."""
+        result = self._increment([0.5, 0.25])
+        expected = self.data.astype(np.float64)
+        expected[0, 0] += 0.5 * self.diffT[0]
+        expected[0, 1] += 0.25 * self.diffT[0]
+        np.testing.assert_allclose(result, expected, rtol=1e-7)
+
+    def test_increment_levels_more_factors(self):
+        """Test that factors beyond the number of levels are ignored."""
+        result = self._increment([1, 1, 1, 1, 1, 1])
+        np.testing.assert_allclose(result, self.data + self.diffT[:, None],
+                                   rtol=1e-7)
+
+    def test_increment_levels_reset(self):
+        """Test reset of masked points before incrementing."""
+        with Dataset(self.filename, 'r') as ncfile:
+            before = ncfile.variables['TSLB_IN'][0, :]
+        result = self._increment([0.5, 0.25], reset=(self.mask, before))
+        expected = np.where(self.mask, self.before, self.data).astype(
+            np.float64)
+        expected[0, 0] += 0.5 * self.diffT[0]
+        expected[0, 1] += 0.25 * self.diffT[0]
+        np.testing.assert_allclose(result, expected, rtol=1e-7)
+
+    def test_session(self):
+        """Test time, coordinates and fields of a wrfvarsession."""
+        session = wrfvarsession(self.filename)
+        self.assertEqual(session.datestr, '2017-01-01_06:00:00')
+        self.assertEqual(session.dtobj, datetime(2017, 1, 1, 6))
+        with Dataset(self.filename, 'r') as ncfile:
+            np.testing.assert_array_equal(session.lat,
+                                          ncfile.variables['XLAT'][0])
+            np.testing.assert_array_equal(session.field('T2'),
+                                          ncfile.variables['T2'][0])
+        # fields are read once
+        self.assertIs(session.field('T2'), session.field('T2'))
+        session.close()
+
+    def test_findDiffT(self):
+        """Test increments for few stations."""
+        session = wrfvarsession(self.filename, mode='r')
+        try:
+            for nobs in range(6):
+                obs = [(52., 4., 290., 'netatmo', 'station%i' % n)
+                       for n in range(nobs)]
+                with mock.patch('wrfpy.readObsTemperature.'
+                                'readObsTemperature') as reader:
+                    reader.return_value.obs = obs
+                    result = stationbumpskin(session).findDiffT(1)
+                if nobs < 5:
+                    # increments from fewer than 5 stations are not applied
+                    self.assertIsNone(result)
+                else:
+                    lat, lon, diffT = result
+                    np.testing.assert_array_equal(lat, session.lat)
+                    self.assertEqual(diffT.shape, session.lat.shape)
+        finally:
+            session.close()
+
+    def test_reg_m(self):
+        """Test regression params and F-test against statsmodels OLS."""
+        rng = np.random.RandomState(1)
+        for nobs in [5, 50]:
+            glw = 300 + 50 * rng.rand(nobs)
+            uv10 = 3 * rng.rand(nobs)
+            diffT = 0.01 * glw - 0.3 * uv10 + 0.5 * rng.randn(nobs)
+            X = np.column_stack((uv10, glw, np.ones(nobs)))
+            expected = sm.OLS(diffT, X).fit()
+            fit = reg_m(diffT, [glw, uv10])
+            np.testing.assert_allclose(fit.params, expected.params,
+                                       rtol=1e-10)
+            self.assertAlmostEqual(fit.f_pvalue, expected.f_pvalue)
+
+    def test_bumpskinbatch(self):
+        """Test increments of all cycles written to one file."""
+        workdir = os.path.join(self.tmpdir, 'work')
+        stationdir = os.path.join(self.tmpdir, 'stations')
+        os.mkdir(workdir)
+        os.mkdir(stationdir)
+        # urban grid of 6x7 points with a water point
+        i, j = np.mgrid[0:6, 0:7]
+        glw = 300. + 10 * i
+        uv10 = 1. + 0.5 * j
+        lu = np.ones((6, 7))
+        lu[0, 6] = 17
+        expected = 0.01 * glw - 0.2 * uv10 - 3.5
+        expected[0, 6] = 0
+        fields = {'XLAT': 52 + 0.01 * i, 'XLONG': 4 + 0.01 * j,
+                  'LU_INDEX': lu, 'GLW': glw, 'U10': uv10,
+                  'V10': np.zeros((6, 7))}
+        pattern = os.path.join(self.tmpdir, 'wrfvar_input_%Y-%m-%d_%H')
+        # no model file for 02 UTC
+        for hour, t2 in [(0, 280.), (4, 281.)]:
+            dtobj = datetime(2017, 1, 1, hour)
+            self._write_wrfvar(dtobj.strftime(pattern), dtobj,
+                               dict(fields, T2=np.full((6, 7), t2)))
+        # stations observe the increment of the first cycle
+        for n, (si, sj) in enumerate([(1, 1), (1, 3), (2, 2), (3, 4),
+                                      (4, 1), (4, 5)]):
+            self._write_station(
+                os.path.join(stationdir, 'station%i.nc' % n),
+                fields['XLAT'][si, sj], fields['XLONG'][si, sj],
+                280 + expected[si, sj])
+        self._write_config(workdir, stationdir)
+        outfile = os.path.join(self.tmpdir, 'diffT.nc')
+        environ = os.environ.copy()
+        os.environ['CYLC_SUITE_DEF_PATH'] = self.tmpdir
+        try:
+            bumpskinbatch(datetime(2017, 1, 1), datetime(2017, 1, 1, 4),
+                          outfile, filename=pattern)
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+        with Dataset(outfile, 'r') as ncfile:
+            self.assertEqual({dim: len(ncfile.dimensions[dim]) for dim in
+                              ncfile.dimensions},
+                             {'time': 3, 'south_north': 6, 'west_east': 7,
+                              'param': 3})
+            self.assertEqual(sorted(ncfile.variables),
+                             ['XLAT', 'XLONG', 'diffT', 'f_pvalue',
+                              'median', 'method', 'nobs', 'params', 'time'])
+            self.assertEqual(ncfile.variables['diffT'].dimensions,
+                             ('time', 'south_north', 'west_east'))
+            time = ncfile.variables['time']
+            self.assertEqual(
+                [str(dtobj) for dtobj in num2date(time[:], time.units,
+                                                  time.calendar)],
+                ['2017-01-01 00:00:00', '2017-01-01 02:00:00',
+                 '2017-01-01 04:00:00'])
+            np.testing.assert_allclose(ncfile.variables['XLAT'][:],
+                                       fields['XLAT'], rtol=1e-6)
+            diffT = ncfile.variables['diffT'][:]
+            method = ncfile.variables['method'][:]
+            nobs = ncfile.variables['nobs'][:]
+            # the cycle without a model file is masked
+            self.assertTrue(diffT.mask[1].all())
+            self.assertTrue(np.ma.is_masked(method[1]))
+            self.assertTrue(np.ma.is_masked(nobs[1]))
+            self.assertEqual(list(nobs[[0, 2]]), [6, 6])
+            self.assertEqual(list(method[[0, 2]]),
+                             [bumpskinbatch.methods.index('fit')] * 2)
+            np.testing.assert_allclose(ncfile.variables['params'][0],
+                                       [-0.2, 0.01, -3.5], atol=1e-3)
+            np.testing.assert_allclose(diffT[0], expected, atol=1e-3)
+            # the model is 1 K warmer in the last cycle
+            np.testing.assert_allclose(diffT[2],
+                                       np.where(lu == 1, expected - 1, 0),
+                                       atol=1e-3)
+
+    @staticmethod
+    def _write_wrfvar(filename, dtobj, fields):
+        """Write a wrfvar file of a single time with 2d fields."""
+        with Dataset(filename, 'w') as ncfile:
+            ncfile.ISWATER = 17
+            ncfile.createDimension('Time', 1)
+            ncfile.createDimension('DateStrLen', 19)
+            ncfile.createDimension('south_north', 6)
+            ncfile.createDimension('west_east', 7)
+            ncfile.createVariable('Times', 'S1', ('Time', 'DateStrLen'))
+            ncfile.variables['Times'][:] = np.array(
+                [list(dtobj.strftime('%Y-%m-%d_%H:%M:%S').encode())],
+                dtype='u1').view('S1')
+            for var, data in fields.items():
+                ncfile.createVariable(var, 'f4', ('Time', 'south_north',
+                                                  'west_east'))[:] = data
+
+    @staticmethod
+    def _write_station(filename, lat, lon, temperature):
+        """Write a station file with a constant temperature."""
+        with Dataset(filename, 'w') as ncfile:
+            ncfile.stationtype = 'netatmo'
+            ncfile.createDimension('time', 43)
+            ncfile.createDimension('location', 1)
+            ncfile.createVariable('latitude', 'f8', ('location',))[:] = lat
+            ncfile.createVariable('longitude', 'f8', ('location',))[:] = lon
+            time = ncfile.createVariable('time', 'f8', ('time',))
+            time.units = 'seconds since 2017-01-01 00:00:00'
+            time.calendar = 'gregorian'
+            # every 10 minutes from 23 UTC to 06 UTC
+            time[:] = np.arange(-3600, 22200, 600)
+            ncfile.createVariable('temperature', 'f4', ('time',))[:] = (
+                temperature)
+
+    def _write_config(self, workdir, stationdir):
+        """Write config.json of a suite in tmpdir."""
+        namelist = os.path.join(self.tmpdir, 'namelist.input')
+        with open(namelist, 'w') as outfile:
+            outfile.write('&domains\n max_dom = 1\n/\n')
+        config = {
+            'filesystem': {'work_dir': workdir},
+            'options_general': {'date_start': '2017-01-01_00',
+                                'date_end': '2017-01-02_00',
+                                'boundary_interval': 1, 'run_hours': 24},
+            'options_wrf': {'namelist.input': namelist},
+            'options_wps': {'namelist.wps': os.path.join(
+                utils.get_wrfpy_path(), 'examples', 'namelist.wps'),
+                'run_hours': 24},
+            'options_wrfda': {'wrfda': ''}, 'options_upp': {'upp': ''},
+            'options_urbantemps': {'urban_stations': stationdir}}
+        with open(os.path.join(self.tmpdir, 'config.json'), 'w') as outfile:
+            json.dump(config, outfile)
+
+
+if __name__ == '__main__':
+    unittest.main()
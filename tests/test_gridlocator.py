@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+"""
+description:    Tests for the gridlocator module
+license:        APACHE 2.0
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from geopy.distance import vincenty
+
+from wrfpy.bumpskin import find_gridpoint
+from wrfpy.gridlocator import gridlocator, gridpointcache, sample_points
+
+
+def find_gridpoint_scan(lat_in, lon_in, lat, lon):
+    """Reference, vincenty distance to every gridpoint in the window."""
+    window = ((lon >= lon_in - 0.10) & (lon <= lon_in + 0.10) &
+              (lat >= lat_in - 0.10) & (lat <= lat_in + 0.10))
+    if not window.any():
+        return None, None, None
+    distance = [vincenty((lat_in, lon_in), (la, lo)).km
+                for la, lo in zip(lat[window], lon[window])]
+    idx = np.flatnonzero(window)[np.argmin(distance)]
+    i_idx, j_idx = np.unravel_index(idx, np.shape(lat))
+    return i_idx, j_idx, min(distance)
+
+
+class TestGridLocator(unittest.TestCase):
+    """Tests for the gridlocator module."""
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        # rotated curvilinear grid of roughly 1 km around Amsterdam
+        y, x = np.meshgrid(np.arange(40), np.arange(50), indexing='ij')
+        self.lat = (52.1 + 0.009 * y + 0.002 * x).astype('f4')
+        self.lon = (4.6 + 0.014 * x - 0.003 * y).astype('f4')
+        # stations inside the grid and a few outside the window
+        self.lat_in = np.concatenate((rng.uniform(52.15, 52.45, 50),
+                                      [51.0, 53.5]))
+        self.lon_in = np.concatenate((rng.uniform(4.65, 5.2, 50),
+                                      [4.8, 4.8]))
+        self.cachedir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir)
+
+    def test_equals_vincenty_scan(self):
+        """Test batched query against vincenty scan for every station."""
+        i_idx, j_idx, distance = gridlocator(self.lat, self.lon).query(
+            self.lat_in, self.lon_in)
+        for n, (la, lo) in enumerate(zip(self.lat_in, self.lon_in)):
+            i_ref, j_ref, d_ref = find_gridpoint_scan(la, lo, self.lat,
+                                                      self.lon)
+            if i_ref is None:
+                self.assertEqual((i_idx[n], j_idx[n]), (-1, -1))
+                self.assertTrue(np.isnan(distance[n]))
+            else:
+                self.assertEqual((i_idx[n], j_idx[n]), (i_ref, j_ref))
+                # spherical versus ellipsoidal distance
+                self.assertAlmostEqual(distance[n], d_ref, delta=0.01)
+
+    def test_find_gridpoint(self):
+        """Test single point find_gridpoint wrapper."""
+        i_ref, j_ref, _ = find_gridpoint_scan(self.lat_in[0],
+                                              self.lon_in[0],
+                                              self.lat, self.lon)
+        self.assertEqual(find_gridpoint(self.lat_in[0], self.lon_in[0],
+                                        self.lat, self.lon), (i_ref, j_ref))
+        self.assertEqual(find_gridpoint(51.0, 4.8, self.lat, self.lon),
+                         (None, None))
+
+    def test_empty_query(self):
+        """Test query without points."""
+        i_idx, j_idx, distance = gridlocator(self.lat, self.lon).query([], [])
+        self.assertEqual(len(i_idx), 0)
+        self.assertEqual(len(distance), 0)
+
+    def test_cache(self):
+        """Test cached gridpoints are equal to the gridlocator results."""
+        expected = gridlocator(self.lat, self.lon).query(self.lat_in,
+                                                         self.lon_in)
+        cache = gridpointcache(self.cachedir, self.lat, self.lon)
+        # a first subset of the stations, then all stations
+        cache.query(self.lat_in[:10], self.lon_in[:10])
+        result = gridpointcache(self.cachedir, self.lat, self.lon).query(
+            self.lat_in, self.lon_in)
+        for res, exp in zip(result, expected):
+            np.testing.assert_array_equal(res, exp)
+        # all stations are read from the cache, no locator is built
+        cache = gridpointcache(self.cachedir, self.lat, self.lon)
+        result = cache.query(self.lat_in[::-1], self.lon_in[::-1])
+        self.assertIsNone(cache.locator)
+        for res, exp in zip(result, expected):
+            np.testing.assert_array_equal(res, exp[::-1])
+
+    def test_cache_invalidated_by_grid(self):
+        """Test that a changed grid uses a new cache file."""
+        gridpointcache(self.cachedir, self.lat, self.lon).query(
+            self.lat_in, self.lon_in)
+        cache = gridpointcache(self.cachedir, self.lat, self.lon + 0.01)
+        cache.query(self.lat_in, self.lon_in)
+        self.assertIsNotNone(cache.locator)
+        self.assertEqual(len(os.listdir(self.cachedir)), 2)
+
+    def test_sample_points(self):
+        """Test gather of fields at gridpoints against scalar indexing."""
+        i_idx, j_idx, _ = gridlocator(self.lat, self.lon).query(
+            self.lat_in, self.lon_in)
+        masked = np.ma.masked_greater(self.lon, 5.)
+        samples = sample_points({'lat': self.lat, 'masked': masked,
+                                 'levels': np.stack((self.lat, self.lon))},
+                                i_idx, j_idx)
+        for n in range(len(i_idx)):
+            if i_idx[n] < 0:
+                self.assertTrue(np.isnan(samples['lat'][n]))
+                self.assertTrue(np.isnan(samples['levels'][:, n]).all())
+                continue
+            self.assertEqual(samples['lat'][n], self.lat[i_idx[n], j_idx[n]])
+            self.assertEqual(samples['levels'][1, n],
+                             self.lon[i_idx[n], j_idx[n]])
+            if masked.mask[i_idx[n], j_idx[n]]:
+                self.assertTrue(np.isnan(samples['masked'][n]))
+            else:
+                self.assertEqual(samples['masked'][n],
+                                 self.lon[i_idx[n], j_idx[n]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+"""
+description:    Tests for the manifest module
+license:        APACHE 2.0
+"""
+
+import os
+import tempfile
+import unittest
+
+from wrfpy.manifest import manifest
+
+
+class TestManifest(unittest.TestCase):
+    """Tests for the manifest module."""
+
+    def test_complete_after_reload(self):
+        """Test that recorded files are complete in a new session."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            outfile = self._write(temp_dir, 'T2_d01.nc', b'abc')
+            manifest_file = os.path.join(temp_dir, 'manifest.json')
+            manifest(manifest_file).add('T2_d01.nc', outfile)
+            reloaded = manifest(manifest_file)
+            self.assertTrue(reloaded.complete('T2_d01.nc', verify=True))
+            self.assertFalse(reloaded.complete('U_d01.nc'))
+
+    def test_modified_file_incomplete(self):
+        """Test that changed or removed files are not complete."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            outfile = self._write(temp_dir, 'T2_d01.nc', b'abc')
+            manifest_file = os.path.join(temp_dir, 'manifest.json')
+            manifest(manifest_file).add('T2_d01.nc', outfile)
+            # same size, different content: only detected by checksum
+            self._write(temp_dir, 'T2_d01.nc', b'abd')
+            reloaded = manifest(manifest_file)
+            self.assertTrue(reloaded.complete('T2_d01.nc'))
+            self.assertFalse(reloaded.complete('T2_d01.nc', verify=True))
+            os.remove(outfile)
+            self.assertFalse(reloaded.complete('T2_d01.nc'))
+
+    def test_add_batch(self):
+        """Test that a batch of files is saved once by the caller."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            manifest_file = os.path.join(temp_dir, 'manifest.json')
+            record = manifest(manifest_file)
+            for var in ['T2', 'U', 'V']:
+                outfile = self._write(temp_dir, var + '_d01.nc', b'abc')
+                record.add(var + '_d01.nc', outfile, save=False)
+            self.assertFalse(os.path.exists(manifest_file))
+            record.save()
+            reloaded = manifest(manifest_file)
+            self.assertTrue(all(reloaded.complete(var + '_d01.nc')
+                                for var in ['T2', 'U', 'V']))
+            with open(manifest_file, 'r') as infile:
+                self.assertEqual(len(infile.readlines()), 1)
+
+    def test_add_stat(self):
+        """Test files recorded by modification time and inode."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            infile = self._write(temp_dir, 'wrfvar_input_d01', b'abc')
+            outfile = os.path.join(temp_dir, 'archived_d01')
+            os.link(infile, outfile)
+            manifest_file = os.path.join(temp_dir, 'manifest.json')
+            manifest(manifest_file).add_stat('wrfvar_input_d01', outfile)
+            reloaded = manifest(manifest_file)
+            self.assertIsNone(reloaded.entries['wrfvar_input_d01']['md5'])
+            # removing the input keeps the hard linked output
+            os.remove(infile)
+            self.assertTrue(reloaded.complete('wrfvar_input_d01',
+                                              verify=True))
+            # a replaced file of the same size is not verified
+            os.remove(outfile)
+            self._write(temp_dir, 'other', b'xyz')
+            self._write(temp_dir, 'archived_d01', b'abd')
+            reloaded = manifest(manifest_file)
+            self.assertTrue(reloaded.complete('wrfvar_input_d01'))
+            self.assertFalse(reloaded.complete('wrfvar_input_d01',
+                                               verify=True))
+
+    @staticmethod
+    def _write(directory, filename, content):
+        path = os.path.join(directory, filename)
+        with open(path, 'wb') as outfile:
+            outfile.write(content)
+        return path
+
+
+if __name__ == '__main__':
+    unittest.main()
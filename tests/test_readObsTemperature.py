@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+
+"""
+description:    Tests for the readObsTemperature module
+license:        APACHE 2.0
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+from netCDF4 import Dataset
+
+from wrfpy import utils
+from wrfpy.readObsTemperature import (obs_tuples, read_obs_table,
+                                      readObsTemperature,
+                                      readObsTemperatureBatch, select_time,
+                                      station_files, stationdata, timeaxis,
+                                      write_obs_table)
+
+
+class TestReadObsTemperature(unittest.TestCase):
+    """Tests for the readObsTemperature module."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        # two stations with observations every 10 minutes
+        self.times = np.arange(0, 86400, 600, dtype=np.float64)
+        for n, offset in enumerate([0, 300]):
+            ncfile = Dataset(os.path.join(self.tmpdir,
+                                          'station%i.nc' % n), 'w')
+            ncfile.stationtype = 'type%i' % n
+            ncfile.createDimension('time', len(self.times))
+            ncfile.createDimension('location', 1)
+            ncfile.createVariable('latitude', 'f8', ('location',))[:] = 52.
+            ncfile.createVariable('longitude', 'f8', ('location',))[:] = (
+                4. + n)
+            time = ncfile.createVariable('time', 'f8', ('time',))
+            time.units = 'seconds since 2017-01-01 00:00:00'
+            time.calendar = 'gregorian'
+            time[:] = self.times + offset
+            ncfile.createVariable('temperature', 'f4', ('time',))[:] = (
+                280 + n + np.arange(len(self.times)))
+            ncfile.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_select_time(self):
+        """Test selection of the closest time within maxdiff."""
+        self.assertEqual(select_time(self.times, 1000), 2)
+        self.assertEqual(select_time(self.times, 1300, maxdiff=60), None)
+        self.assertEqual(select_time(self.times, -1), None)
+        self.assertEqual(select_time(self.times, 86400), None)
+
+    def test_timeaxis(self):
+        """Test windowed time lookup against the complete time axis."""
+        rng = np.random.RandomState(0)
+        regular = np.arange(0, 86400 * 30, 60, dtype=np.float64)
+        # irregular time axis with a gap of a week
+        irregular = np.cumsum(rng.randint(1, 900, 5000)).astype(np.float64)
+        irregular[2000:] += 7 * 86400
+        ncfile = Dataset(os.path.join(self.tmpdir, 'times.nc'), 'w')
+        for name, times in [('regular', regular), ('irregular', irregular),
+                            ('short', irregular[:10])]:
+            ncfile.createDimension(name, len(times))
+            ncfile.createVariable(name, 'f8', (name,))[:] = times
+        for name, times in [('regular', regular), ('irregular', irregular),
+                            ('short', irregular[:10])]:
+            values = np.concatenate((
+                rng.uniform(times[0] - 3600, times[-1] + 3600, 200),
+                times[[0, 1, -2, -1]], times[[0, -1]] + 1))
+            for value in values:
+                axis = timeaxis(ncfile.variables[name])
+                self.assertEqual(select_time(axis, value),
+                                 select_time(times, value))
+                if name == 'regular':
+                    # first, last and a window around the estimate
+                    self.assertLessEqual(axis.reads, 2 + 2 * 32 + 1)
+        ncfile.close()
+
+    def test_obs_table(self):
+        """Test writing and reading the binary observation cache."""
+        filename = os.path.join(self.tmpdir, 'stations.obs')
+        obs = [(np.float32(52.1), 4.9, np.float32(281.5), 'netatmo',
+                '/data/station1.nc'),
+               (52.2, 5.0, np.ma.masked, None, 'station2.nc')]
+        write_obs_table(filename, obs)
+        table = read_obs_table(filename)
+        self.assertIsInstance(table, np.memmap)
+        result = obs_tuples(table)
+        self.assertEqual(result[0], (float(np.float32(52.1)), 4.9, 281.5,
+                                     'netatmo', '/data/station1.nc'))
+        self.assertTrue(np.isnan(result[1][2]))
+        self.assertEqual(result[1][3:], ('', 'station2.nc'))
+        # files written for other station types are not used
+        write_obs_table(filename, obs, dstationtypes=['Davis', 'vp2'])
+        self.assertEqual(len(read_obs_table(filename, None,
+                                            ['vp2', 'davis'])), 2)
+        self.assertRaises(IOError, read_obs_table, filename)
+        # empty table
+        write_obs_table(filename, [])
+        self.assertEqual(obs_tuples(read_obs_table(filename)), [])
+        # files of another version are not used
+        with open(filename, 'r+b') as outfile:
+            outfile.seek(8)
+            outfile.write(bytes([0]))
+        self.assertRaises(IOError, read_obs_table, filename)
+
+    def test_station_files(self):
+        """Test list of station files for a directory and a single file."""
+        filelist = sorted(station_files(self.tmpdir))
+        self.assertEqual([os.path.basename(f) for f in filelist],
+                         ['station0.nc', 'station1.nc'])
+        self.assertEqual(station_files(filelist[0]), [filelist[0]])
+
+    def test_stationdata(self):
+        """Test observations of all stations at a time."""
+        filelist = sorted(station_files(self.tmpdir))
+        stations = stationdata(filelist)
+        obs = stations.obs(datetime(2017, 1, 1, 1))
+        # times read in advance give the same observations
+        self.assertEqual(stationdata(filelist, [datetime(2017, 1, 1, 1)]
+                                     ).obs(datetime(2017, 1, 1, 1)), obs)
+        self.assertEqual(len(obs), 2)
+        self.assertEqual([ob[3] for ob in obs], ['type0', 'type1'])
+        self.assertEqual(obs[0][2], 286)
+        # 00:55 and 01:05 are equally close for the second station,
+        # the later observation is used
+        self.assertEqual(obs[1][2], 287)
+
+    def test_obs_temp_p(self):
+        """Test batched station reading on process and thread pools."""
+        filelist = sorted(station_files(self.tmpdir))
+        expected = stationdata(filelist).obs(datetime(2017, 1, 1, 1))
+        for kind in ['process', 'thread']:
+            reader = readObsTemperature.__new__(readObsTemperature)
+            reader.config = {'options_urbantemps': {'workers': 2,
+                                                    'pool': kind}}
+            reader.filelist = filelist
+            reader.nstationtypes = None
+            reader.dstationtypes = None
+            reader.obs_temp_p(datetime(2017, 1, 1, 1), chunksize=1)
+            self.assertEqual(reader.obs, expected)
+
+    def test_obs_times_p(self):
+        """Test extraction of many times against one time per call."""
+        dates = [datetime(2017, 1, 1) + timedelta(minutes=20 * n)
+                 for n in range(80)]
+        reader = readObsTemperature.__new__(readObsTemperature)
+        reader.config = {'options_urbantemps': {'workers': 2,
+                                                'pool': 'thread'}}
+        reader.filelist = sorted(station_files(self.tmpdir))
+        reader.nstationtypes = ['type0']
+        reader.dstationtypes = ['type1']
+        obs = reader.obs_times_p(dates)
+        self.assertEqual(len(obs), len(dates))
+        for dtobj, cycle_obs in zip(dates, obs):
+            reader.obs_temp_p(dtobj)
+            self.assertEqual(cycle_obs, reader.obs)
+
+    def test_batch(self):
+        """Test that the batch writes and reads the csv file per time."""
+        workdir = os.path.join(self.tmpdir, 'work')
+        os.mkdir(workdir)
+        namelist = os.path.join(self.tmpdir, 'namelist.input')
+        with open(namelist, 'w') as outfile:
+            outfile.write('&domains\n max_dom = 1\n/\n')
+        config = {
+            'filesystem': {'work_dir': workdir},
+            'options_general': {'date_start': '2017-01-01_00',
+                                'date_end': '2017-01-02_00',
+                                'boundary_interval': 1, 'run_hours': 24},
+            'options_wrf': {'namelist.input': namelist},
+            'options_wps': {'namelist.wps': os.path.join(
+                utils.get_wrfpy_path(), 'examples', 'namelist.wps'),
+                'run_hours': 24},
+            'options_wrfda': {'wrfda': ''}, 'options_upp': {'upp': ''},
+            'options_urbantemps': {'urban_stations': self.tmpdir,
+                                   'pool': 'thread'}}
+        with open(os.path.join(self.tmpdir, 'config.json'), 'w') as outfile:
+            json.dump(config, outfile)
+        environ = os.environ.copy()
+        os.environ['CYLC_SUITE_DEF_PATH'] = self.tmpdir
+        try:
+            dates = [datetime(2017, 1, 1, hour) for hour in range(1, 5)]
+            batch = readObsTemperatureBatch(dates)
+            self.assertEqual(sorted(os.listdir(workdir)), [
+                'obs_stations_2017-01-01_0%i:00:00.%s' % (hour, ext) for
+                hour in range(1, 5) for ext in ['csv', 'obs']])
+            # second run reads the cache files
+            os.rename(os.path.join(self.tmpdir, 'station0.nc'),
+                      os.path.join(self.tmpdir, 'station0.bak'))
+            # csv file of an earlier version is converted
+            os.remove(os.path.join(workdir,
+                                   'obs_stations_2017-01-01_01:00:00.obs'))
+            cached = readObsTemperatureBatch(dates)
+            self.assertTrue(os.path.exists(os.path.join(
+                workdir, 'obs_stations_2017-01-01_01:00:00.obs')))
+            # other station types do not use the cache files
+            other = readObsTemperatureBatch(dates, dstationtypes=['type1'])
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+        for dtobj in dates:
+            self.assertEqual(len(batch.cycles[dtobj]), 2)
+            for ob, ob_cached in zip(batch.cycles[dtobj],
+                                     cached.cycles[dtobj]):
+                np.testing.assert_allclose(ob[:3], ob_cached[:3])
+                self.assertEqual(ob[3:], ob_cached[3:])
+            self.assertEqual([ob[3] for ob in other.cycles[dtobj]],
+                             ['type1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
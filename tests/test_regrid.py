@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+"""
+description:    Tests for the regrid module
+license:        APACHE 2.0
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from scipy.interpolate import griddata
+
+from wrfpy.regrid import regridder
+
+
+class TestRegrid(unittest.TestCase):
+    """Tests for the regrid module."""
+
+    def setUp(self):
+        # coarse parent grid and a finer nested grid partly outside of it
+        y, x = np.meshgrid(np.arange(30), np.arange(35), indexing='ij')
+        self.lat = (52 + 0.027 * y + 0.006 * x).astype('f4')
+        self.lon = (4 + 0.042 * x - 0.009 * y).astype('f4')
+        y, x = np.meshgrid(np.arange(40), np.arange(45), indexing='ij')
+        self.lat2 = (52.2 + 0.009 * y + 0.002 * x).astype('f4')
+        self.lon2 = (3.9 + 0.014 * x - 0.003 * y).astype('f4')
+        self.field = np.sin(3 * self.lat) * np.cos(2 * self.lon)
+        self.cachedir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir)
+
+    def _griddata(self, method):
+        """Reference result of scipy griddata."""
+        return griddata((self.lon.reshape(-1), self.lat.reshape(-1)),
+                        self.field.reshape(-1),
+                        (self.lon2.reshape(-1), self.lat2.reshape(-1)),
+                        method=method).reshape(np.shape(self.lon2))
+
+    def test_equals_griddata(self):
+        """Test regrid with and without cache against scipy griddata."""
+        for method in ['linear', 'cubic']:
+            expected = self._griddata(method)
+            self.assertTrue(np.isnan(expected).any())
+            for _ in range(2):
+                result = regridder(self.cachedir, self.lat, self.lon,
+                                   self.lat2, self.lon2,
+                                   method=method).regrid(self.field)
+                np.testing.assert_allclose(result, expected, rtol=1e-12,
+                                           atol=1e-12)
+        self.assertEqual(len(os.listdir(self.cachedir)), 2)
+
+    def test_cached_weights(self):
+        """Test that cached linear weights need no triangulation."""
+        regridder(self.cachedir, self.lat, self.lon, self.lat2, self.lon2,
+                  method='linear')
+        cached = regridder(self.cachedir, self.lat, self.lon, self.lat2,
+                           self.lon2, method='linear')
+        self.assertFalse(hasattr(cached, 'triangulation'))
+
+    def test_invalid_method(self):
+        """Test that an unknown method raises a ValueError."""
+        self.assertRaises(ValueError, regridder, self.cachedir, self.lat,
+                          self.lon, self.lat2, self.lon2, 'nearest')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+"""
+description:    Tests for the solar module
+license:        APACHE 2.0
+"""
+
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import astral
+import numpy as np
+
+from wrfpy.readObsTemperature import station_mask
+from wrfpy.solar import solar_elevation
+
+
+class TestSolar(unittest.TestCase):
+    """Tests for the solar module."""
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.lat = rng.uniform(-89, 89, 200)
+        self.lon = rng.uniform(-180, 180, 200)
+
+    def _astral(self, dtobj):
+        """Reference solar elevation per station."""
+        return np.array([astral.Astral().solar_elevation(dtobj, lat, lon)
+                         for lat, lon in zip(self.lat, self.lon)])
+
+    def test_solar_elevation(self):
+        """Test solar elevation against astral."""
+        # astral adds the time of day twice to the julian day, only at
+        # 00 UTC the results are identical. At other times astral is up
+        # to a day of solar motion off, close to the horizon this is
+        # amplified by the refraction correction
+        for dtobj in [datetime(2017, 1, 1), datetime(2017, 6, 21),
+                      datetime(2020, 2, 29)]:
+            np.testing.assert_allclose(solar_elevation(self.lat, self.lon,
+                                                       dtobj),
+                                       self._astral(dtobj), atol=1e-8)
+        for dtobj in [datetime(2017, 3, 20, 11, 30),
+                      datetime(2017, 9, 1, 23, 59)]:
+            expected = self._astral(dtobj)
+            away = np.abs(expected) > 2
+            np.testing.assert_allclose(solar_elevation(
+                self.lat, self.lon, dtobj)[away], expected[away], atol=0.5)
+
+    def test_timezone(self):
+        """Test that aware datetimes are converted to UTC."""
+        dtobj = datetime(2017, 6, 21, 14, 0,
+                         tzinfo=timezone(timedelta(hours=2)))
+        np.testing.assert_allclose(
+            solar_elevation(self.lat, self.lon, dtobj),
+            solar_elevation(self.lat, self.lon, datetime(2017, 6, 21, 12)))
+
+    def test_station_mask(self):
+        """Test selection of station types at day and night."""
+        lat = [52., 52., 52., 52.]
+        lon = [5., 5., 5., -175.]
+        stationtypes = ['Davis Vantage', 'netatmo', None, 'Netatmo']
+        # noon in Europe, midnight at the other side of the earth
+        dtobj = datetime(2017, 6, 21, 12)
+        np.testing.assert_array_equal(
+            station_mask(lat, lon, stationtypes, dtobj), [1, 1, 1, 1])
+        np.testing.assert_array_equal(
+            station_mask(lat, lon, stationtypes, dtobj,
+                         nstationtypes=['netatmo'],
+                         dstationtypes=['davis']), [1, 0, 0, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+"""
+description:    Tests for the spatialfilter module
+license:        APACHE 2.0
+"""
+
+import unittest
+
+import numpy as np
+from astropy.convolution import convolve
+
+from wrfpy.spatialfilter import KERNEL, nan_convolve, spatial_filter
+
+
+class TestSpatialFilter(unittest.TestCase):
+    """Tests for the spatialfilter module."""
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.cube = 280 + 10 * rng.rand(6, 15, 20)
+        # scattered NaN values, a NaN block and an isolated valid point
+        self.cube[rng.rand(6, 15, 20) > 0.8] = np.nan
+        self.cube[2, 5:9, 5:9] = np.nan
+        self.cube[3, 9:12, 9:12] = np.nan
+        self.cube[3, 10, 10] = 285.
+
+    @staticmethod
+    def _astropy(data):
+        """Reference result, astropy convolution per 2D slice."""
+        return np.array([convolve(field, KERNEL, nan_treatment='interpolate',
+                                  preserve_nan=True) for field in data])
+
+    def test_cube_equals_astropy(self):
+        """Test whole cube filter against astropy per 2D slice."""
+        np.testing.assert_allclose(nan_convolve(self.cube),
+                                   self._astropy(self.cube), rtol=1e-12)
+
+    def test_field_without_nan_equals_astropy(self):
+        """Test 2D filter without NaN values against astropy."""
+        field = np.nan_to_num(self.cube[0], nan=280.)
+        np.testing.assert_allclose(spatial_filter(field),
+                                   self._astropy(field[np.newaxis])[0],
+                                   rtol=1e-12)
+
+    def test_masked_values_are_nan(self):
+        """Test that masked values are treated as NaN values."""
+        masked = np.ma.masked_invalid(self.cube)
+        np.testing.assert_allclose(spatial_filter(masked),
+                                   self._astropy(self.cube), rtol=1e-12)
+
+    def test_other_dimensions_unchanged(self):
+        """Test that 1D and 4D input is returned unchanged."""
+        cube = np.zeros((2, 3, 4, 5))
+        line = np.zeros(5)
+        self.assertIs(spatial_filter(cube), cube)
+        self.assertIs(spatial_filter(line), line)
+
+
+if __name__ == '__main__':
+    unittest.main()
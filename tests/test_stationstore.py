@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+"""
+description:    Tests for the stationstore module
+license:        APACHE 2.0
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+from netCDF4 import Dataset
+
+from wrfpy.readObsTemperature import obs_station, stationdata
+from wrfpy.stationstore import ingest, open_store, stationstore
+
+
+class TestStationstore(unittest.TestCase):
+    """Tests for the stationstore module."""
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.tmpdir = tempfile.mkdtemp()
+        self.storedir = os.path.join(self.tmpdir, 'store')
+        self.filelist = []
+        for n in range(20):
+            filename = os.path.join(self.tmpdir, 'station%02i.nc' % n)
+            # irregular observation times with different reference dates
+            reference = ['2017-01-01', '2016-12-31'][n % 2]
+            offset = [0, 86400][n % 2]
+            times = np.cumsum(rng.randint(1, 1200, 200)) + 3600 * n
+            temperature = np.ma.masked_array(
+                280 + rng.rand(len(times)), mask=rng.rand(len(times)) > 0.9)
+            ncfile = Dataset(filename, 'w')
+            if n % 3:
+                ncfile.stationtype = 'type%i' % (n % 3)
+            ncfile.createDimension('time', len(times))
+            ncfile.createDimension('location', 1)
+            ncfile.createVariable('latitude', 'f4', ('location',))[:] = (
+                52 + rng.rand())
+            ncfile.createVariable('longitude', 'f4', ('location',))[:] = (
+                4 + rng.rand())
+            dt = ncfile.createVariable('time', 'f8', ('time',))
+            dt.units = 'seconds since %s 00:00:00' % reference
+            dt.calendar = 'gregorian'
+            dt[:] = times + offset
+            ncfile.createVariable('temperature', 'f4', ('time',))[:] = (
+                temperature)
+            ncfile.close()
+            self.filelist.append(filename)
+        self.dates = [datetime(2017, 1, 1) + timedelta(seconds=int(s))
+                      for s in np.arange(0, 3 * 86400, 6300)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_obs(self):
+        """Test that the store selects the same observations per time."""
+        ingest(self.storedir, self.filelist)
+        store = stationstore(self.storedir)
+        reference = stationdata(self.filelist)
+        for dtobj in self.dates:
+            for nstationtypes in [None, ['type1']]:
+                expected = [ob for ob in reference.obs(
+                    dtobj, nstationtypes, nstationtypes)
+                            if not np.ma.is_masked(ob[2])]
+                obs = store.obs(dtobj, nstationtypes, nstationtypes)
+                self.assertEqual([ob[4] for ob in obs],
+                                 [ob[4] for ob in expected])
+                for ob, ex in zip(obs, expected):
+                    self.assertEqual(ob[:2], (float(ex[0]), float(ex[1])))
+                    self.assertEqual(ob[2], ex[2])
+                    self.assertEqual(ob[3], ex[3])
+
+    def test_minute_units(self):
+        """Test the 15 minute tolerance for a station file in minutes."""
+        filename = os.path.join(self.tmpdir, 'minutes.nc')
+        with Dataset(filename, 'w') as ncfile:
+            ncfile.createDimension('time', 36)
+            ncfile.createDimension('location', 1)
+            ncfile.createVariable('latitude', 'f4', ('location',))[:] = 52
+            ncfile.createVariable('longitude', 'f4', ('location',))[:] = 4
+            dt = ncfile.createVariable('time', 'f8', ('time',))
+            dt.units = 'minutes since 2017-01-01 00:00:00'
+            dt.calendar = 'gregorian'
+            # one observation every two hours
+            dt[:] = 120 * np.arange(36)
+            ncfile.createVariable('temperature', 'f4', ('time',))[:] = (
+                280 + np.arange(36))
+        ingest(self.storedir, [filename])
+        store = stationstore(self.storedir)
+        reference = stationdata([filename])
+        for minutes, expected in [(240, 282), (250, 282), (255, 282),
+                                  (256, None), (300, None), (345, 283)]:
+            dtobj = datetime(2017, 1, 1) + timedelta(minutes=minutes)
+            for obs in [store.obs(dtobj), reference.obs(dtobj),
+                        [ob for ob in [obs_station(filename, dtobj)] if ob]]:
+                self.assertEqual([ob[2] for ob in obs],
+                                 [expected] if expected else [])
+
+    def test_open_store(self):
+        """Test that an outdated store is used without rebuilding it."""
+        self.assertIsNone(open_store(self.storedir, self.filelist))
+        ingest(self.storedir, self.filelist[:10])
+        metadata = os.path.join(self.storedir, 'stations.json')
+        written = os.path.getmtime(metadata)
+        store = open_store(self.storedir, self.filelist[:10])
+        self.assertTrue(store.current(self.filelist[:10]))
+        self.assertEqual(store.changed, [])
+        # new and modified station files are read directly
+        mtime = os.path.getmtime(self.filelist[0]) + 10
+        os.utime(self.filelist[0], (time.time(), mtime))
+        store = open_store(self.storedir, self.filelist)
+        self.assertFalse(store.current(self.filelist))
+        self.assertEqual(store.changed,
+                         self.filelist[:1] + self.filelist[10:])
+        self.assertEqual(len(store.stations), 10)
+        self.assertEqual(os.path.getmtime(metadata), written)
+        reference = stationdata(self.filelist)
+        for dtobj in self.dates:
+            expected = [ob for ob in reference.obs(dtobj, ['type1'],
+                                                   ['type1'])
+                        if not np.ma.is_masked(ob[2])]
+            obs = [ob for ob in store.obs(dtobj, ['type1'], ['type1'])
+                   if not np.ma.is_masked(ob[2])]
+            self.assertEqual(sorted(ob[4] for ob in obs),
+                             [ob[4] for ob in expected])
+            for ob in obs:
+                self.assertIn(ob[2], [ex[2] for ex in expected
+                                      if ex[4] == ob[4]])
+        # removed station files are not used
+        store.use_files(self.filelist[1:5])
+        self.assertEqual(store.changed, [])
+        self.assertEqual(list(np.flatnonzero(store.used)), [1, 2, 3, 4])
+
+if __name__ == '__main__':
+    unittest.main()
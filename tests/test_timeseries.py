@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+"""
+description:    Tests for the timeseries module
+license:        APACHE 2.0
+"""
+
+import unittest
+
+import numpy as np
+import pandas
+from netCDF4 import date2num
+
+from wrfpy.timeseries import deaccumulator, time_axis
+
+
+class TestTimeseries(unittest.TestCase):
+    """Tests for the timeseries module."""
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        # accumulated field of 7 records, split in slabs of 3 records
+        self.accumulated = np.cumsum(rng.rand(7, 2, 3), axis=0)
+        self.expected = np.concatenate((self.accumulated[:1],
+                                        np.diff(self.accumulated, axis=0)))
+
+    def test_overlapping_slabs(self):
+        """Test slabs that repeat the last record of the previous slab."""
+        deaccumulate = deaccumulator()
+        result = np.concatenate([deaccumulate(self.accumulated[i:i + 3])
+                                 for i in [0, 2, 4]])
+        np.testing.assert_allclose(result, self.expected)
+
+    def test_consecutive_slabs(self):
+        """Test slabs without a repeated record across the joins."""
+        deaccumulate = deaccumulator(overlap=False)
+        result = np.concatenate([deaccumulate(self.accumulated[i:i + 3])
+                                 for i in [0, 3]] +
+                                [deaccumulate(self.accumulated[6:])])
+        np.testing.assert_allclose(result, self.expected)
+
+    def test_time_axis(self):
+        """Test vectorised time axis against netCDF4 date2num."""
+        units = 'minutes since 2010-01-01 00:00:00'
+        dt = pandas.date_range('2017-01-01', '2017-01-02', freq='1min')
+        expected = [date2num(d.to_pydatetime(), units=units,
+                             calendar='gregorian') for d in dt]
+        np.testing.assert_allclose(time_axis(dt, units), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
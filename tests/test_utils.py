@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+"""
+description:    Tests for the utils module
+license:        APACHE 2.0
+"""
+
+import os
+import tempfile
+import unittest
+
+from wrfpy import utils
+
+
+class TestTransferFile(unittest.TestCase):
+    """Tests for utils.transfer_file."""
+
+    def setUp(self):
+        utils.start_logging(os.devnull)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.temp_dir.name, 'wrfvar_input_d01')
+        self.dst = os.path.join(self.temp_dir.name, 'archive_d01')
+        with open(self.src, 'wb') as outfile:
+            outfile.write(b'wrfvar')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _content(self, filename):
+        with open(filename, 'rb') as infile:
+            return infile.read()
+
+    def test_copy(self):
+        """Test that copy leaves an independent copy."""
+        self.assertEqual('copy', utils.transfer_file(self.src, self.dst))
+        self.assertEqual(b'wrfvar', self._content(self.dst))
+        self.assertNotEqual(os.stat(self.src).st_ino,
+                            os.stat(self.dst).st_ino)
+
+    def test_move(self):
+        """Test that move removes the source file."""
+        self.assertEqual('move',
+                         utils.transfer_file(self.src, self.dst, 'move'))
+        self.assertFalse(os.path.exists(self.src))
+        self.assertEqual(b'wrfvar', self._content(self.dst))
+
+    def test_hardlink_replaces_existing(self):
+        """Test hard link on the same filesystem over an existing file."""
+        with open(self.dst, 'wb') as outfile:
+            outfile.write(b'partial')
+        self.assertEqual('hardlink',
+                         utils.transfer_file(self.src, self.dst, 'hardlink'))
+        self.assertEqual(os.stat(self.src).st_ino, os.stat(self.dst).st_ino)
+
+    def test_fallback(self):
+        """Test that copy-with-fallback links on the same filesystem."""
+        self.assertEqual('hardlink', utils.transfer_file(
+            self.src, self.dst, 'copy-with-fallback'))
+        self.assertEqual(b'wrfvar', self._content(self.dst))
+
+    def test_unknown_strategy(self):
+        """Test that an unknown strategy is rejected."""
+        with self.assertRaises(ValueError):
+            utils.transfer_file(self.src, self.dst, 'rsync')
+
+
+if __name__ == '__main__':
+    unittest.main()
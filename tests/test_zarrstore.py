@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+"""
+description:    Tests for the zarrstore module
+license:        APACHE 2.0
+"""
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from wrfpy import utils
+from wrfpy.zarrstore import zarrstore
+
+
+class TestZarrStore(unittest.TestCase):
+    """Tests for the zarrstore module."""
+
+    def setUp(self):
+        utils.start_logging(os.devnull)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'T2_d01.zarr')
+        rng = np.random.RandomState(0)
+        self.lat, self.lon = np.meshgrid(np.arange(7.), np.arange(9.),
+                                         indexing='ij')
+        # two days of hourly data, overlapping at midnight
+        self.data = rng.rand(49, 7, 9).astype('f4')
+        self.times = 60. * np.arange(49)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _append_days(self, store):
+        store.append('T2', self.data[:25], self.times[:25])
+        store.append('T2', self.data[24:], self.times[24:])
+
+    def test_append_days(self):
+        """Test appending overlapping days across partial chunks."""
+        store = zarrstore(self.path)
+        store.create('T2', (7, 9), [10, 4, 4], self.lat, self.lon)
+        self._append_days(store)
+        reopened = zarrstore(self.path)
+        np.testing.assert_array_equal(reopened.read('T2'), self.data)
+        np.testing.assert_array_equal(reopened.read('time'), self.times)
+        np.testing.assert_array_equal(reopened.read('T2', 20, 30),
+                                      self.data[20:30])
+        np.testing.assert_array_equal(reopened.read('latitude'), self.lat)
+
+    def test_append_idempotent(self):
+        """Test that appending the same records again is a no-op."""
+        store = zarrstore(self.path)
+        store.create('T2', (7, 9), [10, 4, 4], self.lat, self.lon)
+        self._append_days(store)
+        self.assertEqual(0, store.append('T2', self.data[24:],
+                                         self.times[24:]))
+        self.assertEqual([49, 7, 9],
+                         zarrstore(self.path).metadata['T2/.zarray']['shape'])
+
+    def test_append_gap(self):
+        """Test appending after a gap and filling the gap later."""
+        store = zarrstore(self.path)
+        store.create('T2', (7, 9), [10, 4, 4], self.lat, self.lon)
+        store.append('T2', self.data[:13], self.times[:13])
+        # records after 12:00 are missing, the next day is appended
+        self.assertEqual(25, store.append('T2', self.data[24:],
+                                          self.times[24:]))
+        gap = zarrstore(self.path).read('T2')
+        np.testing.assert_array_equal(gap[:13], self.data[:13])
+        np.testing.assert_array_equal(gap[24:], self.data[24:])
+        self.assertTrue(np.isnan(gap[13:24]).all())
+        self.assertTrue(np.isnan(store.read('time')[13:24]).all())
+        # a rerun of the missing records fills the gap
+        self.assertEqual(11, store.append('T2', self.data[12:25],
+                                          self.times[12:25]))
+        reopened = zarrstore(self.path)
+        np.testing.assert_array_equal(reopened.read('T2'), self.data)
+        np.testing.assert_array_equal(reopened.read('time'), self.times)
+        # records before the store or off its time step
+        for times in [self.times[:2] - 120, self.times[:2] + 30]:
+            self.assertRaises(ValueError, store.append, 'T2',
+                              self.data[:2], times)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,23 +1,16 @@
 #!/usr/bin/env python2
 
-from netCDF4 import Dataset
+from netCDF4 import Dataset, chartostring
 import numpy
-from geopy.distance import vincenty
 from wrfpy.config import config
 from wrfpy import utils
-from wrfpy.readObsTemperature import readObsTemperature
 import os
-from datetime import datetime
-import operator
-from numpy import unravel_index
-from numpy import shape as npshape
+from datetime import datetime, timedelta
 import glob
-import statsmodels.api as sm
 import csv
 import numpy as np
 import f90nml
-from scipy import interpolate
-from astropy.convolution import convolve
+from wrfpy.spatialfilter import spatial_filter
 
 
 def return_float_int(value):
@@ -38,46 +31,50 @@ def convert_to_number(list):
         return list
 
 
+class olsresults:
+    '''
+    Ordinary least squares fit of y on the columns of design matrix X,
+    X should contain a constant column. Provides the params, fvalue and
+    f_pvalue attributes of a statsmodels OLS fit.
+    '''
+    def __init__(self, y, X):
+        from scipy import stats
+        y = numpy.asarray(y, dtype=numpy.float64)
+        X = numpy.asarray(X, dtype=numpy.float64)
+        self.params, _, rank, _ = numpy.linalg.lstsq(X, y, rcond=None)
+        self.nobs = len(y)
+        self.df_model = rank - 1  # constant is not part of the model
+        self.df_resid = self.nobs - rank
+        ssr = numpy.sum((y - X.dot(self.params))**2)
+        centered_tss = numpy.sum((y - numpy.mean(y))**2)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            self.fvalue = (((centered_tss - ssr) / self.df_model) /
+                           (ssr / self.df_resid))
+        # F-test of the significance of all regressors
+        self.f_pvalue = stats.f.sf(self.fvalue, self.df_model,
+                                   self.df_resid)
+
+
 def reg_m(y, x):
-    ones = numpy.ones(len(x[0]))
-    X = sm.add_constant(numpy.column_stack((x[0], ones)))
-    for ele in x[1:]:
-        X = sm.add_constant(numpy.column_stack((ele, X)))
-    results = sm.OLS(y, X).fit()
-    return results
+    '''
+    Linear regression of y on the regressors in list x and a constant.
+    The params are ordered as x[-1], ..., x[0], constant.
+    '''
+    X = numpy.column_stack(list(x[::-1]) + [numpy.ones(len(x[0]))])
+    return olsresults(y, X)
 
 
 def find_gridpoint(lat_in, lon_in, lat, lon):
     '''
     lat_in, lon_in: lat/lon coordinate of point of interest
     lat, lon: grid of lat/lon to find closest index of gridpoint
+    For many points build a gridlocator once and query all points at once.
     '''
-    # extract window surrounding point
-    lon_window = lon[(lon >= lon_in - 0.10) &
-                     (lon <= lon_in + 0.10) &
-                     (lat >= lat_in - 0.10) &
-                     (lat <= lat_in + 0.10)]
-    lat_window = lat[(lon >= lon_in - 0.10) &
-                     (lon <= lon_in + 0.10) &
-                     (lat >= lat_in - 0.10) &
-                     (lat <= lat_in + 0.10)]
-
-    lonx = lon_window
-    latx = lat_window
-    # calculate distance to each point in the surrounding window
-    distance = [vincenty((lat_in, lon_in), (latx[idx], lonx[idx])).km
-                for idx in range(0, len(lonx))]
-    # find index of closest reference station to wunderground station
-    try:
-        min_index, min_value = min(enumerate(distance),
-                                   key=operator.itemgetter(1))
-        lat_sel = latx[min_index]
-        # indices of gridpoint
-        latidx = lat.reshape(-1).tolist().index(lat_sel)
-        (lat_idx, lon_idx) = unravel_index(latidx, npshape(lon))
-        return lat_idx, lon_idx
-    except ValueError:
+    from wrfpy.gridlocator import gridlocator
+    i_idx, j_idx, _ = gridlocator(lat, lon).query(lat_in, lon_in)
+    if i_idx[0] < 0:
         return None, None
+    return int(i_idx[0]), int(j_idx[0])
 
 
 class urbparm(config):
@@ -188,6 +185,37 @@ class urbparm(config):
             self.options['ALH'][-1] = self.alh
 
 
+class wrfvarsession:
+    '''
+    wrfvar_output file of a domain, opened once for both the diagnosis
+    (findDiffT) and the increment (applyToGrid) stage. Time, coordinates
+    and landuse are read when the file is opened, other fields are read
+    once on first use. Use mode='r' when no increments are applied.
+    '''
+    def __init__(self, filename, mode='r+'):
+        self.filename = filename
+        self.ncfile = Dataset(filename, mode)
+        self.fields = {}
+        # get datetime string from wrfvar_output file
+        self.datestr = str(chartostring(self.ncfile.variables['Times'][0]))
+        # convert to datetime object
+        self.dtobj = datetime.strptime(self.datestr, '%Y-%m-%d_%H:%M:%S')
+        self.lat = self.field('XLAT')
+        self.lon = self.field('XLONG')
+        self.lu_ind = self.field('LU_INDEX')
+
+    def field(self, var):
+        '''
+        Return first time step of var, read from file only once
+        '''
+        if var not in self.fields:
+            self.fields[var] = self.ncfile.variables[var][0, :]
+        return self.fields[var]
+
+    def close(self):
+        self.ncfile.close()
+
+
 class bumpskin(config):
     def __init__(self, filename, nstationtypes=None, dstationtypes=None):
         config.__init__(self)
@@ -206,12 +234,34 @@ class bumpskin(config):
         if not (isinstance(ndoms, int) and ndoms > 0):
             raise ValueError("'domains_max_dom' namelist variable should be an"
                              " integer>0")
+        # wrfvar_output files are opened once per domain
+        self.sessions = {}
+        self.locators = {}  # gridpointcache per grid
         try:
-            (lat, lon, diffT) = self.findDiffT(1)
-            for domain in range(1, ndoms+1):
-                self.applyToGrid(lat, lon, diffT, domain)
-        except TypeError:
-            pass
+            increment = self.findDiffT(1)
+            if increment is not None:
+                (lat, lon, diffT) = increment
+                for domain in range(1, ndoms+1):
+                    self.applyToGrid(lat, lon, diffT, domain)
+        finally:
+            self.close_sessions()
+
+    def session(self, domain):
+        '''
+        Return wrfvarsession of domain, open wrfvar_output if needed
+        '''
+        if domain not in self.sessions:
+            self.sessions[domain] = wrfvarsession(os.path.join(
+                self.wrfda_workdir, "d0" + str(domain), 'wrfvar_output'))
+        return self.sessions[domain]
+
+    def close_sessions(self):
+        '''
+        Close all opened wrfvar_output files
+        '''
+        for session in self.sessions.values():
+            session.close()
+        self.sessions = {}
 
     def verify_input(self, filename):
         '''
@@ -231,30 +281,6 @@ class bumpskin(config):
                 # re-raise error
                 raise
 
-    def get_time(self, wrfinput):
-        '''
-        get time from wrfinput file
-        '''
-        wrfinput = Dataset(wrfinput, 'r')  # open netcdf file
-        # get datetime string from wrfinput file
-        datestr = ''.join(wrfinput.variables['Times'][0])
-        # convert to datetime object
-        dtobj = datetime.strptime(datestr, '%Y-%m-%d_%H:%M:%S')
-        wrfinput.close()  # close netcdf file
-        return dtobj, datestr
-
-    @staticmethod
-    def getCoords(wrfinput):
-        '''
-        Return XLAT,XLONG coordinates from wrfinput file
-        '''
-        wrfinput = Dataset(wrfinput, 'r')  # open netcdf file
-        lat = wrfinput.variables['XLAT'][0, :]
-        lon = wrfinput.variables['XLONG'][0, :]
-        lu_ind = wrfinput.variables['LU_INDEX'][0, :]
-        wrfinput.close()
-        return (lat, lon, lu_ind)
-
     @staticmethod
     def clean_2m_temp(T2, LU_INDEX, iswater, filter=True):
         '''
@@ -263,13 +289,9 @@ class bumpskin(config):
         if filter:
             # set water points to NaN
             t2 = T2
-            t2[LU_INDEX[0, :] == iswater] = np.nan
-            # convolution kernel
-            kernel = np.array([[1, 1, 1], [1, 0, 1], [1, 1, 1]])
+            t2[LU_INDEX == iswater] = np.nan
             # apply convolution kernel
-            T2_filtered = convolve(t2[:], kernel,
-                                   nan_treatment='interpolate',
-                                   preserve_nan=True)
+            T2_filtered = spatial_filter(t2[:])
             # handle domain edges
             T2_filtered[0, :] = T2[0, :]
             T2_filtered[-1, :] = T2[-1, :]
@@ -286,45 +308,41 @@ class bumpskin(config):
                   str(np.sum(diff[diff > 3])/len(T2[diff > 3])))
         return T2
 
-    def get_urban_temp(self, wrfinput, ams):
+    def get_urban_temp(self, session, ams):
         '''
-        get urban temperature
+        get urban temperature from wrfvarsession session
         '''
-        wrfinput = Dataset(wrfinput, 'r')  # open netcdf file
-        # get datetime string from wrfinput file
-        LU_IND = wrfinput.variables['LU_INDEX'][0, :]
-        iswater = wrfinput.getncattr('ISWATER')
-        GLW_IND = wrfinput.variables['GLW'][0, :]
-        U10_IND = wrfinput.variables['U10'][0, :]
-        V10_IND = wrfinput.variables['V10'][0, :]
+        from wrfpy.gridlocator import grid_hash, gridpointcache, sample_points
+        LU_IND = session.lu_ind
+        iswater = session.ncfile.getncattr('ISWATER')
+        GLW_IND = session.field('GLW')
+        U10_IND = session.field('U10')
+        V10_IND = session.field('V10')
         UV10_IND = numpy.sqrt(U10_IND**2 + V10_IND**2)
-        lat = wrfinput.variables['XLAT'][0, :]
-        lon = wrfinput.variables['XLONG'][0, :]
-        T2_IND = wrfinput.variables['T2'][0, :]
+        # T2 is modified by the cleanup, use a copy
+        T2_IND = session.field('T2').copy()
         T2_IND = self.clean_2m_temp(T2_IND, LU_IND,
                                     iswater, filter=True)
-        T2 = []
-        U10 = []
-        V10 = []
-        GLW = []
-        LU = []
-        for point in ams:
-            i_idx, j_idx = find_gridpoint(point[0], point[1], lat, lon)
-            if (i_idx and j_idx):
-                T2.append(T2_IND[i_idx, j_idx])
-                U10.append(wrfinput.variables['U10'][0, i_idx, j_idx])
-                V10.append(wrfinput.variables['V10'][0, i_idx, j_idx])
-                GLW.append(wrfinput.variables['GLW'][0, i_idx, j_idx])
-                LU.append(wrfinput.variables['LU_INDEX'][0, i_idx, j_idx])
-            else:
-                T2.append(numpy.nan)
-                U10.append(numpy.nan)
-                V10.append(numpy.nan)
-                GLW.append(numpy.nan)
-                LU.append(numpy.nan)
-        wrfinput.close()
-        UV10 = numpy.sqrt(numpy.array(U10)**2 + numpy.array(V10)**2)
-        return (T2, numpy.array(GLW), UV10, numpy.array(LU), LU_IND,
+        # locate all stations on the grid, cached between cycles
+        key = grid_hash([session.lat, session.lon])
+        if key not in self.locators:
+            self.locators[key] = gridpointcache(self.wrf_rundir, session.lat,
+                                                session.lon)
+        locator = self.locators[key]
+        i_ams, j_ams, _ = locator.query([point[0] for point in ams],
+                                        [point[1] for point in ams])
+        # gridpoints on the first row or column are not used
+        outside = (i_ams <= 0) | (j_ams <= 0)
+        i_ams[outside] = -1
+        j_ams[outside] = -1
+        samples = sample_points({'T2': T2_IND, 'U10': U10_IND,
+                                 'V10': V10_IND, 'GLW': GLW_IND,
+                                 'LU': LU_IND}, i_ams, j_ams)
+        T2 = samples['T2']
+        GLW = samples['GLW']
+        LU = samples['LU']
+        UV10 = numpy.sqrt(samples['U10']**2 + samples['V10']**2)
+        return (T2, GLW, UV10, LU, LU_IND,
                 GLW_IND, UV10_IND)
 
     def findDiffT(self, domain):
@@ -332,19 +350,36 @@ class bumpskin(config):
         calculate increment of urban temperatures and apply increment
         to wrfinput file in wrfda directory
         '''
-        # load netcdf files
-        wrfda_workdir = os.path.join(self.wrfda_workdir, "d0" + str(domain))
-        wrfinput = os.path.join(wrfda_workdir, 'wrfvar_output')
-        # get datetime from wrfinput file
-        dtobj, datestr = self.get_time(wrfinput)
-        # get observed temperatures
-        obs = readObsTemperature(dtobj, nstationtypes=None,
-                                 dstationtypes=None).obs
+        from wrfpy.readObsTemperature import readObsTemperature
+        # wrfvar_output file of domain
+        session = self.session(domain)
+        # get observed temperatures, the cache file written by the
+        # wrfda_obs task is used if it is for the same station types
+        obs = readObsTemperature(session.dtobj,
+                                 nstationtypes=self.nstationtypes,
+                                 dstationtypes=self.dstationtypes).obs
+        diffT, info = self.diagnose(session, obs)
+        if info['nobs'] < 5:
+            # increments from fewer than 5 stations are not applied
+            return None
+        return (session.lat, session.lon, diffT)
+
+    def diagnose(self, session, obs):
+        '''
+        calculate increment of urban temperatures diffT for the model
+        fields of wrfvarsession session and station observations obs
+        returns diffT and a dictionary describing the increment:
+            method: 'none', 'median' or 'fit'
+            nobs: number of stations used
+            median, params, f_pvalue: median and fit of the station
+            increments
+        '''
+        info = {'method': 'none', 'median': numpy.nan,
+                'params': numpy.full(3, numpy.nan), 'f_pvalue': numpy.nan}
         obs_temp = [obs[idx][2] for idx in range(0, len(obs))]
         # get modeled temperatures at location of observation stations
         t_urb, glw, uv10, lu, LU_IND, glw_IND, uv10_IND = self.get_urban_temp(
-          wrfinput, obs)
-        lat, lon, lu_ind = self.getCoords(wrfinput)  # get coordinates
+          session, obs)
         diffT_station = numpy.array(obs_temp) - numpy.array(t_urb)
         # calculate median and standard deviation, ignore outliers > 10K
         # only consider landuse class 1
@@ -361,6 +396,7 @@ class bumpskin(config):
         print('print diffT station')
         print(diffT_station[(abs(diffT_station) < 5)])
         print('end print diffT station')
+        info['nobs'] = len(lu)
         # depending on the number of observations, calculate the temperature
         # increment differently
         if (len(lu) < 3):
@@ -372,6 +408,7 @@ class bumpskin(config):
             print('Median temperature increment applied: ' + str(median))
             diffT = median * numpy.ones(numpy.shape(glw_IND))
             diffT[LU_IND != 1] = 0
+            info.update(method='median', median=median)
         else:
             # fit statistical model
             # define mask
@@ -383,43 +420,80 @@ class bumpskin(config):
             # recalculate median
             median = numpy.nanmedian(diffT_station[mask])
             fit = reg_m(diffT_station[mask], [(glw)[mask], uv10[mask]])
+            info.update(median=median, params=fit.params,
+                        f_pvalue=fit.f_pvalue)
             # calculate diffT for every gridpoint
             if fit.f_pvalue <= 0.1:  # use fit if significant
-                print('Temperature increment applied from statistical ',
-                      + 'fit with values: ' + str(fit.params))
+                print('Temperature increment applied from statistical ' +
+                      'fit with values: ' + str(fit.params))
                 diffT = (fit.params[1] * glw_IND +
                          fit.params[0] * uv10_IND + fit.params[2])
+                info['method'] = 'fit'
             else:  # use median
                 print('Median temperature increment applied: ' + str(median))
                 diffT = median * numpy.ones(numpy.shape(glw_IND))
+                info['method'] = 'median'
             diffT[LU_IND != 1] = 0  # set to 0 if LU_IND!=1
-            return (lat, lon, diffT)
+        return diffT, info
+
+    def level_factors(self, var, default):
+        '''
+        Return increment factors per level of var from the config, or
+        default if none are defined
+        '''
+        try:
+            factors = self.config['options_urbantemps'][var]
+        except KeyError:
+            factors = default
+        if not (isinstance(factors, list) and len(factors) > 1):
+            factors = default
+        return factors
+
+    @staticmethod
+    def increment_levels(variable, diffT, factors, reset=None):
+        '''
+        Increment all levels of a (Time, level, y, x) netCDF variable with
+        diffT times the factor of the level, levels without a factor are
+        not incremented. The variable is read and written in a single call.
+        reset: optional tuple (mask, values), values are used instead of the
+        variable at points where the 2D mask is True before incrementing
+        '''
+        data = variable[0, :]
+        levs = numpy.shape(data)[0]
+        factors = numpy.array([float(factor) for factor in factors[:levs]])
+        factors = numpy.pad(factors, (0, levs - len(factors)))
+        if reset is not None:
+            mask, values = reset
+            data = numpy.ma.where(mask, values, data)
+        variable[0, :] = data + (factors[:, numpy.newaxis, numpy.newaxis] *
+                                 numpy.reshape(diffT, numpy.shape(data)[1:]))
 
     def applyToGrid(self, lat, lon, diffT, domain):
-        # load netcdf files
-        wrfda_workdir = os.path.join(self.wrfda_workdir, "d0" + str(domain))
-        wrfinputFile = os.path.join(wrfda_workdir, 'wrfvar_output')
-        lat2, lon2, lu_ind2 = self.getCoords(wrfinputFile)
+        # wrfvar_output file of domain, opened by findDiffT for domain 1
+        session = self.session(domain)
+        lat2, lon2, lu_ind2 = session.lat, session.lon, session.lu_ind
         # get datetime from wrfinput file
-        dtobj, datestr = self.get_time(wrfinputFile)
+        dtobj, datestr = session.dtobj, session.datestr
         # if not ((lat==lat2) and (lon==lon2)) we need to interpolate
         if not (np.array_equal(lat, lat2) and np.array_equal(lon, lon2)):
-            # do interpolation to get new diffT
-            diffT = interpolate.griddata(
-                (lon.reshape(-1), lat.reshape(-1)), diffT.reshape(-1),
-                (lon2.reshape(-1), lat2.reshape(-1)),
-                method='cubic').reshape(np.shape(lon2))
+            # do interpolation to get new diffT, the triangulation of the
+            # grids is cached in the work_dir
+            from wrfpy.regrid import regridder
+            try:
+                method = self.config['options_urbantemps']['regrid']
+            except KeyError:
+                method = 'cubic'
+            if not method:
+                method = 'cubic'
+            diffT = regridder(self.wrf_rundir, lat, lon, lat2, lon2,
+                              method=method).regrid(diffT)
             diffT[lu_ind2 != 1] = 0  # set to 0 if LU_IND!=1
-        # open wrfvar_output (output after data assimilation)
-        self.wrfinput2 = Dataset(os.path.join(wrfda_workdir, 'wrfvar_output'),
-                                 'r+')
+        # wrfvar_output (output after data assimilation)
+        self.wrfinput2 = session.ncfile
         # open wrfvar_input (input before DA (last step previous run)
         start_date = utils.return_validate(
           self.config['options_general']['date_start'])
         if (dtobj == start_date):  # very first timestep
-            self.wrfinput3 = Dataset(os.path.join
-                                     (self.wrf_rundir,
-                                      ('wrfinput_d0' + str(domain))), 'r')
             return
         else:
             self.wrfinput3 = Dataset(os.path.join
@@ -467,69 +541,146 @@ class bumpskin(config):
         TGR_URB[:] = TGR_URB[:] + diffT
 
         # wall layer temperature
-        try:
-            TBL_URB_factors = self.config['options_urbantemps']['TBL_URB']
-        except KeyError:
-            # fallback values if none are defined in config
-            # these may not work correctly for other cities than Amsterdam
-            TBL_URB_factors = [0.823, 0.558, 0.379, 0.257]
-        if not (isinstance(TBL_URB_factors, list) and
-                len(TBL_URB_factors) > 1):
-            TBL_URB_factors = [0.823, 0.558, 0.379, 0.257]
-        TBL_URB = self.wrfinput2.variables['TBL_URB']
-        levs = numpy.shape(self.wrfinput2.variables['TBL_URB'][:])[1]
-        TBL_URB = self.wrfinput2.variables['TBL_URB']
-        for lev in range(0, levs):
-            try:
-                TBL_URB[0, lev, :] = (TBL_URB[0, lev, :] +
-                                      diffT * float(TBL_URB_factors[lev]))
-            except IndexError:
-                # no factor for this layer => no increment
-                pass
-
+        # fallback values if none are defined in config
+        # these may not work correctly for other cities than Amsterdam
+        self.increment_levels(self.wrfinput2.variables['TBL_URB'], diffT,
+                              self.level_factors('TBL_URB',
+                                                 [0.823, 0.558, 0.379, 0.257]))
         # road layer temperature
+        self.increment_levels(self.wrfinput2.variables['TGL_URB'], diffT,
+                              self.level_factors('TGL_URB',
+                                                 [0.776, 0.170, 0.004]))
+        #  adjustment soil for vegetation fraction urban cell
+        # reset TSLB for urban cells to value before update_lsm
+        self.increment_levels(self.wrfinput2.variables['TSLB'], diffT,
+                              self.level_factors('TSLB', [0.507, 0.009]),
+                              reset=(lu_ind2 == 1,
+                                     self.wrfinput3.variables['TSLB'][0, :]))
+
+        # close netcdf files
+        self.sessions.pop(domain).close()
+        self.wrfinput3.close()
+
+
+class bumpskinbatch(bumpskin):
+    '''
+    Urban temperature increments diffT of domain 1 for all cycles from
+    datestart to dateend (inclusive, every interval hours), computed in a
+    single process and written to one netCDF file outfile, e.g. to tune
+    the urban correction over a reanalysis period. No increments are
+    applied to model files.
+    The model fields of a cycle are read from the file given by the
+    strftime pattern filename, by default the wrfvar_input files archived
+    by the archive task. Every station file is opened once and the
+    gridpoints of the stations are reused for all cycles.
+    '''
+    methods = ['none', 'median', 'fit']
+
+    def __init__(self, datestart, dateend, outfile, filename=None,
+                 interval=2, nstationtypes=None, dstationtypes=None):
+        from wrfpy.readObsTemperature import stationdata, station_files
+        config.__init__(self)
+        self.nstationtypes = nstationtypes  # stationtypes at night
+        self.dstationtypes = dstationtypes  # stationtypes during daytime
+        self.wrf_rundir = self.config['filesystem']['work_dir']
+        self.locators = {}  # gridpointcache per grid
+        if not filename:
+            filename = os.path.join(self.config['filesystem']['archive_dir'],
+                                    '%Y', 'wrfvar',
+                                    'wrfvar_input_d01_%Y-%m-%d_%H:%M:%S')
+        ncycles = int((dateend - datestart).total_seconds() //
+                      (interval * 3600)) + 1
+        self.dates = [datestart + timedelta(hours=interval * cycle)
+                      for cycle in range(ncycles)]
+        filelist = station_files(
+            self.config['options_urbantemps']['urban_stations'])
         try:
-            TGL_URB_factors = self.config['options_urbantemps']['TGL_URB']
+            storedir = self.config['options_urbantemps']['station_store']
         except KeyError:
-            # fallback values if none are defined in config
-            # these may not work correctly for other cities than Amsterdam
-            TGL_URB_factors = [0.776, 0.170, 0.004]
-        if not (isinstance(TGL_URB_factors, list) and
-                len(TGL_URB_factors) > 1):
-            TGL_URB_factors = [0.776, 0.170, 0.004]
-        TGL_URB = self.wrfinput2.variables['TGL_URB']
-        levs = numpy.shape(self.wrfinput2.variables['TGL_URB'][:])[1]
-        TGL_URB = self.wrfinput2.variables['TGL_URB']
-        for lev in range(0, levs):
-            try:
-                TGL_URB[0, lev, :] = (TGL_URB[0, lev, :] +
-                                      diffT * float(TGL_URB_factors[lev]))
-            except IndexError:
-                # no factor for this layer => no increment
-                pass
+            storedir = False
+        self.stations = None
+        if storedir:
+            from wrfpy.stationstore import open_store
+            self.stations = open_store(storedir, filelist)
+        if self.stations is None:
+            # open every station file once for all cycles
+            self.stations = stationdata(filelist, self.dates)
+        self.run(filename, outfile)
 
-        #  adjustment soil for vegetation fraction urban cell
+    def run(self, filename, outfile):
+        '''
+        Calculate diffT for all cycles and write to outfile
+        '''
+        ncfile = None
         try:
-            TSLB_factors = self.config['options_urbantemps']['TSLB']
-        except KeyError:
-            # fallback values if none are defined in config
-            # these may not work correctly for other cities than Amsterdam
-            TSLB_factors = [0.507, 0.009]
-        if not (isinstance(TSLB_factors, list) and
-                len(TSLB_factors) > 1):
-            TSLB_factors = [0.507, 0.009]
-        TSLB = self.wrfinput2.variables['TSLB']  # after update_lsm
-        TSLB_in = self.wrfinput3.variables['TSLB']  # before update_lsm
-        levs = numpy.shape(self.wrfinput2.variables['TSLB'][:])[1]
-        for lev in range(0, levs):
-            # reset TSLB for urban cells to value before update_lsm
-            TSLB[0, lev, :][lu_ind2 == 1] = TSLB_in[0, lev, :][lu_ind2 == 1]
-            try:
-                TSLB[0, lev, :] = (TSLB[0, lev, :] +
-                                   diffT * float(TSLB_factors[lev]))
-            except IndexError:
-                pass
+            for cycle, dtobj in enumerate(self.dates):
+                try:
+                    session = wrfvarsession(dtobj.strftime(filename),
+                                            mode='r')
+                except IOError:
+                    print('No model file for ' + str(dtobj) + ', skipping')
+                    continue
+                try:
+                    obs = self.stations.obs(dtobj, self.nstationtypes,
+                                            self.dstationtypes)
+                    diffT, info = self.diagnose(session, obs)
+                    if ncfile is None:
+                        ncfile = self.create_output(outfile, session.lat,
+                                                    session.lon)
+                    self.write_cycle(ncfile, cycle, diffT, info)
+                finally:
+                    session.close()
+        finally:
+            if ncfile is not None:
+                ncfile.close()
+        if ncfile is None:
+            raise IOError('No model files found matching ' + filename)
 
-        # close netcdf file
-        self.wrfinput2.close()
-        self.wrfinput3.close()
+    def create_output(self, outfile, lat, lon):
+        '''
+        Create output netCDF file, cycles without a model file are masked
+        '''
+        from netCDF4 import date2num
+        ncfile = Dataset(outfile, 'w')
+        ncfile.createDimension('time', len(self.dates))
+        ncfile.createDimension('south_north', numpy.shape(lat)[0])
+        ncfile.createDimension('west_east', numpy.shape(lat)[1])
+        ncfile.createDimension('param', 3)
+        grid = ('south_north', 'west_east')
+        time = ncfile.createVariable('time', 'f8', ('time',))
+        time.units = 'minutes since 2010-01-01 00:00:00'
+        time.calendar = 'gregorian'
+        time[:] = date2num(self.dates, units=time.units,
+                           calendar=time.calendar)
+        for var, coordinate in [('XLAT', lat), ('XLONG', lon)]:
+            ncfile.createVariable(var, 'f4', grid)[:] = coordinate
+        diffT = ncfile.createVariable('diffT', 'f4', ('time',) + grid,
+                                      zlib=True,
+                                      chunksizes=(1,) + numpy.shape(lat))
+        diffT.units = 'K'
+        diffT.description = 'urban temperature increment'
+        method = ncfile.createVariable('method', 'i1', ('time',))
+        method.flag_values = numpy.arange(len(self.methods), dtype='i1')
+        method.flag_meanings = ' '.join(self.methods)
+        ncfile.createVariable('nobs', 'i4', ('time',)).description = (
+            'number of stations used')
+        ncfile.createVariable('median', 'f8', ('time',)).description = (
+            'median increment of the stations')
+        ncfile.createVariable('params', 'f8', ('time', 'param')
+                              ).description = (
+            'regression parameters: uv10, glw, constant')
+        ncfile.createVariable('f_pvalue', 'f8', ('time',)).description = (
+            'p-value of the F-test of the regression')
+        return ncfile
+
+    def write_cycle(self, ncfile, cycle, diffT, info):
+        '''
+        Write diffT and increment information of a cycle
+        '''
+        ncfile.variables['diffT'][cycle] = diffT
+        ncfile.variables['method'][cycle] = self.methods.index(
+            info['method'])
+        ncfile.variables['nobs'][cycle] = info['nobs']
+        ncfile.variables['median'][cycle] = info['median']
+        ncfile.variables['params'][cycle] = info['params']
+        ncfile.variables['f_pvalue'][cycle] = info['f_pvalue']
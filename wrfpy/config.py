@@ -66,8 +66,13 @@ class config:
                   'slurm_metgrid.exe', 'slurm_geogrid.exe',
                   'slurm_obsproc.exe', 'slurm_updatebc.exe',
                   'slurm_da_wrfvar.exe']
+    # pool: 'process' (default) or 'thread'; thread workers serialize all
+    # netCDF access, they only avoid the fork and pickle cost of processes
     keys_urbantemps = ['TBL_URB', 'TGL_URB', 'TSLB',
-                       'ah.csv', 'urban_stations']
+                       'ah.csv', 'urban_stations', 'regrid',
+                       'station_store', 'workers', 'pool']
+    keys_archive = ['workers', 'encoding', 'cache_size', 'transfer',
+                    'store']
     # create dictionaries
     config_dir = {key: '' for key in keys_dir}
     options_general = {key: '' for key in keys_general}
@@ -77,6 +82,7 @@ class config:
     options_wps = {key: '' for key in keys_wps}
     options_slurm = {key: '' for key in keys_slurm}
     options_urbantemps = {key: '' for key in keys_urbantemps}
+    options_archive = {key: '' for key in keys_archive}
     # combine dictionaries
     config_out = {}
     config_out['filesystem'] = config_dir
@@ -87,6 +93,7 @@ class config:
     config_out['options_wrfda'] = options_wrfda
     config_out['options_general'] = options_general
     config_out['options_urbantemps'] = options_urbantemps
+    config_out['options_archive'] = options_archive
     # write json config file
     with open(self.configfile, 'w') as outfile:
       json.dump(config_out, outfile,sort_keys=True, indent=4)
@@ -1,22 +1,65 @@
 #!/usr/bin/env python
 
 from netCDF4 import Dataset as ncdf
-from netCDF4 import date2num
 import pandas
 import time
 import os
 from dateutil import relativedelta
 import argparse
 import f90nml
-import shutil
+import traceback
+from collections import OrderedDict
 from wrfpy.config import config
 from wrfpy import utils
-from astropy.convolution import convolve
+from wrfpy import spatialfilter
+from wrfpy.manifest import manifest, checksum
+from wrfpy.zarrstore import zarrstore
+from wrfpy.timeseries import deaccumulator, time_axis
 import numpy as np
 
 
+class slabcache:
+    '''
+    Least recently used cache of input slabs, bounded by size in bytes
+    '''
+    def __init__(self, maxbytes):
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self.slabs = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        '''
+        Return a copy of the cached slab or None if it is not cached
+        '''
+        try:
+            slab = self.slabs.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        # mark slab as most recently used
+        self.slabs[key] = slab
+        self.hits += 1
+        return slab.copy()
+
+    def put(self, key, slab):
+        '''
+        Add slab to the cache, evicting least recently used slabs
+        '''
+        if slab.nbytes > self.maxbytes:
+            return
+        if key in self.slabs:
+            self.nbytes -= self.slabs.pop(key).nbytes
+        self.slabs[key] = slab
+        self.nbytes += slab.nbytes
+        while self.nbytes > self.maxbytes:
+            _, evicted = self.slabs.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+
 class postprocess(config):
-    def __init__(self, datestart, dateend):
+    def __init__(self, datestart, dateend, run=True):
         config.__init__(self)
         self.startdate = datestart
         self.enddate = dateend
@@ -38,12 +81,28 @@ class postprocess(config):
         # domain, hourly for the other domains
         self.define_vars_minute()
         self.define_vars_deac()  # define variables to be deaccumulated
+        self.define_vars_derived()  # define variables computed from others
+        # cache input slabs of variables needed by derived variables
+        self.cache = slabcache(
+            int(self.archive_option('cache_size', 256)) * 1024**2)
+        # record of completely archived files, to resume interrupted runs,
+        # one manifest per archived day keeps saving it cheap
+        datestr = self.startdate.strftime('%Y-%m-%d_%H:%M:%S')
+        self.manifest = manifest(os.path.join(
+            self.archivedir, 'manifest_' + datestr + '.json'))
+        if run:
+            self.run()
+
+    def run(self):
+        '''
+        archive all output and cleanup the WRF run directory
+        '''
         self.archive()  # archive "normal" variables
         self.archive_wrfvar_input()  # archive wrfvar_input files
         # get start_date from config.json
         start_date = utils.return_validate(
             self.config['options_general']['date_start'])
-        if (start_date == datestart):  # very first timestep
+        if (start_date == self.startdate):  # very first timestep
             self.archive_static()  # archive static variables
         self.cleanup()
 
@@ -146,38 +205,102 @@ class postprocess(config):
             'GRAUPELNC',
             'HAILNC']
 
-    def write_netcdf(self, var, inpdata, lat, lon, dt, dim, outfile):
+    def var_class(self, var, domain):
         '''
-        Write netcdf output file
+        Return output class of var: minute output for minute variables in
+        the inner domain, hourly output otherwise
+        '''
+        if (var in self.minute_var) and (domain == self.ndoms):
+            return 'minute'
+        else:
+            return 'hourly'
+
+    def get_encoding(self, var, domain):
+        '''
+        Return netCDF encoding settings for an archived variable.
+        Settings are read from options_archive.encoding in config.json,
+        where settings for the variable itself take precedence over
+        settings for its class (minute/hourly) and the default settings
+        '''
+        encoding = {'complevel': 4, 'shuffle': True, 'chunking': None,
+                    'least_significant_digit': None}
+        settings = self.archive_option('encoding', {})
+        for key in ['default', self.var_class(var, domain), var]:
+            encoding.update(settings.get(key, {}))
+        return encoding
+
+    @staticmethod
+    def chunk_shape(chunking, shape):
+        '''
+        Return netCDF chunk sizes for an output variable of shape
+          - timeseries: full time axis, small horizontal tiles
+          - map: a single time step of the full field
+          - list: explicit chunk sizes
+        Returns None to use the default chunking of the netCDF library
+        '''
+        if not chunking:
+            return None
+        elif chunking == 'timeseries':
+            # horizontal tile size that keeps a chunk below ~1 MB of f4
+            tile = max(1, int(np.sqrt(2**18 / shape[0])))
+            return ([shape[0]] + [1] * (len(shape) - 3) +
+                    [min(tile, size) for size in shape[-2:]])
+        elif chunking == 'map':
+            return [1] + list(shape[1:])
+        elif isinstance(chunking, list) and len(chunking) == len(shape):
+            return [min(int(chunk), size) for chunk, size
+                    in zip(chunking, shape)]
+        else:
+            message = ('Unsupported chunking %s for variable of shape %s' %
+                       (chunking, shape))
+            utils.logger.error(message)
+            raise ValueError(message)
+
+    def create_netcdf(self, var, shape, lat, lon, dt, outfile,
+                      encoding=None):
+        '''
+        Create netcdf output file with a preallocated time dimension
+        Returns the open netCDF file and the (still empty) output variable
         '''
+        if not encoding:
+            encoding = {'complevel': 4, 'shuffle': True, 'chunking': None,
+                        'least_significant_digit': None}
+        chunksizes = self.chunk_shape(encoding['chunking'],
+                                      [len(dt)] + list(shape[1:]))
+        kwargs = {'zlib': int(encoding['complevel']) > 0,
+                  'complevel': int(encoding['complevel']),
+                  'shuffle': bool(encoding['shuffle']),
+                  'chunksizes': chunksizes,
+                  'least_significant_digit':
+                  encoding['least_significant_digit'],
+                  'fill_value': -999}
         # open output file
         ncfile = ncdf(outfile, 'w')
         # create dimensions and variables
-        if dim == 3:
+        if len(shape) == 3:
             ncfile.createDimension('time', len(dt))
-            ncfile.createDimension('south_north', np.shape(inpdata)[1])
-            ncfile.createDimension('west_east', np.shape(inpdata)[2])
+            ncfile.createDimension('south_north', shape[1])
+            ncfile.createDimension('west_east', shape[2])
             data = ncfile.createVariable(var, 'f4',
                                          ('time', 'south_north', 'west_east',),
-                                         zlib=True, fill_value=-999)
-        elif dim == 4:
+                                         **kwargs)
+        elif len(shape) == 4:
             ncfile.createDimension('time', len(dt))
-            ncfile.createDimension('bottom_top', np.shape(inpdata)[1])
-            ncfile.createDimension('south_north', np.shape(inpdata)[2])
-            ncfile.createDimension('west_east', np.shape(inpdata)[3])
+            ncfile.createDimension('bottom_top', shape[1])
+            ncfile.createDimension('south_north', shape[2])
+            ncfile.createDimension('west_east', shape[3])
             data = ncfile.createVariable(var, 'f4',
                                          ('time', 'bottom_top',
                                           'south_north', 'west_east',),
-                                         zlib=True, fill_value=-999)
+                                         **kwargs)
         data1 = ncfile.createVariable('latitude', 'f4',
                                       ('south_north', 'west_east',), zlib=True)
         data2 = ncfile.createVariable('longitude', 'f4',
                                       ('south_north', 'west_east',), zlib=True)
         timevar = ncfile.createVariable('time', 'f4', ('time',), zlib=True)
         # time axis UTC
-        dt = [date2num(d.to_datetime(),
-                       units='minutes since 2010-01-01 00:00:00',
-                       calendar='gregorian') for d in dt]
+        dt = time_axis(dt, units='minutes since 2010-01-01 00:00:00',
+                       calendar='gregorian')
         # define attributes
         timevar.units = 'minutes since 2010-01-01 00:00:00'
         timevar.calendar = 'gregorian'
@@ -195,10 +318,6 @@ class postprocess(config):
         data2.FieldType = 104
         data2.MemoryOrder = "XY"
         data2.coordinates = "lon lat"
-        try:
-            data[:] = inpdata[:]
-        except IndexError:
-            raise
         # lat/lon should be a static field
         try:
             data1[:] = lat[0, :]
@@ -208,12 +327,69 @@ class postprocess(config):
         timevar[:] = dt
         # Add global attributes
         ncfile.history = 'Created ' + time.ctime(time.time())
+        return ncfile, data
+
+    def define_vars_derived(self):
+        '''
+        Variables computed from other variables, with the variables they
+        depend on
+        '''
+        self.derived_var = {
+            'TC2M_URB': ['T2', 'TP2M_URB']}
+
+    def job_groups(self):
+        '''
+        Group variables that need to be archived, derived variables are
+        grouped with the variables they depend on so they can reuse the
+        cached input slabs. Derived variables sharing an input end up in
+        the same group.
+        '''
+        archive_vars = self.hour_var + self.minute_var
+        groups = []
+        # derived variables first, pulling in their inputs
+        for var in archive_vars:
+            if var not in self.derived_var:
+                continue
+            group = []
+            for dep in self.derived_var[var]:
+                if dep not in archive_vars or dep in group:
+                    continue
+                shared = [grp for grp in groups if dep in grp]
+                if shared:
+                    # merge with the group of another derived variable
+                    groups.remove(shared[0])
+                    group = shared[0] + group
+                else:
+                    group.append(dep)
+            groups.append(group + [var])
+        # remaining variables on their own
+        grouped = [var for group in groups for var in group]
+        groups += [[var] for var in archive_vars if var not in grouped]
+        return groups
+
+    def write_netcdf(self, var, inpdata, lat, lon, dt, dim, outfile):
+        '''
+        Write netcdf output file
+        '''
+        ncfile, data = self.create_netcdf(var, np.shape(inpdata), lat, lon,
+                                          dt, outfile)
+        try:
+            data[:] = inpdata[:]
+        except IndexError:
+            raise
         ncfile.close()
 
     def getvar(self, var, domain, datestr):
         '''
         Read variable form netCDF file and return array
+        Input of derived variables is served from the slab cache if present
         '''
+        cached = any(var in deps for deps in self.derived_var.values())
+        key = (var, domain, datestr)
+        if cached:
+            tmp = self.cache.get(key)
+            if tmp is not None:
+                return tmp
         # define and load input file
         input_fn = var + '_d0' + str(domain) + '_' + datestr
         input_file = os.path.join(self.rundir, input_fn)
@@ -221,6 +397,10 @@ class postprocess(config):
         # read variable and close netCDF file
         tmp = ncfile.variables[var][:]
         ncfile.close()
+        if cached:
+            self.cache.put(key, tmp)
+            # callers may modify the returned array in place
+            tmp = tmp.copy()
         return tmp
 
     @staticmethod
@@ -228,113 +408,326 @@ class postprocess(config):
         '''
         Apply spatial convolution filter to input data
         '''
-        kernel = np.array([[1, 1, 1], [1, 0, 1], [1, 1, 1]])
-        if data.ndim == 2:
-            dataF = convolve(data[:], kernel,
-                             nan_treatment='interpolate',
-                             preserve_nan=True)
-            return dataF
-        elif data.ndim == 3:
-            dataF = np.zeros(np.shape(data))
-            for i in range(0, len(data)):
-                dataF[i, :] = convolve(data[i, :], kernel,
-                                       nan_treatment='interpolate',
-                                       preserve_nan=True)
-            return dataF
-        else:
-            return data
+        return spatialfilter.spatial_filter(data)
+
+    def archive_option(self, key, default):
+        '''
+        Return option from the options_archive section of config.json,
+        fall back to default if the option is not defined
+        '''
+        try:
+            value = self.config['options_archive'][key]
+        except KeyError:
+            return default
+        if value in ('', None):
+            return default
+        return value
 
     def archive(self):
         '''
         archive standard output files
         '''
-        # loop over all domains
+        # one archive job per (domain, group of variables), skipping
+        # variables that were archived completely by a previous run
+        jobs = []
         for domain in range(1, self.ndoms + 1):
-            # get lat/lon information from wrfout
-            datestr_fn = self.startdate.strftime('%Y-%m-%d_%H:%M:%S')
-            wrfout_n = 'wrfout_d0' + str(domain) + '_' + datestr_fn
-            wrfout = ncdf(os.path.join(self.rundir, wrfout_n), 'r')
-            lat = wrfout.variables['XLAT'][:]
-            lon = wrfout.variables['XLONG'][:]
-            lat_u = wrfout.variables['XLAT_U'][:]
-            lon_u = wrfout.variables['XLONG_U'][:]
-            lat_v = wrfout.variables['XLAT_V'][:]
-            lon_v = wrfout.variables['XLONG_V'][:]
-            frc_urb = wrfout.variables['FRC_URB2D'][:]
-            wrfout.close()
-            # iterate over all variables that need to be archived
-            for var in (self.hour_var + self.minute_var):
-                print(var)
-                output_fn = (var + '_d0' + str(domain) +
-                             '_' + datestr_fn + '.nc')
-                output_file = os.path.join(self.archivedir, output_fn)
-                for cdate in pandas.date_range(self.startdate, self.enddate,
-                                               freq='2H')[:-1]:
-                    datestr_in = cdate.strftime('%Y-%m-%d_%H:%M:%S')
-                    if not var == 'TC2M_URB':
-                        tmp = self.getvar(var, domain, datestr_in)
-                    else:
-                        # compute TC2M_URB from T2, TP2M_URB and FRC_URB2D
-                        # load required variables
-                        tp2m_urb = self.getvar('TP2M_URB', domain, datestr_in)
-                        # set non-urban points to NaN instead of 0
-                        tp2m_urb[tp2m_urb == 0] = np.nan
-                        t2 = self.getvar('T2', domain, datestr_in)
-                        # compute tc2m_urb
-                        tmp = (t2 - (1 - frc_urb) * tp2m_urb) / frc_urb
-                        # compute spatial filtered variant
-                        tmpF = (self.spatial_filter(t2) -
-                                (1 - frc_urb) *
-                                self.spatial_filter(tp2m_urb)) / frc_urb
-                        # overwrite outer edges of domain with original data
-                        tmpF[:, 0, :] = tmp[:, 0, :]
-                        tmpF[:, -1, :] = tmp[:, -1, :]
-                        tmpF[:, :, 0] = tmp[:, :, 0]
-                        tmpF[:, :, -1] = tmp[:, :, -1]
-                        # difference between filtered/unfiltered
-                        diff = np.abs(tmp - tmpF)
-                        # replace points in tmp where diff>1 with tmpF
-                        tmp[diff > 1] = tmpF[diff > 1]
-                        # set NaN to 0 in tc2m_urb
-                        tmp[np.isnan(tmp)] = 0
-                    # combine steps from input files
-                    if var in self.deac_var:
-                        # need to deaccumulate this variable
-                        try:
-                            output = np.vstack((output,
-                                                np.diff(tmp, axis=0)))
-                        except NameError:
-                            output = np.vstack((tmp[0, :][np.newaxis, :],
-                                                np.diff(tmp, axis=0)))
-                    else:
-                        # variable only needs appending
-                        try:
-                            output = np.vstack((output, tmp[1:]))
-                        except NameError:
-                            output = tmp
-                # find number of dimensions (3d/4d variable)
-                dim = np.ndim(tmp)
-                del tmp  # cleanup
-                # define time variable in output file
-                if (var in self.minute_var) and (domain == self.ndoms):
-                    # minute variable in inner domain => minute output
-                    dt = pandas.date_range(self.startdate, self.enddate,
-                                           freq='1min')[:]
-                else:
-                    # else hourly output
-                    dt = pandas.date_range(self.startdate, self.enddate,
-                                           freq='1H')[:]
-                # write netcdf outfile
-                if var == 'U':
-                    self.write_netcdf(var, output, lat_u, lon_u, dt, dim,
-                                      output_file)
-                elif var == 'V':
-                    self.write_netcdf(var, output, lat_v, lon_v, dt, dim,
-                                      output_file)
+            for group in self.job_groups():
+                todo = [var for var in group if not self.manifest.complete(
+                    self.output_name(var, domain))]
+                if todo:
+                    jobs.append((todo, domain))
+                for var in group:
+                    if var not in todo:
+                        utils.logger.info('Skipping %s, already archived' %
+                                          self.output_name(var, domain))
+        workers = int(self.archive_option('workers', 1))
+        results = []
+        if workers > 1:
+            # fan out archive jobs over a pool of processes
+            from pathos.multiprocessing import ProcessPool as Pool
+            pool = Pool(nodes=workers)
+            try:
+                for job_results in pool.imap(self.archive_job, jobs):
+                    self.record(job_results)
+                    results += job_results
+            finally:
+                pool.close()
+                pool.join()
+                pool.clear()
+        else:
+            for job in jobs:
+                job_results = self.archive_job(job)
+                self.record(job_results)
+                results += job_results
+        # report failed jobs
+        failed = [result for result in results if result['error']]
+        for result in failed:
+            utils.logger.error('Archiving %s for domain %i failed:\n%s' %
+                               (result['var'], result['domain'],
+                                result['error']))
+        store_failed = [result for result in results
+                        if result.get('store_error')]
+        if store_failed:
+            utils.logger.error('Appending to the store failed for: %s' %
+                               ', '.join(result['var'] + '_d0' +
+                                         str(result['domain'])
+                                         for result in store_failed))
+        if failed:
+            message = ('Archiving failed for %i of %i variables: %s' %
+                       (len(failed), len(results),
+                        ', '.join(result['var'] + '_d0' +
+                                  str(result['domain'])
+                                  for result in failed)))
+            raise RuntimeError(message)
+        return results
+
+    def record(self, results):
+        '''
+        Record successfully archived files of a job in the manifest,
+        the manifest is saved once per job
+        '''
+        for result in results:
+            if not result['error']:
+                self.manifest.add(os.path.basename(result['file']),
+                                  result['file'], size=result['size_disk'],
+                                  md5=result['md5'], save=False)
+        self.manifest.save()
+
+    def output_name(self, var, domain):
+        '''
+        Return filename of the archived variable
+        '''
+        datestr_fn = self.startdate.strftime('%Y-%m-%d_%H:%M:%S')
+        return var + '_d0' + str(domain) + '_' + datestr_fn + '.nc'
+
+    def archive_job(self, job):
+        '''
+        Archive a (variables, domain) job, catching any error so that a
+        single failing variable is reported instead of aborting the
+        remaining jobs
+        '''
+        group, domain = job
+        results = []
+        for var in group:
+            result = {'var': var, 'domain': domain, 'error': None}
+            print(var)
+            try:
+                result.update(self.archive_var(var, domain,
+                                               self.get_coords(domain)))
+            except Exception:
+                result['error'] = traceback.format_exc()
+            results.append(result)
+        return results
+
+    def get_coords(self, domain):
+        '''
+        Read lat/lon information and urban fraction from wrfout file
+        '''
+        try:
+            return self.coords[domain]
+        except AttributeError:
+            self.coords = {}
+        except KeyError:
+            pass
+        datestr_fn = self.startdate.strftime('%Y-%m-%d_%H:%M:%S')
+        wrfout_n = 'wrfout_d0' + str(domain) + '_' + datestr_fn
+        wrfout = ncdf(os.path.join(self.rundir, wrfout_n), 'r')
+        coords = {}
+        for name in ['XLAT', 'XLONG', 'XLAT_U', 'XLONG_U', 'XLAT_V',
+                     'XLONG_V', 'FRC_URB2D']:
+            coords[name] = wrfout.variables[name][:]
+        wrfout.close()
+        self.coords[domain] = coords
+        return coords
+
+    def input_dates(self):
+        '''
+        Return the start dates of the 2-hourly WRF output files
+        '''
+        return pandas.date_range(self.startdate, self.enddate,
+                                 freq='2h')[:-1]
+
+    def output_times(self, var, domain):
+        '''
+        Return time axis of the archived variable
+        '''
+        if (var in self.minute_var) and (domain == self.ndoms):
+            # minute variable in inner domain => minute output
+            return pandas.date_range(self.startdate, self.enddate,
+                                     freq='1min')[:]
+        else:
+            # else hourly output
+            return pandas.date_range(self.startdate, self.enddate,
+                                     freq='1h')[:]
+
+    def readvar(self, var, domain, datestr, frc_urb):
+        '''
+        Return one input slab of var, computing derived variables
+        '''
+        if not var == 'TC2M_URB':
+            return self.getvar(var, domain, datestr)
+        # compute TC2M_URB from T2, TP2M_URB and FRC_URB2D
+        # load required variables
+        tp2m_urb = self.getvar('TP2M_URB', domain, datestr)
+        # set non-urban points to NaN instead of 0
+        tp2m_urb[tp2m_urb == 0] = np.nan
+        t2 = self.getvar('T2', domain, datestr)
+        # compute tc2m_urb
+        tmp = (t2 - (1 - frc_urb) * tp2m_urb) / frc_urb
+        # compute spatial filtered variant
+        tmpF = (self.spatial_filter(t2) -
+                (1 - frc_urb) *
+                self.spatial_filter(tp2m_urb)) / frc_urb
+        # overwrite outer edges of domain with original data
+        tmpF[:, 0, :] = tmp[:, 0, :]
+        tmpF[:, -1, :] = tmp[:, -1, :]
+        tmpF[:, :, 0] = tmp[:, :, 0]
+        tmpF[:, :, -1] = tmp[:, :, -1]
+        # difference between filtered/unfiltered
+        diff = np.abs(tmp - tmpF)
+        # replace points in tmp where diff>1 with tmpF
+        tmp[diff > 1] = tmpF[diff > 1]
+        # set NaN to 0 in tc2m_urb
+        tmp[np.isnan(tmp)] = 0
+        return tmp
+
+    def archive_var(self, var, domain, coords):
+        '''
+        Archive a single variable of a domain. The output file is created
+        with the full time dimension up front and every 2-hourly input slab
+        is written straight into its time slice, so only one slab is held
+        in memory at a time.
+        Returns compression ratio and write throughput of the output file
+        '''
+        starttime = time.time()
+        output_fn = self.output_name(var, domain)
+        output_file = os.path.join(self.archivedir, output_fn)
+        # define time variable in output file
+        dt = self.output_times(var, domain)
+        # lat/lon on the staggered grid for U and V
+        if var == 'U':
+            lat, lon = coords['XLAT_U'], coords['XLONG_U']
+        elif var == 'V':
+            lat, lon = coords['XLAT_V'], coords['XLONG_V']
+        else:
+            lat, lon = coords['XLAT'], coords['XLONG']
+        ncfile = None
+        tidx = 0  # first time index of next slab in output file
+        deaccumulate = deaccumulator()
+        try:
+            for cdate in self.input_dates():
+                datestr_in = cdate.strftime('%Y-%m-%d_%H:%M:%S')
+                tmp = self.readvar(var, domain, datestr_in,
+                                   coords['FRC_URB2D'])
+                # the first record of each input file equals the last
+                # record of the previous file
+                if var in self.deac_var:
+                    # need to deaccumulate this variable
+                    slab = deaccumulate(tmp)
                 else:
-                    self.write_netcdf(var, output, lat, lon, dt, dim,
-                                      output_file)
-                del output
+                    # variable only needs appending
+                    if ncfile is None:
+                        slab = tmp
+                    else:
+                        slab = tmp[1:]
+                if ncfile is None:
+                    shape = [len(dt)] + list(np.shape(tmp)[1:])
+                    ncfile, data = self.create_netcdf(
+                        var, shape, lat, lon, dt, output_file,
+                        encoding=self.get_encoding(var, domain))
+                # write the unmasked data, like np.vstack used to do
+                data[tidx:tidx + len(slab)] = np.ma.getdata(slab)
+                tidx += len(slab)
+                del tmp, slab  # cleanup
+        finally:
+            if ncfile is not None:
+                ncfile.close()
+        if not tidx == len(dt):
+            message = ('Number of timesteps written to %s (%i) does not '
+                       'match time axis (%i)' % (output_file, tidx, len(dt)))
+            utils.logger.error(message)
+            raise ValueError(message)
+        # report compression ratio and write throughput
+        elapsed = time.time() - starttime
+        size_raw = int(np.prod(shape)) * np.dtype('f4').itemsize
+        size_disk = os.path.getsize(output_file)
+        stats = {'file': output_file,
+                 'size_raw': size_raw,
+                 'size_disk': size_disk,
+                 'ratio': float(size_raw) / size_disk,
+                 'seconds': elapsed,
+                 'throughput': size_raw / 1e6 / max(elapsed, 1e-6),
+                 'md5': checksum(output_file)}
+        utils.logger.info('%s: compression ratio %.2f, %.1f MB/s' %
+                          (output_fn, stats['ratio'], stats['throughput']))
+        if var in self.store_settings()['variables']:
+            # the store only mirrors the netCDF archive, a failure to
+            # append is reported but does not fail the archive job
+            try:
+                self.append_store(var, domain, output_file)
+            except Exception:
+                stats['store_error'] = traceback.format_exc()
+                utils.logger.error('Appending %s to the store failed:\n%s'
+                                   % (output_fn, stats['store_error']))
+        return stats
+
+    def store_settings(self):
+        '''
+        Return settings of the chunked store from options_archive.store in
+        config.json, only variables listed in store.variables are added to
+        the store
+        '''
+        settings = {'variables': [],
+                    'time_chunk': {'hourly': 168, 'minute': 1440},
+                    'tile': 32}
+        settings.update(self.archive_option('store', {}))
+        return settings
+
+    def append_store(self, var, domain, output_file):
+        '''
+        Append the archived day of var to the chunked store of the variable.
+        There is a single store per variable and domain for all years, so
+        long time series do not require opening a file for every day.
+        '''
+        settings = self.store_settings()
+        store = zarrstore(os.path.join(
+            self.config['filesystem']['archive_dir'], 'store',
+            var + '_d0' + str(domain) + '.zarr'))
+        ncfile = ncdf(output_file, 'r')
+        try:
+            data = ncfile.variables[var]
+            times = ncfile.variables['time'][:]
+            if not store.exists():
+                tchunk = settings['time_chunk'][self.var_class(var, domain)]
+                chunks = ([int(tchunk)] + [1] * (data.ndim - 3) +
+                          [int(settings['tile'])] * 2)
+                store.create(var, data.shape[1:], chunks,
+                             ncfile.variables['latitude'][:],
+                             ncfile.variables['longitude'][:],
+                             time_units=ncfile.variables['time'].units)
+            # append in blocks of a time chunk to limit memory use
+            step = store.metadata[var + '/.zarray']['chunks'][0]
+            for start in range(0, len(times), step):
+                store.append(var,
+                             np.ma.filled(data[start:start + step], np.nan),
+                             times[start:start + step])
+        finally:
+            ncfile.close()
+
+    def transfer(self, key, input_file, output_file, strategy):
+        '''
+        Transfer input_file to output_file and record it in the manifest.
+        Only copied data is read again for a checksum, moved and linked
+        files are recorded by size, modification time and inode.
+        '''
+        copied = (strategy == 'move' and
+                  not utils.same_filesystem(input_file, output_file))
+        if utils.transfer_file(input_file, output_file, strategy) == 'copy':
+            copied = True
+        if copied:
+            self.manifest.add(key, output_file)
+        else:
+            self.manifest.add_stat(key, output_file)
 
     def archive_wrfvar_input(self):
         '''
@@ -345,19 +738,26 @@ class postprocess(config):
         utils._create_directory(wrfvar_archivedir)
         start_date = utils.return_validate(
                 self.config['options_general']['date_start'])
+        # wrfvar_input files are removed by cleanup() afterwards, so they
+        # can be moved or linked instead of copied
+        transfer = self.archive_option('transfer', 'copy')
         for domain in range(1, self.ndoms + 1):
             # iterate over all variables that need to be archived
                 for cdate in pandas.date_range(self.startdate, self.enddate,
-                                               freq='2H')[:-1]:
+                                               freq='2h')[:-1]:
                     if (cdate != start_date):
                         datestr_in = cdate.strftime('%Y-%m-%d_%H:%M:%S')
                         # define and load input file
                         input_fn = ('wrfvar_input' + '_d0' + str(domain) +
                                     '_' + datestr_in)
+                        key = os.path.join('wrfvar', input_fn)
+                        if self.manifest.complete(key):
+                            continue  # archived by a previous run
                         input_file = os.path.join(self.rundir, input_fn)
                         output_file = os.path.join(wrfvar_archivedir, input_fn)
-                        # copy wrfvar_input to archive dir
-                        shutil.copyfile(input_file, output_file)
+                        # transfer wrfvar_input to archive dir
+                        self.transfer(key, input_file, output_file,
+                                      transfer)
 
     def archive_static(self):
         '''
@@ -366,31 +766,66 @@ class postprocess(config):
         # loop over all domains
         static_archivedir = os.path.join(self.archivedir, 'static')
         utils._create_directory(static_archivedir)
+        # static files are not removed by cleanup(), never move them
+        transfer = self.archive_option('transfer', 'copy')
+        if transfer == 'move':
+            transfer = 'copy-with-fallback'
         for domain in range(1, self.ndoms + 1):
             # iterate over all variables that need to be archived
             for var in self.static_var:
                 datestr_in = self.startdate.strftime('%Y-%m-%d_%H:%M:%S')
                 # define and load input file
                 input_fn = var + '_d0' + str(domain) + '_' + datestr_in
+                key = os.path.join('static', input_fn)
+                if self.manifest.complete(key):
+                    continue  # archived by a previous run
                 input_file = os.path.join(self.rundir, input_fn)
                 output_file = os.path.join(static_archivedir, input_fn)
-                # copy wrfvar_input to archive dir
-                shutil.copyfile(input_file, output_file)
+                # transfer static file to archive dir
+                self.transfer(key, input_file, output_file, transfer)
 
     def cleanup(self):
         '''
         cleanup files in WRF run directory
+        Input files are only removed if the checksums of all archived
+        files that depend on them are verified
         '''
+        start_date = utils.return_validate(
+            self.config['options_general']['date_start'])
+        archive_vars = self.hour_var + self.minute_var
         # loop over all domains
         for domain in range(1, self.ndoms + 1):
+            archived = [var for var in archive_vars if self.manifest.complete(
+                self.output_name(var, domain), verify=True)]
             # iterate over all variables that need to be archived
-            for var in (self.hour_var + self.minute_var +
-                        ['wrfout', 'wrfvar_input']):
+            for var in (archive_vars + ['wrfout', 'wrfvar_input']):
+                if var in archive_vars:
+                    # input is needed by the variable itself and by the
+                    # variables derived from it
+                    needed_by = [var] + [
+                        derived for derived, deps in self.derived_var.items()
+                        if var in deps and derived in archive_vars]
+                elif var == 'wrfout':
+                    # coordinates of all variables are read from wrfout
+                    needed_by = archive_vars
+                else:
+                    needed_by = []
+                if not all(dep in archived for dep in needed_by):
+                    utils.logger.warning('Not removing %s input for domain '
+                                         '%i, archive is incomplete' %
+                                         (var, domain))
+                    continue
                 for cdate in pandas.date_range(self.startdate, self.enddate,
-                                               freq='2H')[:-1]:
+                                               freq='2h')[:-1]:
                     datestr_in = cdate.strftime('%Y-%m-%d_%H:%M:%S')
                     # define and load input file
                     input_fn = var + '_d0' + str(domain) + '_' + datestr_in
+                    if ((var == 'wrfvar_input') and (cdate != start_date) and
+                        not self.manifest.complete(
+                            os.path.join('wrfvar', input_fn), verify=True)):
+                        utils.logger.warning('Not removing %s, archived copy '
+                                             'is not verified' % input_fn)
+                        continue
                     input_file = os.path.join(self.rundir, input_fn)
                     utils.silentremove(input_file)
 
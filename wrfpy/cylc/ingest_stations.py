@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+
+import argparse
+from wrfpy.config import config
+from wrfpy.readObsTemperature import station_files
+from wrfpy.stationstore import ingest
+
+
+class ingest_stations(config):
+    '''
+    Build the consolidated station store from the urban station files
+    '''
+    def __init__(self):
+        config.__init__(self)
+        urbStations = self.config['options_urbantemps']['urban_stations']
+        storedir = self.config['options_urbantemps']['station_store']
+        ingest(storedir, station_files(urbStations))
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(
+        description='Build the urban station observation store.')
+    # parse arguments
+    args = parser.parse_args()
+    ingest_stations()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+
+import argparse
+import datetime
+from wrfpy.readObsTemperature import readObsTemperatureBatch
+from wrfpy import utils
+
+def main(datestart, dateend, interval):
+    dtstart = utils.convert_cylc_time(datestart)
+    dtend = utils.convert_cylc_time(dateend)
+    dates = []
+    dt = dtstart
+    while dt <= dtend:
+        dates.append(dt)
+        dt += datetime.timedelta(hours=interval)
+    # same station types as wrfda_obs and the bumpskin of wrfda_run, the
+    # cache files record them and are not used for other station types
+    readObsTemperatureBatch(dates, dstationtypes=['davis', 'vp2', 'vantage'])
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(
+        description='Extract urban station observations for all cycles '
+                    'of a period.')
+    parser.add_argument('datestart', type=str,
+                        help='Date-time string of the first cycle')
+    parser.add_argument('dateend', type=str,
+                        help='Date-time string of the last cycle')
+    parser.add_argument('--interval', type=int, default=2,
+                        help='Hours between cycles')
+    # parse arguments
+    args = parser.parse_args()
+    # call main
+    main(args.datestart, args.dateend, args.interval)
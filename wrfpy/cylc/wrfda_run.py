@@ -5,9 +5,9 @@ import datetime
 import time
 from wrfpy import utils
 from wrfpy.wrfda import wrfda
-from wrfpy.bumpskin import *
 from wrfpy.scale import wrfda_interpolate
 from wrfpy.config import config
+import os
 import shutil
 
 class dataAssimilation(config):
@@ -42,6 +42,7 @@ class dataAssimilation(config):
         except KeyError:
             urbanData = False
         if urbanData:
+            from wrfpy.bumpskin import bumpskin
             bskin =  bumpskin(urbanData, dstationtypes=['davis', 'vp2', 'vantage'])
         # update URBPARM.TBL with anthropogenic heat factors
         try:
@@ -49,6 +50,7 @@ class dataAssimilation(config):
         except KeyError:
             urbparmFile = False
         if urbparmFile:
+            from wrfpy.bumpskin import urbparm
             urbparm(datestart, urbparmFile)
         # update lateral boundary conditions
         WRFDA.prepare_updatebc_type('lateral', datestart, 1)
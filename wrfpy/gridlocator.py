@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+'''
+description:    Nearest gridpoint search on a curvilinear WRF grid
+license:        APACHE 2.0
+'''
+
+import hashlib
+import os
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS = 6371.0  # km
+
+
+def to_cartesian(lat, lon):
+    '''
+    Convert lat/lon in degrees to 3D cartesian coordinates on the unit sphere
+    '''
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    return np.stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon),
+                     np.sin(lat)), axis=-1)
+
+
+class gridlocator:
+    '''
+    Find the closest gridpoint of a lat/lon grid for a set of points.
+    The KD-tree of the grid is built once, after which all points are
+    located in a single vectorised query.
+    Only gridpoints within window degrees in latitude and longitude of a
+    point are considered, like the original find_gridpoint search.
+    '''
+    def __init__(self, lat, lon, window=0.10, neighbours=8):
+        self.lat = np.ma.getdata(lat)
+        self.lon = np.ma.getdata(lon)
+        self.shape = np.shape(self.lat)
+        self.window = window
+        # number of nearest gridpoints tested against the window
+        self.neighbours = min(neighbours, self.lat.size)
+        self.tree = cKDTree(to_cartesian(self.lat.reshape(-1),
+                                         self.lon.reshape(-1)))
+
+    def query(self, lat_in, lon_in):
+        '''
+        Return indices (i, j) of the closest gridpoints and the great circle
+        distances in km for points lat_in, lon_in. Points without a
+        gridpoint inside the window get index -1 and distance NaN.
+        '''
+        lat_in = np.atleast_1d(np.asarray(lat_in, dtype=np.float64))
+        lon_in = np.atleast_1d(np.asarray(lon_in, dtype=np.float64))
+        if not len(lat_in):
+            return (np.array([], dtype=int), np.array([], dtype=int),
+                    np.array([], dtype=np.float64))
+        chord, idx = self.tree.query(to_cartesian(lat_in, lon_in),
+                                     k=self.neighbours)
+        chord = chord.reshape(len(lat_in), -1)
+        idx = idx.reshape(len(lat_in), -1)
+        # neighbours are sorted by distance, select the first one inside
+        # the window around each point
+        inside = ((np.abs(self.lat.reshape(-1)[idx] - lat_in[:, None]) <=
+                   self.window) &
+                  (np.abs(self.lon.reshape(-1)[idx] - lon_in[:, None]) <=
+                   self.window))
+        found = inside.any(axis=1)
+        first = np.argmax(inside, axis=1)
+        rows = np.arange(len(lat_in))
+        i, j = np.unravel_index(idx[rows, first], self.shape)
+        distance = 2 * EARTH_RADIUS * np.arcsin(
+            np.minimum(chord[rows, first] / 2, 1))
+        i = np.where(found, i, -1)
+        j = np.where(found, j, -1)
+        distance = np.where(found, distance, np.nan)
+        return i, j, distance
+
+
+def sample_points(fields, i_idx, j_idx, fill=np.nan):
+    '''
+    Return values of fields at gridpoints (i_idx, j_idx) in a single
+    vectorised gather per field.
+    fields: dictionary of 2D arrays (or arrays with the grid dimensions last)
+    Points with a negative index (not located on the grid) get value fill.
+    Returns a dictionary with a float array per field.
+    '''
+    i_idx = np.asarray(i_idx, dtype=int)
+    j_idx = np.asarray(j_idx, dtype=int)
+    valid = (i_idx >= 0) & (j_idx >= 0)
+    samples = {}
+    for name, field in fields.items():
+        values = np.ma.filled(np.ma.asarray(field)[..., i_idx[valid],
+                                                   j_idx[valid]]
+                              .astype(np.float64), fill)
+        sample = np.full(np.shape(field)[:-2] + np.shape(i_idx), fill,
+                         dtype=np.float64)
+        sample[..., valid] = values
+        samples[name] = sample
+    return samples
+
+
+def grid_hash(coordinates, *parameters):
+    '''
+    Return sha1 hash of a list of grid coordinate arrays and parameters
+    '''
+    sha1 = hashlib.sha1()
+    for coordinate in coordinates:
+        coordinate = np.ascontiguousarray(np.ma.getdata(coordinate))
+        sha1.update(str((coordinate.dtype.str, coordinate.shape)).encode())
+        sha1.update(coordinate.tobytes())
+    sha1.update(repr(parameters).encode())
+    return sha1.hexdigest()
+
+
+class gridpointcache:
+    '''
+    Closest gridpoints of stations, cached on disk between cycles.
+    The cache file name contains a hash of the grid coordinates, so a
+    changed grid uses a new cache file. Stations are matched on their
+    exact coordinates; stations that are not in the cache yet are located
+    with a gridlocator and added to the cache file.
+    '''
+    def __init__(self, cachedir, lat, lon, window=0.10):
+        self.lat = lat
+        self.lon = lon
+        self.window = window
+        self.locator = None  # only built when stations are not cached
+        self.filename = os.path.join(cachedir, 'gridpoints_%s.npz' %
+                                     grid_hash([lat, lon], window))
+        try:
+            with np.load(self.filename) as cache:
+                self.entries = {name: cache[name] for name in
+                                ['lat', 'lon', 'i', 'j', 'distance']}
+        except (IOError, ValueError, KeyError):
+            # no (valid) cache yet, start from scratch
+            self.entries = {'lat': np.array([]), 'lon': np.array([]),
+                            'i': np.array([], dtype=int),
+                            'j': np.array([], dtype=int),
+                            'distance': np.array([])}
+
+    def query(self, lat_in, lon_in):
+        '''
+        Return indices (i, j) and distances in km of the closest gridpoints
+        for points lat_in, lon_in, see gridlocator.query
+        '''
+        lat_in = np.atleast_1d(np.asarray(lat_in, dtype=np.float64))
+        lon_in = np.atleast_1d(np.asarray(lon_in, dtype=np.float64))
+        index = {point: n for n, point in enumerate(
+            zip(self.entries['lat'], self.entries['lon']))}
+        # stations not in the cache, without duplicates
+        new = sorted(set(zip(lat_in, lon_in)) - set(index))
+        if new:
+            if self.locator is None:
+                self.locator = gridlocator(self.lat, self.lon, self.window)
+            lat_new, lon_new = (np.array(coordinate) for
+                                coordinate in zip(*new))
+            i_idx, j_idx, distance = self.locator.query(lat_new, lon_new)
+            for name, values in [('lat', lat_new), ('lon', lon_new),
+                                 ('i', i_idx), ('j', j_idx),
+                                 ('distance', distance)]:
+                self.entries[name] = np.concatenate((self.entries[name],
+                                                     values))
+            index.update({point: len(index) + n for n, point in
+                          enumerate(new)})
+            self.save()
+        rows = np.array([index[point] for point in zip(lat_in, lon_in)],
+                        dtype=int)
+        return (self.entries['i'][rows], self.entries['j'][rows],
+                self.entries['distance'][rows])
+
+    def save(self):
+        '''
+        Write cache to disk, replacing the old file in a single step
+        '''
+        tmpfile = self.filename + '.tmp.npz'
+        np.savez(tmpfile, **self.entries)
+        os.replace(tmpfile, self.filename)
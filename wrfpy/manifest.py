@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+'''
+description:    Manifest of completed output files, used to resume
+                interrupted tasks
+license:        APACHE 2.0
+'''
+
+import hashlib
+import json
+import os
+import time
+
+
+def checksum(filename, blocksize=2**20):
+    '''
+    Return md5 checksum of a file
+    '''
+    md5 = hashlib.md5()
+    with open(filename, 'rb') as infile:
+        for block in iter(lambda: infile.read(blocksize), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+class manifest:
+    '''
+    JSON file recording which output files were written completely,
+    with their size and checksum (or modification time and inode)
+    '''
+    def __init__(self, filename):
+        self.filename = filename
+        self.verified = set()  # keys verified by checksum in this session
+        try:
+            with open(self.filename, 'r') as infile:
+                self.entries = json.load(infile)
+        except (IOError, ValueError):
+            # no (valid) manifest yet, start from scratch
+            self.entries = {}
+
+    def add(self, key, filename, size=None, md5=None, save=True):
+        '''
+        Record a completely written output file and save the manifest.
+        With save=False the caller saves the manifest after adding a
+        batch of files.
+        '''
+        if size is None:
+            size = os.path.getsize(filename)
+        if md5 is None:
+            md5 = checksum(filename)
+        self.entries[key] = {'file': filename, 'size': size, 'md5': md5,
+                             'time': time.ctime(time.time())}
+        self.verified.add(key)
+        if save:
+            self.save()
+
+    def add_stat(self, key, filename, save=True):
+        '''
+        Record an output file that shares its data with a verified input
+        (moved, hard linked or reflinked) without reading it. The file is
+        verified by its size, modification time and inode instead of a
+        checksum.
+        '''
+        stat = os.stat(filename)
+        self.entries[key] = {'file': filename, 'size': stat.st_size,
+                             'md5': None, 'mtime': stat.st_mtime,
+                             'inode': stat.st_ino,
+                             'time': time.ctime(time.time())}
+        self.verified.add(key)
+        if save:
+            self.save()
+
+    def remove(self, key):
+        '''
+        Remove a record from the manifest
+        '''
+        self.entries.pop(key, None)
+        self.verified.discard(key)
+        self.save()
+
+    def complete(self, key, verify=False):
+        '''
+        Return True if the output file of key was written completely,
+        the file should still exist with the recorded size.
+        With verify=True the checksum of the file is verified as well, or
+        its modification time and inode for files recorded by add_stat.
+        '''
+        try:
+            entry = self.entries[key]
+        except KeyError:
+            return False
+        try:
+            stat = os.stat(entry['file'])
+        except OSError:
+            return False
+        if not stat.st_size == entry['size']:
+            return False
+        if verify and key not in self.verified:
+            if entry['md5'] is None:
+                if not (stat.st_mtime == entry['mtime'] and
+                        stat.st_ino == entry['inode']):
+                    return False
+            elif not checksum(entry['file']) == entry['md5']:
+                return False
+            self.verified.add(key)
+        return True
+
+    def save(self):
+        '''
+        Write manifest to disk, replacing the old file in a single step so
+        that an interrupted write never leaves a corrupt manifest
+        '''
+        tmpfile = self.filename + '.tmp'
+        with open(tmpfile, 'w') as outfile:
+            json.dump(self.entries, outfile, sort_keys=True)
+        os.replace(tmpfile, self.filename)
@@ -3,15 +3,433 @@
 ##
 from wrfpy.config import config
 import csv
+import json
 import os
-import astral
 from netCDF4 import Dataset
 from netCDF4 import date2num
 import numpy as np
 import bisect
-from datetime import datetime
+from datetime import datetime, timedelta
 import glob
-from pathos.multiprocessing import ProcessPool as Pool
+import threading
+from wrfpy.solar import solar_elevation
+
+MAXDIFF = 900  # max difference in seconds between model and observation
+
+
+def time_tolerance(units, calendar, seconds=MAXDIFF):
+    '''
+    Return a time difference of seconds in netCDF time units
+    '''
+    reference = datetime(2000, 1, 1)
+    return (date2num(reference + timedelta(seconds=seconds), units=units,
+                     calendar=calendar) -
+            date2num(reference, units=units, calendar=calendar))
+
+
+def select_time(times, dtobj_num, maxdiff=MAXDIFF):
+    '''
+    Return index of the time closest to dtobj_num in sorted array times.
+    Returns None if dtobj_num is outside times, or if the closest time
+    differs more than maxdiff, in the units of times. Use time_tolerance
+    for times that are not in seconds.
+    '''
+    # make use of the property that the array is already
+    #  sorted to find the closest date
+    if isinstance(times, timeaxis):
+        ind = times.bisect_left(dtobj_num)
+    else:
+        ind = bisect.bisect_left(times, dtobj_num)
+    if ((ind == 0) or (ind == len(times))):
+        return None
+    am = np.argmin([abs(times[ind]-dtobj_num),
+                    abs(times[ind-1]-dtobj_num)])
+    if (am == 0):
+        idx = ind
+    else:
+        idx = ind - 1
+    if abs(times[idx] - dtobj_num) > maxdiff:
+        # ignore observation if time difference
+        # between model and observation is too large
+        return None
+    return idx
+
+
+class timeaxis:
+    '''
+    Sorted time variable of a station file, read from disk only around
+    the requested times instead of completely. The index of a time is
+    estimated from the first and last time assuming a regular time step,
+    and a window of values around the estimate is read. If the time is
+    not inside that window, a bisection reading single values is used.
+    Values that were read are kept, so select_time reads no values twice.
+    '''
+    def __init__(self, variable, window=32):
+        self.variable = variable
+        self.window = window
+        self.size = len(variable)
+        self.values = {}  # values read, by index
+        self.reads = 0  # number of values read from disk
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self.size
+        if idx not in self.values:
+            self.read(idx, idx + 1)
+        return self.values[idx]
+
+    def read(self, start, stop):
+        '''
+        Read values start:stop from disk
+        '''
+        block = self.variable[start:stop]
+        self.reads += len(block)
+        self.values.update(zip(range(start, stop), block))
+        return block
+
+    def bisect_left(self, value):
+        '''
+        Return index where value would be inserted to keep the times
+        sorted, like bisect.bisect_left
+        '''
+        if self.size < 2 * self.window:
+            # short time axis, read completely
+            return bisect.bisect_left(self.read(0, self.size), value)
+        if value <= self[0]:
+            return 0
+        if value > self[self.size - 1]:
+            return self.size
+        # estimate of the index for a regular time step
+        guess = int((value - self[0]) / (self[self.size - 1] - self[0]) *
+                    (self.size - 1))
+        start = max(0, guess - self.window)
+        stop = min(self.size, guess + self.window + 1)
+        block = self.read(start, stop)
+        if block[0] < value <= block[-1]:
+            return start + bisect.bisect_left(block, value)
+        # outside the window, bisect the remaining part of the time axis
+        if value <= block[0]:
+            return bisect.bisect_left(self, value, 1, start + 1)
+        return bisect.bisect_left(self, value, stop, self.size - 1)
+
+
+def station_files(urbStations):
+    '''
+    Return list of station files: urbStations is a single netCDF file or
+    a directory of netCDF files
+    '''
+    try:
+        f = Dataset(urbStations, 'r')
+        f.close()
+        return [urbStations]
+    except IOError:
+        # file is not a netcdf file, assuming a txt file containing a
+        # list of netcdf files
+        if os.path.isdir(urbStations):
+            # path is actually a directory, not a file
+            return glob.glob(os.path.join(urbStations, '*nc'))
+        else:
+            # re-raise error
+            raise
+
+
+def match_stationtype(stationtype, stationtypes):
+    '''
+    Return True if stationtype contains one of stationtypes
+    '''
+    try:
+        return any([x.lower() in stationtype.lower() for x in stationtypes])
+    except AttributeError:
+        return False
+
+
+def station_mask(lat, lon, stationtypes, dtobj, nstationtypes=None,
+                 dstationtypes=None):
+    '''
+    check if it is day or night based on the solar angle at each station
+    and return a boolean array, True for the stations of which the
+    station type is used at that time
+    '''
+    stationtypes = list(stationtypes)
+    day = solar_elevation(lat, lon, dtobj) > 0
+    mask = np.ones(len(stationtypes), dtype=bool)
+    for daytime, types in [(True, dstationtypes), (False, nstationtypes)]:
+        if types:
+            matches = {stationtype: match_stationtype(stationtype, types)
+                       for stationtype in set(stationtypes)}
+            match = np.array([matches[stationtype] for stationtype in
+                              stationtypes], dtype=bool)
+            mask = np.where(day == daytime, match, mask)
+    return mask
+
+
+def use_station(stobs, dtobj, nstationtypes=None, dstationtypes=None):
+    '''
+    check if it is day or night based on the solar angle and return
+    if the station type of stobs (lat, lon, elevation, stationtype) is
+    used at that time
+    '''
+    return bool(station_mask([stobs[0]], [stobs[1]], [stobs[3]], dtobj,
+                             nstationtypes, dstationtypes)[0])
+
+
+pools = {}  # worker pools, created once per process
+# the netCDF library is not thread-safe, thread workers hold this lock for
+# every netCDF call
+netcdf_lock = threading.Lock()
+
+
+def get_pool(kind='process', workers=None):
+    '''
+    Return pathos pool of kind 'process' or 'thread' with workers nodes
+    (default: number of cpus). The pool is created on the first call and
+    reused afterwards.
+    Thread workers serialize all netCDF access on netcdf_lock, so they
+    read no files in parallel. They only avoid the cost of starting
+    processes and pickling arguments and results, process workers are
+    needed for parallel reading.
+    '''
+    if (kind, workers) not in pools:
+        from pathos.pools import ProcessPool, ThreadPool
+        try:
+            Pool = {'process': ProcessPool, 'thread': ThreadPool}[kind]
+        except KeyError:
+            raise ValueError("pool should be 'process' or 'thread', not "
+                             "%s" % kind)
+        if workers:
+            pools[(kind, workers)] = Pool(nodes=workers)
+        else:
+            pools[(kind, workers)] = Pool()
+    return pools[(kind, workers)]
+
+
+def obs_station_times(f, dtobjs, nstationtypes=None, dstationtypes=None):
+    '''
+    get observed temperatures in amsterdam of station file f at all
+    times dtobjs, opening the file once. Returns a list with per time
+    (lat, lon, temperature, stationtype, stationname) or None
+    '''
+    # the netCDF library is not thread-safe, only the netCDF calls are
+    # done holding netcdf_lock
+    try:
+        with netcdf_lock:
+            obs = Dataset(f, 'r')
+    except IOError:
+        return [None] * len(dtobjs)
+    try:
+        with netcdf_lock:
+            obs_lon = obs.variables['longitude'][0]
+            obs_lat = obs.variables['latitude'][0]
+            try:
+                stationtype = obs.stationtype
+            except AttributeError:
+                stationtype = None
+        elevation = 0
+        stobs = (obs_lat, obs_lon, elevation, stationtype)
+        used = [use_station(stobs, dtobj, nstationtypes, dstationtypes)
+                for dtobj in dtobjs]
+        if not any(used):
+            return [None] * len(dtobjs)
+        with netcdf_lock:
+            dt = obs.variables['time']
+            times = timeaxis(dt)
+            # convert datetime objects to dt.units units
+            dtobjs_num = np.atleast_1d(date2num(dtobjs, units=dt.units,
+                                                calendar=dt.calendar))
+            maxdiff = time_tolerance(dt.units, dt.calendar)
+            idx = []
+            for dtobj_num, use in zip(dtobjs_num, used):
+                if not use:
+                    idx.append(None)
+                    continue
+                # ignore observation if time difference
+                # between model and observation is > 15 minutes
+                try:
+                    idx.append(select_time(times, dtobj_num, maxdiff))
+                except RuntimeError:
+                    return [None] * len(dtobjs)
+            found = sorted(set(ind for ind in idx if ind is not None))
+            if not found:
+                return [None] * len(dtobjs)
+            # read all temperatures needed at once
+            temp = dict(zip(found, obs.variables['temperature'][found]))
+        return [(obs_lat, obs_lon, temp[ind], stationtype, f)
+                if ind is not None else None for ind in idx]
+    except AttributeError:
+        return [None] * len(dtobjs)
+    finally:
+        with netcdf_lock:
+            obs.close()
+
+
+def obs_station(f, dtobj, nstationtypes=None, dstationtypes=None):
+    '''
+    get observed temperature in amsterdam of station file f at dtobj,
+    returns (lat, lon, temperature, stationtype, stationname) or None
+    '''
+    return obs_station_times(f, [dtobj], nstationtypes, dstationtypes)[0]
+
+
+def obs_stations(filelist, dtobj, nstationtypes=None, dstationtypes=None):
+    '''
+    get observed temperatures of a batch of station files at dtobj
+    '''
+    obs = [obs_station(f, dtobj, nstationtypes, dstationtypes)
+           for f in filelist]
+    return [ob for ob in obs if ob is not None]
+
+
+def obs_stations_times(filelist, dtobjs, nstationtypes=None,
+                       dstationtypes=None):
+    '''
+    get observed temperatures of a batch of station files at all times
+    dtobjs, returns a list per station file, see obs_station_times
+    '''
+    return [obs_station_times(f, dtobjs, nstationtypes, dstationtypes)
+            for f in filelist]
+
+
+CACHE_MAGIC = b'WRFPYOBS'
+CACHE_VERSION = 2
+
+
+def station_selection(nstationtypes=None, dstationtypes=None):
+    '''
+    Return the station types used at night and during daytime in the form
+    stored in the cache files, types are matched case-insensitive
+    '''
+    return {key: sorted(set(x.lower() for x in types)) if types else None
+            for key, types in [('nstationtypes', nstationtypes),
+                               ('dstationtypes', dstationtypes)]}
+
+
+def obs_table(obs):
+    '''
+    Convert observations (lat, lon, temperature, stationtype,
+    stationname) to a numpy structured array. Missing temperatures
+    become NaN and missing station types an empty string, as in the csv
+    file. Strings are stored utf-8 encoded.
+    '''
+    stationtypes = [('' if ob[3] is None else str(ob[3])).encode('utf-8')
+                    for ob in obs]
+    stationnames = [str(ob[4]).encode('utf-8') for ob in obs]
+    dtype = [('lat', 'f8'), ('lon', 'f8'), ('temperature', 'f8'),
+             ('stationtype', 'S%i' % max([1] + [len(st) for st in
+                                               stationtypes])),
+             ('stationname', 'S%i' % max([1] + [len(st) for st in
+                                               stationnames]))]
+    table = np.zeros(len(obs), dtype=dtype)
+    for name, idx in [('lat', 0), ('lon', 1), ('temperature', 2)]:
+        table[name] = [np.nan if np.ma.is_masked(ob[idx]) else ob[idx]
+                       for ob in obs]
+    table['stationtype'] = stationtypes
+    table['stationname'] = stationnames
+    return table
+
+
+def obs_tuples(table):
+    '''
+    Convert a table of observations to a list of tuples (lat, lon,
+    temperature, stationtype, stationname)
+    '''
+    return [(lat, lon, temperature, stationtype.decode('utf-8'),
+             stationname.decode('utf-8')) for
+            lat, lon, temperature, stationtype, stationname in
+            table.tolist()]
+
+
+def write_obs_table(filename, obs, nstationtypes=None, dstationtypes=None):
+    '''
+    Write observations to a binary cache file: a version header and the
+    station types used to select the observations (see station_selection),
+    followed by the table in .npy format. The header makes it unreadable by
+    np.load, so the file should not get the .npy extension (wrfpy uses
+    .obs). The file is replaced in a single step.
+    '''
+    selection = json.dumps(station_selection(nstationtypes,
+                                             dstationtypes)).encode('utf-8')
+    tmpfile = filename + '.tmp'
+    with open(tmpfile, 'wb') as out:
+        out.write(CACHE_MAGIC + bytes([CACHE_VERSION]))
+        out.write(len(selection).to_bytes(4, 'little') + selection)
+        np.lib.format.write_array(out, obs_table(obs))
+    os.replace(tmpfile, filename)
+
+
+def read_obs_table(filename, nstationtypes=None, dstationtypes=None):
+    '''
+    Read observations from a binary cache file written by
+    write_obs_table, the table is memory-mapped.
+    Raises IOError if the file does not exist, has another version or was
+    written for other station types.
+    '''
+    with open(filename, 'rb') as inp:
+        header = inp.read(len(CACHE_MAGIC) + 1)
+        if header != CACHE_MAGIC + bytes([CACHE_VERSION]):
+            raise IOError('Unsupported observation cache file %s' % filename)
+        try:
+            size = int.from_bytes(inp.read(4), 'little')
+            selection = json.loads(inp.read(size).decode('utf-8'))
+            version = np.lib.format.read_magic(inp)
+            if version == (1, 0):
+                shape, fortran_order, dtype = (
+                    np.lib.format.read_array_header_1_0(inp))
+            else:
+                shape, fortran_order, dtype = (
+                    np.lib.format.read_array_header_2_0(inp))
+        except ValueError:
+            raise IOError('Corrupt observation cache file %s' % filename)
+        offset = inp.tell()
+    if selection != station_selection(nstationtypes, dstationtypes):
+        raise IOError('Observation cache file %s is for other station '
+                      'types' % filename)
+    if not shape[0]:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(filename, dtype=dtype, mode='r', offset=offset,
+                     shape=shape)
+
+
+class stationdata:
+    '''
+    Observations of all urban stations at many time steps (e.g. for
+    bumpskinbatch). The observations of the times dtobjs are read when
+    creating the object, every station file is opened once and only the
+    times around dtobjs are read, see obs_station_times. Other times are
+    read when requested.
+    '''
+    def __init__(self, filelist, dtobjs=()):
+        self.filelist = filelist
+        self.cycles = {}  # observations of all stations, by time
+        if dtobjs:
+            self.read(dtobjs)
+
+    def read(self, dtobjs):
+        '''
+        Read the observations of all stations at times dtobjs
+        '''
+        obs = obs_stations_times(self.filelist, dtobjs)
+        for idx, dtobj in enumerate(dtobjs):
+            self.cycles[dtobj] = [station[idx] for station in obs
+                                  if station[idx] is not None]
+
+    def obs(self, dtobj, nstationtypes=None, dstationtypes=None):
+        '''
+        Return observations (lat, lon, temperature, stationtype,
+        stationname) of all stations at dtobj, selected as in
+        readObsTemperature.obs_temp
+        '''
+        if dtobj not in self.cycles:
+            self.read([dtobj])
+        obs = self.cycles[dtobj]
+        if not obs:
+            return []
+        mask = station_mask([ob[0] for ob in obs], [ob[1] for ob in obs],
+                            [ob[3] for ob in obs], dtobj, nstationtypes,
+                            dstationtypes)
+        return [ob for ob, used in zip(obs, mask) if used]
 
 
 class readObsTemperature(config):
@@ -22,142 +440,147 @@ class readObsTemperature(config):
         self.dstationtypes = dstationtypes  # stationtypes during daytime
         # define datestr
         datestr = datetime.strftime(dtobj, '%Y-%m-%d_%H:%M:%S')
-        # define name of csv file
+        # define name of csv and cache file
         self.wrf_rundir = self.config['filesystem']['work_dir']
-        fname = 'obs_stations_' + datestr + '.csv'
-        self.csvfile = os.path.join(self.wrf_rundir, fname)
+        self.cache_files(datestr)
         try:
-            # try to read an existing csv file
-            self.read_csv(datestr)
+            # try to read an existing cache or csv file
+            self.read_cached(datestr)
         except IOError:
             if self.config['options_urbantemps']['urban_stations']:
                 # reading existing csv file failed, start from scratch
                 self.urbStations = self.config['options_urbantemps']['urban_stations']
                 self.verify_input()
-                self.obs_temp_p(dtobj)
+                try:
+                    storedir = self.config['options_urbantemps']['station_store']
+                except KeyError:
+                    storedir = False
+                if storedir:
+                    # query consolidated station store
+                    self.obs_store(storedir, dtobj)
+                else:
+                    self.obs_temp_p(dtobj)
                 self.write_csv(datestr)
+                self.write_cache(datestr)
             else:
                 raise
 
+    def cache_files(self, datestr):
+        '''
+        define names of the csv and binary cache file with the station
+        temperatures at datestr
+        '''
+        fname = os.path.join(self.wrf_rundir, 'obs_stations_' + datestr)
+        self.csvfile = fname + '.csv'
+        self.cachefile = fname + '.obs'
+
+    def read_cached(self, datestr):
+        '''
+        read station temperatures from the binary cache file, or from
+        the csv file if there is no cache file (earlier versions), which
+        is converted. The csv file does not record the station types, it
+        is not used if the cache file is for other station types.
+        '''
+        if os.path.exists(self.cachefile):
+            self.read_cache(datestr)
+        else:
+            self.read_csv(datestr)
+            self.write_cache(datestr)
+
     def verify_input(self):
         '''
         verify input and create list of files
         '''
+        self.filelist = station_files(self.urbStations)
+
+    def obs_store(self, storedir, dtobj):
+        '''
+        get observed temperature in amsterdam from the station store,
+        station files are read if there is no store
+        '''
+        from wrfpy.stationstore import open_store
+        store = open_store(storedir, self.filelist)
+        if store is None:
+            self.obs_temp_p(dtobj)
+        else:
+            self.obs = store.obs(dtobj, self.nstationtypes,
+                                 self.dstationtypes)
+
+    def urbantemps_option(self, key, default):
+        '''
+        Return option from the options_urbantemps section of config.json,
+        fall back to default if the option is not defined
+        '''
         try:
-            f = Dataset(self.urbStations, 'r')
-            f.close()
-            self.filelist = [self.urbStations]
-        except IOError:
-            # file is not a netcdf file, assuming a txt file containing a 
-            # list of netcdf files
-            if os.path.isdir(self.urbStations):
-                # path is actually a directory, not a file
-                self.filelist = glob.glob(os.path.join(self.urbStations, '*nc'))
-            else:
-                # re-raise error
-                raise
+            value = self.config['options_urbantemps'][key]
+        except KeyError:
+            return default
+        if value in ('', None):
+            return default
+        return value
+
+    def map_stations(self, function, args, chunksize=None):
+        '''
+        Apply function(filelist, *args) to batches of station files on a
+        pool that is reused between calls, returns the concatenated results
+        '''
+        workers = self.urbantemps_option('workers', None)
+        pool = get_pool(self.urbantemps_option('pool', 'process'),
+                        int(workers) if workers else None)
+        if not chunksize:
+            # a few batches per worker to balance the load
+            chunksize = max(1, -(-len(self.filelist) // (4 * pool.nodes)))
+        batches = [self.filelist[idx:idx + chunksize] for idx in
+                   range(0, len(self.filelist), chunksize)]
+        # only the file names and selection arguments are sent to workers
+        results = pool.map(function, batches,
+                           *[[arg] * len(batches) for arg in args])
+        return [result for batch in results for result in batch]
 
-    def obs_temp_p(self, dtobj):
+    def obs_temp_p(self, dtobj, chunksize=None):
         '''
-        get observed temperature in amsterdam parallel
+        get observed temperature in amsterdam parallel, in batches of
+        station files per task. Only the process pool reads station files
+        in parallel, see get_pool.
         '''
         self.dtobjP = dtobj
-        pool = Pool()
-        obs = pool.map(self.obs_temp, self.filelist)
-        self.obs = [ob for ob in obs if ob is not None]
- 
+        self.obs = self.map_stations(
+            obs_stations, [dtobj, self.nstationtypes, self.dstationtypes],
+            chunksize)
+
+    def obs_times_p(self, dtobjs, chunksize=None):
+        '''
+        get observed temperatures in amsterdam at all times dtobjs
+        parallel, every station file is opened once.
+        Returns a list of observations per time.
+        '''
+        obs = self.map_stations(
+            obs_stations_times,
+            [dtobjs, self.nstationtypes, self.dstationtypes], chunksize)
+        return [[station[idx] for station in obs
+                 if station[idx] is not None]
+                for idx in range(len(dtobjs))]
+
     def obs_temp(self, f):
         '''
         get observed temperature in amsterdam per station
         '''
-        try:
-            obs = Dataset(f, 'r')
-            obs_lon = obs.variables['longitude'][0]
-            obs_lat = obs.variables['latitude'][0]
-            elevation = 0
-            try:
-                stationtype = obs.stationtype
-            except AttributeError:
-                stationtype = None
-            stobs = (obs_lat, obs_lon, elevation, stationtype)
-            use_station = self.filter_stationtype(stobs, self.dtobjP)
-            if use_station:
-                dt = obs.variables['time']
-                # convert datetime object to dt.units units
-                dtobj_num = date2num(self.dtobjP, units=dt.units,
-                                     calendar=dt.calendar)
-                # make use of the property that the array is already
-                #  sorted to find the closest date
-                try:
-                    ind = bisect.bisect_left(dt[:], dtobj_num)
-                except RuntimeError:
-                    return
-                if ((ind == 0) or (ind == len(dt))):
-                    return None
-                else:
-                    am = np.argmin([abs(dt[ind]-dtobj_num),
-                                    abs(dt[ind-1]-dtobj_num)])
-                    if (am == 0):
-                        idx = ind
-                    else:
-                        idx = ind - 1
-                if abs((dt[:]-dtobj_num)[idx]) > 900:
-                    # ignore observation if time difference
-                    # between model and observation is > 15 minutes
-                    return None
-                temp = obs.variables['temperature'][idx]
-                sname = f[:]  # stationname
-                obs.close()
-                # append results to lists
-                obs_temp = temp
-                obs_stype = stationtype
-                obs_sname= sname
-        except IOError:
-            return None
-        except AttributeError:
-            return None
-        try:
-            return (obs_lat, obs_lon, obs_temp, obs_stype, obs_sname)
-        except UnboundLocalError:
-            return None
+        return obs_station(f, self.dtobjP, self.nstationtypes,
+                           self.dstationtypes)
 
     def filter_stationtype(self, stobs, dtobj):
         '''
         check if it is day or night based on the solar angle
         construct location
         '''
-        lat = stobs[0]
-        lon = stobs[1]
-        elevation = 0  # placeholder
-        loc = astral.Location(info=('name', 'region', lat, lon, 'UTC',
-                                    elevation))
-        solar_elevation = loc.solar_elevation(dtobj)
-        # set stime according to day/night based on solar angle
-        if (solar_elevation > 0):
-            stime = 'day'
-        else:
-            stime = 'night'
-        if ((stime == 'day') and self.dstationtypes):
-            try:
-                mask = any([x.lower() in stobs[3].lower() for
-                            x in self.dstationtypes])
-            except AttributeError:
-                mask = False
-        elif ((stime == 'night') and self.nstationtypes):
-            try:
-                mask = any([x.lower() in stobs[3].lower() for
-                            x in self.nstationtypes])
-            except AttributeError:
-                mask = False
-        else:
-            mask = True
-        return mask
+        return use_station(stobs, dtobj, self.nstationtypes,
+                           self.dstationtypes)
 
     def write_csv(self, datestr):
         '''
         write output of stations used to csv file
         '''
-        with open(self.csvfile, 'wb') as out:
+        with open(self.csvfile, 'w', newline='') as out:
             csv_out = csv.writer(out)
             csv_out.writerow(['lat', 'lon', 'temperature', 'stationtype',
                               'stationname'])
@@ -186,4 +609,74 @@ class readObsTemperature(config):
                 obs_stype.append(str(row[3]))
                 obs_sname.append(str(row[4]))
         # zip variables
-        self.obs = zip(obs_lat, obs_lon, obs_temp, obs_stype, obs_sname)
+        self.obs = list(zip(obs_lat, obs_lon, obs_temp, obs_stype,
+                            obs_sname))
+
+    def write_cache(self, datestr):
+        '''
+        write output of stations used to binary cache file
+        '''
+        write_obs_table(self.cachefile, self.obs, self.nstationtypes,
+                        self.dstationtypes)
+
+    def read_cache(self, datestr):
+        '''
+        read station temperatures from binary cache file
+        '''
+        self.obs = obs_tuples(read_obs_table(self.cachefile,
+                                             self.nstationtypes,
+                                             self.dstationtypes))
+
+
+class readObsTemperatureBatch(readObsTemperature):
+    '''
+    Observed temperatures of the urban stations at many times dtobjs,
+    e.g. all cycles of a hindcast period. Existing cache files are used;
+    for the other times every station file is opened once and the csv
+    and cache files of all times are written.
+    The observations per time are available in the dictionary cycles.
+    '''
+    def __init__(self, dtobjs, nstationtypes=None, dstationtypes=None):
+        config.__init__(self)
+        # optional define station types to be used
+        self.nstationtypes = nstationtypes  # stationtypes at night
+        self.dstationtypes = dstationtypes  # stationtypes during daytime
+        self.wrf_rundir = self.config['filesystem']['work_dir']
+        self.cycles = {}
+        missing = []
+        for dtobj in dtobjs:
+            datestr = datetime.strftime(dtobj, '%Y-%m-%d_%H:%M:%S')
+            self.cache_files(datestr)
+            try:
+                # try to read an existing cache or csv file
+                self.read_cached(datestr)
+                self.cycles[dtobj] = self.obs
+            except IOError:
+                missing.append(dtobj)
+        if not missing:
+            return
+        self.urbStations = self.config['options_urbantemps']['urban_stations']
+        if not self.urbStations:
+            raise IOError('No urban_stations defined in config file')
+        self.verify_input()
+        try:
+            storedir = self.config['options_urbantemps']['station_store']
+        except KeyError:
+            storedir = False
+        store = None
+        if storedir:
+            # query consolidated station store
+            from wrfpy.stationstore import open_store
+            store = open_store(storedir, self.filelist)
+        if store is None:
+            obs = self.obs_times_p(missing)
+        else:
+            obs = [store.obs(dtobj, self.nstationtypes, self.dstationtypes)
+                   for dtobj in missing]
+        for dtobj, cycle_obs in zip(missing, obs):
+            datestr = datetime.strftime(dtobj, '%Y-%m-%d_%H:%M:%S')
+            self.cache_files(datestr)
+            self.obs = cycle_obs
+            self.write_csv(datestr)
+            self.write_cache(datestr)
+            self.cycles[dtobj] = cycle_obs
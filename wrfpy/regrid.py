@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+'''
+description:    Regridding between WRF domains with a cached triangulation
+license:        APACHE 2.0
+'''
+
+import os
+import pickle
+
+import numpy as np
+from scipy import sparse
+from scipy.interpolate import CloughTocher2DInterpolator
+from scipy.spatial import Delaunay
+
+from wrfpy.gridlocator import grid_hash
+
+METHODS = ['linear', 'cubic']
+
+
+class regridder:
+    '''
+    Interpolate fields from a source grid to a target grid, giving the
+    same result as scipy.interpolate.griddata on (lon, lat) coordinates.
+    The expensive part is done once per (source grid, target grid) pair
+    and cached in cachedir:
+        - linear: barycentric weights, applied as a sparse matrix product
+        - cubic: Delaunay triangulation of the source grid, the
+          Clough-Tocher gradients depend on the field and are computed on
+          every call
+    Target points outside the source grid get NaN.
+    '''
+    def __init__(self, cachedir, lat, lon, lat2, lon2, method='cubic'):
+        if method not in METHODS:
+            raise ValueError('Regrid method should be one of: %s' %
+                             ', '.join(METHODS))
+        self.method = method
+        self.shape = np.shape(lat2)
+        self.points = np.column_stack((np.ma.getdata(lon).reshape(-1),
+                                       np.ma.getdata(lat).reshape(-1)))
+        self.targets = np.column_stack((np.ma.getdata(lon2).reshape(-1),
+                                        np.ma.getdata(lat2).reshape(-1)))
+        extension = {'linear': 'npz', 'cubic': 'pkl'}[method]
+        self.filename = os.path.join(cachedir, 'regrid_%s.%s' % (
+            grid_hash([lat, lon, lat2, lon2], method), extension))
+        try:
+            self.load()
+        except (IOError, ValueError, KeyError, pickle.UnpicklingError,
+                EOFError):
+            # no (valid) cache yet, compute and save
+            self.compute()
+            self.save()
+
+    def compute(self):
+        '''
+        Triangulate the source grid and compute the weights
+        '''
+        self.triangulation = Delaunay(self.points)
+        if self.method == 'cubic':
+            return
+        simplex = self.triangulation.find_simplex(self.targets)
+        inside = simplex >= 0
+        transform = self.triangulation.transform[simplex[inside]]
+        # barycentric coordinates of the target points in their simplex
+        bary = np.einsum('ijk,ik->ij', transform[:, :2],
+                         self.targets[inside] - transform[:, 2])
+        weights = np.column_stack((bary, 1 - bary.sum(axis=1)))
+        vertices = self.triangulation.simplices[simplex[inside]]
+        rows = np.repeat(np.flatnonzero(inside), 3)
+        self.weights = sparse.csr_matrix(
+            (weights.reshape(-1), (rows, vertices.reshape(-1))),
+            shape=(len(self.targets), len(self.points)))
+        self.outside = ~inside
+
+    def load(self):
+        '''
+        Read the triangulation or weights from the cache file
+        '''
+        if self.method == 'cubic':
+            with open(self.filename, 'rb') as infile:
+                self.triangulation = pickle.load(infile)
+        else:
+            with np.load(self.filename) as cache:
+                self.weights = sparse.csr_matrix(
+                    (cache['data'], cache['indices'], cache['indptr']),
+                    shape=tuple(cache['shape']))
+                self.outside = cache['outside']
+
+    def save(self):
+        '''
+        Write the triangulation or weights to disk, replacing the old file
+        in a single step
+        '''
+        tmpfile = self.filename + '.tmp'
+        with open(tmpfile, 'wb') as outfile:
+            if self.method == 'cubic':
+                pickle.dump(self.triangulation, outfile,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            else:
+                np.savez(outfile, data=self.weights.data,
+                         indices=self.weights.indices,
+                         indptr=self.weights.indptr,
+                         shape=self.weights.shape, outside=self.outside)
+        os.replace(tmpfile, self.filename)
+
+    def regrid(self, field):
+        '''
+        Return field interpolated to the target grid
+        '''
+        values = np.ma.getdata(field).reshape(-1).astype(np.float64)
+        if self.method == 'cubic':
+            interpolator = CloughTocher2DInterpolator(self.triangulation,
+                                                      values)
+            result = interpolator(self.targets)
+        else:
+            result = self.weights.dot(values)
+            result[self.outside] = np.nan
+        return result.reshape(self.shape)
@@ -1,6 +1,5 @@
 #!/usr/bin/env python
 
-from scipy import interpolate
 from netCDF4 import Dataset
 import os
 import numpy as np
@@ -88,6 +87,7 @@ class wrfda_interpolate(config):
       return dtobj, datestr
 
   def fix_2d_field(self, *variables):
+    from scipy import interpolate
     #XLONG_p_i = self.XLONG_p[self.wrfinput_p.variables['LU_INDEX'][0,:]==1].reshape(-1)
     #XLAT_p_i = self.XLAT_p[self.wrfinput_p.variables['LU_INDEX'][0,:]==1].reshape(-1)
     XLONG_p_i = self.XLONG_p.reshape(-1)
@@ -101,6 +101,7 @@ class wrfda_interpolate(config):
       self.wrfinput_c.variables[variable][:] += intp_var
 
   def fix_3d_field(self, *variables):
+    from scipy import interpolate
     XLONG_p_i = self.XLONG_p.reshape(-1)
     XLAT_p_i = self.XLAT_p.reshape(-1)
     for variable in variables:
@@ -110,6 +111,7 @@ class wrfda_interpolate(config):
       self.wrfinput_c.variables[variable][:] += intp_var
 
   def fix_3d_field_uv(self,XLAT_p, XLONG_p, XLAT_c, XLONG_c, *variables):
+    from scipy import interpolate
     for variable in variables:
       var =  self.wrfinput_p.variables[variable][0,:] - self.fg_p.variables[variable][0,:]
       intp_var = [interpolate.griddata((XLONG_p.reshape(-1),XLAT_p.reshape(-1)), var[lev,:].reshape(-1), (XLONG_c.reshape(-1),XLAT_c.reshape(-1)), method='nearest').reshape(np.shape(XLONG_c)) for lev in range(0,len(var))]
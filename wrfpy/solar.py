@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+'''
+description:    Vectorised solar position (NOAA solar calculator equations)
+license:        APACHE 2.0
+'''
+
+from datetime import datetime, timezone
+
+import numpy as np
+
+J2000 = datetime(2000, 1, 1, 12)  # julian day 2451545.0
+
+
+def julian_century(dtobj):
+    '''
+    Return julian century of dtobj, naive datetimes are taken as UTC
+    '''
+    if dtobj.tzinfo is not None:
+        dtobj = dtobj.astimezone(timezone.utc).replace(tzinfo=None)
+    return (dtobj - J2000).total_seconds() / (86400. * 36525.)
+
+
+def sun_position(dtobj):
+    '''
+    Return declination of the sun in degrees and the equation of time
+    in minutes at dtobj
+    '''
+    t = julian_century(dtobj)
+    # geometric mean longitude and anomaly of the sun, eccentricity of
+    # the earth orbit
+    l0 = np.radians((280.46646 + t * (36000.76983 + 0.0003032 * t)) % 360.)
+    m = np.radians(357.52911 + t * (35999.05029 - 0.0001537 * t))
+    e = 0.016708634 - t * (0.000042037 + 0.0000001267 * t)
+    # equation of center and apparent longitude of the sun
+    c = (np.sin(m) * (1.914602 - t * (0.004817 + 0.000014 * t)) +
+         np.sin(2 * m) * (0.019993 - 0.000101 * t) +
+         np.sin(3 * m) * 0.000289)
+    omega = np.radians(125.04 - 1934.136 * t)
+    apparent_long = np.radians(np.degrees(l0) + c - 0.00569 -
+                               0.00478 * np.sin(omega))
+    # corrected obliquity of the ecliptic
+    seconds = 21.448 - t * (46.815 + t * (0.00059 - t * 0.001813))
+    obliquity = np.radians(23. + (26. + seconds / 60.) / 60. +
+                           0.00256 * np.cos(omega))
+    declination = np.degrees(np.arcsin(np.sin(obliquity) *
+                                       np.sin(apparent_long)))
+    y = np.tan(obliquity / 2.) ** 2
+    eqtime = 4. * np.degrees(
+        y * np.sin(2 * l0) - 2 * e * np.sin(m) +
+        4 * e * y * np.sin(m) * np.cos(2 * l0) -
+        0.5 * y * y * np.sin(4 * l0) - 1.25 * e * e * np.sin(2 * m))
+    return declination, eqtime
+
+
+def refraction(elevation):
+    '''
+    Return atmospheric refraction correction in degrees for the
+    geometric solar elevation in degrees
+    '''
+    te = np.tan(np.radians(elevation))
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        correction = np.select(
+            [elevation > 85., elevation > 5., elevation > -0.575],
+            [0., 58.1 / te - 0.07 / te ** 3 + 0.000086 / te ** 5,
+             1735. + elevation * (-518.2 + elevation * (
+                 103.4 + elevation * (-12.79 + elevation * 0.711)))],
+            -20.774 / te)
+    return correction / 3600.
+
+
+def solar_elevation(lat, lon, dtobj):
+    '''
+    Return solar elevation in degrees above the horizon, corrected for
+    atmospheric refraction, for arrays of latitudes and longitudes in
+    degrees at a single time dtobj
+    '''
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -89.8, 89.8)
+    lon = np.asarray(lon, dtype=np.float64)
+    if dtobj.tzinfo is not None:
+        dtobj = dtobj.astimezone(timezone.utc).replace(tzinfo=None)
+    declination, eqtime = sun_position(dtobj)
+    minutes = (dtobj.hour * 60. + dtobj.minute + dtobj.second / 60. +
+               dtobj.microsecond / 6e7)
+    true_solar_time = (minutes + eqtime + 4. * lon) % 1440.
+    hourangle = np.radians(true_solar_time / 4. - 180.)
+    csz = (np.sin(np.radians(lat)) * np.sin(np.radians(declination)) +
+           np.cos(np.radians(lat)) * np.cos(np.radians(declination)) *
+           np.cos(hourangle))
+    elevation = 90. - np.degrees(np.arccos(np.clip(csz, -1., 1.)))
+    return elevation + refraction(elevation)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+'''
+description:    NaN-aware spatial filtering of WRF fields
+license:        APACHE 2.0
+'''
+
+import numpy as np
+
+# mean of the 8 surrounding gridpoints
+KERNEL = np.array([[1, 1, 1], [1, 0, 1], [1, 1, 1]])
+
+
+def nan_convolve(data, kernel=KERNEL):
+    '''
+    Convolve the last two (south_north, west_east) axes of data with kernel
+    in a single vectorised pass over all leading (time/level) axes.
+    NaN (and masked) values are ignored by normalising with the sum of the
+    kernel weights of the valid neighbours. Values outside the domain are
+    treated as zeros and NaN values in data remain NaN in the result. Where
+    no valid neighbours are available the input value is returned.
+    This reproduces astropy.convolution.convolve with
+    nan_treatment='interpolate' and preserve_nan=True for every 2D slice.
+    '''
+    data = np.ma.filled(np.ma.asarray(data, dtype=np.float64), np.nan)
+    kernel = np.asarray(kernel, dtype=np.float64)
+    ky, kx = np.shape(kernel)
+    if not (ky % 2 and kx % 2):
+        raise ValueError('kernel should have an odd size in both dimensions')
+    valid = ~np.isnan(data)
+    # pad horizontal axes, values outside the domain are valid zeros
+    pad_width = ([(0, 0)] * (data.ndim - 2) +
+                 [(ky // 2, ky // 2), (kx // 2, kx // 2)])
+    values = np.pad(np.where(valid, data, 0), pad_width)
+    weights = np.pad(valid.astype(np.float64), pad_width, constant_values=1)
+    ny, nx = np.shape(data)[-2:]
+    total = np.zeros(np.shape(data))
+    norm = np.zeros(np.shape(data))
+    for j in range(ky):
+        for i in range(kx):
+            if kernel[j, i] == 0:
+                continue
+            total += kernel[j, i] * values[..., j:j + ny, i:i + nx]
+            norm += kernel[j, i] * weights[..., j:j + ny, i:i + nx]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = np.where(norm == 0, data, total / norm)
+    result[~valid] = np.nan
+    return result
+
+
+def spatial_filter(data, kernel=KERNEL):
+    '''
+    Apply spatial convolution filter to a 2D field or a 3D (time, y, x)
+    cube, other input is returned unchanged
+    '''
+    if np.ndim(data) in [2, 3]:
+        return nan_convolve(data, kernel)
+    else:
+        return data
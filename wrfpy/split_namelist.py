@@ -8,7 +8,6 @@ author:         Ronald van Haren, NLeSC (r.vanharen@esciencecenter.nl)
 
 import f90nml
 import copy
-import mpl_toolkits.basemap.pyproj as pyproj
 from wrfpy.config import config
 import os
 from wrfpy import utils
@@ -148,6 +147,7 @@ class split_nml_wps(split_nml_shared, config):
     '''
     Calculate the center of the second domain for running in UPP mode
     '''
+    import mpl_toolkits.basemap.pyproj as pyproj
     grid_ratio = self.nml['geogrid']['parent_grid_ratio'][1]
     i_start = self.nml['geogrid']['i_parent_start']
     j_start = self.nml['geogrid']['j_parent_start']
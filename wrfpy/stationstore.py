@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+
+'''
+description:    Consolidated store of urban station observations, queried
+                per time step with a binary search on memory-mapped arrays
+license:        APACHE 2.0
+'''
+
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+from netCDF4 import Dataset, date2num
+
+from wrfpy.readObsTemperature import (MAXDIFF, obs_stations, station_mask,
+                                      time_tolerance)
+
+VERSION = 2
+EPOCH = datetime(1970, 1, 1)
+ARRAYS = ['time', 'station', 'temperature']
+
+
+def to_seconds(times, units, calendar):
+    '''
+    Convert times in netCDF units to seconds since 1970-01-01
+    '''
+    epoch = date2num(EPOCH, units=units, calendar=calendar)
+    # length of a second in units, from a day to limit rounding errors
+    second = time_tolerance(units, calendar, seconds=86400) / 86400.
+    return (np.asarray(times, dtype=np.float64) - epoch) / second
+
+
+def sources(filelist):
+    '''
+    Return modification time and size of the station files
+    '''
+    return {filename: [os.path.getmtime(filename),
+                       os.path.getsize(filename)]
+            for filename in filelist}
+
+
+def ingest(storedir, filelist):
+    '''
+    Read all station files once and write the store to storedir:
+    a json table with the station metadata and arrays time (seconds since
+    1970-01-01), station (index in the table) and temperature, sorted by
+    time. Station files that cannot be read are skipped.
+    '''
+    stations, times, temperatures = [], [], []
+    for filename in sorted(filelist):
+        try:
+            obs = Dataset(filename, 'r')
+        except IOError:
+            continue
+        try:
+            try:
+                stationtype = obs.stationtype
+            except AttributeError:
+                stationtype = None
+            dt = obs.variables['time']
+            time = to_seconds(dt[:], dt.units, dt.calendar)
+            temperature = np.ma.filled(np.ma.asarray(
+                obs.variables['temperature'][:], dtype=np.float32),
+                np.nan)
+            lat = float(obs.variables['latitude'][0])
+            lon = float(obs.variables['longitude'][0])
+        except (AttributeError, KeyError, RuntimeError):
+            # incomplete station file
+            continue
+        finally:
+            obs.close()
+        if not len(time):
+            continue
+        stations.append({'name': filename, 'lat': lat, 'lon': lon,
+                         'stationtype': stationtype,
+                         'first': float(time.min()),
+                         'last': float(time.max())})
+        times.append(time)
+        temperatures.append(temperature)
+    index = [np.full(len(time), n, dtype=np.int32) for n, time in
+             enumerate(times)]
+    arrays = {'time': np.concatenate(times or [np.array([])]),
+              'station': np.concatenate(index or [np.array([], np.int32)]),
+              'temperature': np.concatenate(
+                  temperatures or [np.array([], np.float32)])}
+    order = np.lexsort((arrays['station'], arrays['time']))
+    if not os.path.isdir(storedir):
+        os.makedirs(storedir)
+    for name in ARRAYS:
+        tmpfile = os.path.join(storedir, name + '.npy.tmp')
+        with open(tmpfile, 'wb') as outfile:
+            np.save(outfile, arrays[name][order])
+        os.replace(tmpfile, os.path.join(storedir, name + '.npy'))
+    # metadata is written last, it marks the store complete
+    tmpfile = os.path.join(storedir, 'stations.json.tmp')
+    with open(tmpfile, 'w') as outfile:
+        json.dump({'version': VERSION, 'stations': stations,
+                   'sources': sources(filelist)}, outfile)
+    os.replace(tmpfile, os.path.join(storedir, 'stations.json'))
+
+
+class stationstore:
+    '''
+    Observations of all urban stations from a store written by ingest.
+    The arrays are memory-mapped, a query only reads the observations
+    within maxdiff of the requested time.
+    After use_files, only the station files of a file list are used and
+    the files that changed since the store was written are read directly.
+    '''
+    def __init__(self, storedir):
+        with open(os.path.join(storedir, 'stations.json'), 'r') as infile:
+            metadata = json.load(infile)
+        if metadata.get('version') != VERSION:
+            raise IOError('Unsupported station store version in %s' %
+                          storedir)
+        self.stations = metadata['stations']
+        self.sources = metadata['sources']
+        self.first = np.array([st['first'] for st in self.stations])
+        self.last = np.array([st['last'] for st in self.stations])
+        self.lat = np.array([st['lat'] for st in self.stations])
+        self.lon = np.array([st['lon'] for st in self.stations])
+        self.stationtypes = [st['stationtype'] for st in self.stations]
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(storedir,
+                                                     name + '.npy'),
+                                        mmap_mode='r'))
+        self.used = np.ones(len(self.stations), dtype=bool)
+        self.changed = []  # station files read directly
+
+    def use_files(self, filelist):
+        '''
+        Use the station files in filelist: stations that are unchanged
+        since the store was written are queried from the store, the
+        other files are read directly by obs
+        '''
+        unchanged = set()
+        self.changed = []
+        for filename in filelist:
+            try:
+                stat = [os.path.getmtime(filename),
+                        os.path.getsize(filename)]
+            except OSError:
+                stat = None
+            if stat is not None and stat == self.sources.get(filename):
+                unchanged.add(filename)
+            else:
+                self.changed.append(filename)
+        self.used = np.array([st['name'] in unchanged for st in
+                              self.stations], dtype=bool)
+
+    def current(self, filelist):
+        '''
+        Return True if the store was built from the station files in
+        filelist as they are now
+        '''
+        try:
+            return sources(filelist) == self.sources
+        except OSError:
+            return False
+
+    def select(self, dtobj, maxdiff=MAXDIFF):
+        '''
+        Return station indices and temperatures of the observation closest
+        to dtobj per station, selected as readObsTemperature.select_time
+        with maxdiff in seconds
+        '''
+        dtobj_num = (dtobj - EPOCH).total_seconds()
+        lo = np.searchsorted(self.time, dtobj_num - maxdiff, side='left')
+        hi = np.searchsorted(self.time, dtobj_num + maxdiff, side='right')
+        time = np.asarray(self.time[lo:hi])
+        station = np.asarray(self.station[lo:hi])
+        temperature = np.asarray(self.temperature[lo:hi])
+        # closest observation per station, the later one if equally close
+        order = np.lexsort((-time, np.abs(time - dtobj_num), station))
+        station, first = np.unique(station[order], return_index=True)
+        temperature = temperature[order][first]
+        # dtobj should be inside the time range of the station
+        inside = ((self.first[station] < dtobj_num) &
+                  (dtobj_num <= self.last[station]))
+        valid = inside & ~np.isnan(temperature)
+        return station[valid], temperature[valid]
+
+    def obs(self, dtobj, nstationtypes=None, dstationtypes=None):
+        '''
+        Return observations (lat, lon, temperature, stationtype,
+        stationname) of all stations at dtobj, followed by those of the
+        changed station files
+        '''
+        index, temperatures = self.select(dtobj)
+        used = self.used[index]
+        index, temperatures = index[used], temperatures[used]
+        mask = station_mask(self.lat[index], self.lon[index],
+                            [self.stationtypes[idx] for idx in index],
+                            dtobj, nstationtypes, dstationtypes)
+        obs = []
+        for idx, temperature in zip(index[mask], temperatures[mask]):
+            station = self.stations[idx]
+            obs.append((station['lat'], station['lon'], temperature,
+                        station['stationtype'], station['name']))
+        return obs + obs_stations(self.changed, dtobj, nstationtypes,
+                                  dstationtypes)
+
+
+def open_store(storedir, filelist):
+    '''
+    Return stationstore of storedir for the station files in filelist, or
+    None if there is no store. The store is not rebuilt here, that is done
+    by the ingest_stations task; station files that are new or changed
+    since then are read directly, see stationstore.use_files.
+    '''
+    try:
+        store = stationstore(storedir)
+    except (IOError, ValueError, KeyError):
+        print('No station store in ' + storedir + ', reading station files')
+        return None
+    store.use_files(filelist)
+    if store.changed:
+        print('Station store ' + storedir + ' is outdated, reading ' +
+              str(len(store.changed)) + ' station files')
+    return store
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+'''
+description:    Deaccumulation and time axis helpers for WRF output
+license:        APACHE 2.0
+'''
+
+import numpy as np
+from netCDF4 import date2num
+
+
+class deaccumulator:
+    '''
+    Deaccumulate a variable that is read in consecutive slabs (e.g. the
+    2-hourly WRF output files). The last record of the previous slab is
+    kept, so increments are continuous across slab boundaries.
+    The first record of the first slab is returned as is.
+    '''
+    def __init__(self, overlap=True):
+        # overlap: first record of each slab repeats the last record of
+        # the previous slab (the WRF output convention)
+        self.overlap = overlap
+        self.previous = None
+
+    def __call__(self, slab):
+        '''
+        Return increments of slab. For overlapping slabs the increments of
+        the repeated first record are not returned after the first slab.
+        '''
+        slab = np.ma.getdata(slab)
+        if self.previous is None:
+            # first slab: raw first record, increments of the others
+            increments = np.empty(np.shape(slab), dtype=slab.dtype)
+            increments[0] = slab[0]
+            np.subtract(slab[1:], slab[:-1], out=increments[1:])
+        elif self.overlap:
+            # increment over the join is computed from the repeated record
+            increments = np.subtract(slab[1:], slab[:-1])
+        else:
+            # increment over the join uses the previous last record
+            increments = np.empty(np.shape(slab), dtype=slab.dtype)
+            np.subtract(slab[0], self.previous, out=increments[0])
+            np.subtract(slab[1:], slab[:-1], out=increments[1:])
+        self.previous = slab[-1].copy()
+        return increments
+
+
+def time_axis(dt, units='minutes since 2010-01-01 00:00:00',
+              calendar='gregorian'):
+    '''
+    Convert a pandas DatetimeIndex to numeric time values in units.
+    Only the first date is converted by netCDF4, the other values are
+    offsets computed in a single vectorised operation.
+    '''
+    if not len(dt):
+        return np.array([], dtype=np.float64)
+    start = date2num(dt[0].to_pydatetime(), units=units, calendar=calendar)
+    # seconds per unit of the time axis
+    factors = {'seconds': 1., 'minutes': 60., 'hours': 3600.,
+               'days': 86400.}
+    factor = factors[units.split()[0].lower()]
+    offsets = np.asarray((dt - dt[0]).total_seconds(), dtype=np.float64)
+    return start + offsets / factor
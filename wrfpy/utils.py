@@ -54,6 +54,82 @@ def silentremove(filename):
                 raise  # re-raise exception if a different error occured
 
 
+def same_filesystem(src, dst):
+    '''
+    Return True if file src and (the directory of) dst are on the same
+    filesystem
+    '''
+    dst_dir = os.path.dirname(os.path.abspath(dst))
+    return os.stat(src).st_dev == os.stat(dst_dir).st_dev
+
+
+def reflink(src, dst):
+    '''
+    Create a copy-on-write clone of src at dst. Return False if reflinks
+    are not supported by the platform or filesystem.
+    '''
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    FICLONE = 0x40049409  # Linux ioctl to clone a file
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except (IOError, OSError):
+        silentremove(dst)
+        return False
+    return True
+
+
+def transfer_file(src, dst, strategy='copy'):
+    '''
+    Transfer file src to dst using strategy:
+        - copy: copy the file
+        - move: rename on the same filesystem, copy and remove otherwise
+        - hardlink: create a hard link, src and dst need to be on the
+          same filesystem
+        - reflink: copy-on-write clone if supported, copy otherwise
+        - copy-with-fallback: hard link if possible, reflink if supported,
+          copy otherwise
+    Return the strategy that was used for the transfer.
+    '''
+    import shutil
+    strategies = ['copy', 'move', 'hardlink', 'reflink',
+                  'copy-with-fallback']
+    if strategy not in strategies:
+        message = ('Unknown file transfer strategy %s, should be one of %s' %
+                   (strategy, ', '.join(strategies)))
+        logger.error(message)
+        raise ValueError(message)
+    # links cannot replace an existing file
+    silentremove(dst)
+    if strategy == 'move':
+        if same_filesystem(src, dst):
+            os.rename(src, dst)
+        else:
+            shutil.move(src, dst)
+        return 'move'
+    if strategy in ['hardlink', 'copy-with-fallback']:
+        if same_filesystem(src, dst):
+            try:
+                os.link(src, dst)
+                return 'hardlink'
+            except OSError:
+                if strategy == 'hardlink':
+                    raise
+        elif strategy == 'hardlink':
+            message = ('Unable to hard link %s to %s, files are on different '
+                       'filesystems' % (src, dst))
+            logger.error(message)
+            raise OSError(message)
+    if strategy in ['reflink', 'copy-with-fallback']:
+        if reflink(src, dst):
+            return 'reflink'
+    shutil.copyfile(src, dst)
+    return 'copy'
+
+
 def return_validate(date_text, format='%Y-%m-%d_%H'):
     '''
     validate date_text and return datetime.datetime object
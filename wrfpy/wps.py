@@ -15,7 +15,6 @@ import f90nml
 from wrfpy.config import config
 from datetime import datetime
 import shutil
-from netCDF4 import Dataset
 
 
 class wps(config):
@@ -175,6 +174,7 @@ class wps(config):
     '''
     run geogrid.exe (locally or using slurm script defined in config.json)
     '''
+    from netCDF4 import Dataset
     # get number of domains from wps namelist
     wps_nml = f90nml.read(self.config['options_wps']['namelist.wps'])
     ndoms = wps_nml['share']['max_dom']
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+
+'''
+description:    Time-appendable chunked array store in the Zarr (v2)
+                directory format with consolidated metadata
+license:        APACHE 2.0
+'''
+
+import itertools
+import json
+import os
+import zlib
+
+import numpy as np
+
+from wrfpy import utils
+
+
+class zarrstore:
+    '''
+    Chunked store of a single variable with its time, latitude and
+    longitude coordinates. Data is chunked along time and space and can be
+    appended in time, so a long time series at a point only needs a few
+    chunk reads. The store can be opened by any Zarr v2 reader, for
+    example xarray.open_zarr(path, consolidated=True).
+    '''
+    def __init__(self, path, complevel=4):
+        self.path = path
+        self.complevel = complevel
+        try:
+            with open(os.path.join(self.path, '.zmetadata'), 'r') as infile:
+                self.metadata = json.load(infile)['metadata']
+        except (IOError, ValueError):
+            # empty store
+            self.metadata = {}
+
+    def exists(self):
+        '''
+        Return True if the store has been created
+        '''
+        return '.zgroup' in self.metadata
+
+    def create(self, var, shape, chunks, lat, lon, attrs=None,
+               time_units='minutes since 2010-01-01 00:00:00'):
+        '''
+        Create an empty store for var with spatial shape (levels, y, x) or
+        (y, x) and chunks (time, levels, y, x) or (time, y, x)
+        '''
+        utils._create_directory(self.path)
+        self.metadata = {'.zgroup': {'zarr_format': 2},
+                         '.zattrs': {'history': 'Created by wrfpy'}}
+        if len(shape) == 3:
+            dims = ['time', 'bottom_top', 'south_north', 'west_east']
+        else:
+            dims = ['time', 'south_north', 'west_east']
+        self._create_array(var, [0] + list(shape), chunks, dims, attrs)
+        self._create_array('time', [0], [max(chunks[0], 8760)], ['time'],
+                           {'units': time_units, 'calendar': 'gregorian',
+                            'standard_name': 'time',
+                            'long_name': 'time in UTC'}, dtype='<f8')
+        for name, coord in [('latitude', lat), ('longitude', lon)]:
+            self._create_array(name, list(np.shape(coord)),
+                               list(np.shape(coord)),
+                               ['south_north', 'west_east'],
+                               {'standard_name': name})
+            self._write_region(name, 0, np.asarray(coord))
+        self._write_metadata()
+
+    def _create_array(self, name, shape, chunks, dims, attrs,
+                      dtype='<f4'):
+        '''
+        Define metadata of an array in the store
+        '''
+        utils._create_directory(os.path.join(self.path, name))
+        self.metadata[name + '/.zarray'] = {
+            'zarr_format': 2,
+            'shape': shape,
+            'chunks': [int(min(chunk, size)) if (size and i > 0) else
+                       int(chunk) for i, (chunk, size)
+                       in enumerate(zip(chunks, shape))],
+            'dtype': dtype,
+            'compressor': {'id': 'zlib', 'level': self.complevel},
+            'fill_value': 'NaN',
+            'order': 'C',
+            'filters': None,
+            'dimension_separator': '.'}
+        attrs = dict(attrs or {})
+        attrs['_ARRAY_DIMENSIONS'] = dims
+        self.metadata[name + '/.zattrs'] = attrs
+
+    def _write_metadata(self):
+        '''
+        Write metadata of all arrays and the consolidated metadata. The
+        consolidated metadata is written last, readers only see appended
+        data once it is complete.
+        '''
+        for key, value in self.metadata.items():
+            self._write_json(os.path.join(self.path, key), value)
+        self._write_json(os.path.join(self.path, '.zmetadata'),
+                         {'zarr_consolidated_format': 1,
+                          'metadata': self.metadata})
+
+    @staticmethod
+    def _write_json(filename, content):
+        '''
+        Replace json file in a single step
+        '''
+        with open(filename + '.tmp', 'w') as outfile:
+            json.dump(content, outfile, indent=4, sort_keys=True)
+        os.replace(filename + '.tmp', filename)
+
+    def _chunkfile(self, name, index):
+        return os.path.join(self.path, name, '.'.join(str(i) for i in index))
+
+    def _read_chunk(self, name, index):
+        '''
+        Return chunk of array name, filled with NaN if it does not exist
+        '''
+        meta = self.metadata[name + '/.zarray']
+        try:
+            with open(self._chunkfile(name, index), 'rb') as infile:
+                raw = zlib.decompress(infile.read())
+        except IOError:
+            return np.full(meta['chunks'], np.nan, dtype=meta['dtype'])
+        return np.frombuffer(raw, dtype=meta['dtype']).reshape(
+            meta['chunks']).copy()
+
+    def _write_chunk(self, name, index, chunk):
+        filename = self._chunkfile(name, index)
+        with open(filename + '.tmp', 'wb') as outfile:
+            outfile.write(zlib.compress(np.ascontiguousarray(chunk).tobytes(),
+                                        self.complevel))
+        os.replace(filename + '.tmp', filename)
+
+    def _write_region(self, name, start, data):
+        '''
+        Write data to array name starting at index start of the first
+        dimension. Chunks that are only partly covered by data are merged
+        with their existing content.
+        '''
+        meta = self.metadata[name + '/.zarray']
+        chunks = meta['chunks']
+        data = np.asarray(data, dtype=meta['dtype'])
+        end = start + len(data)
+        # chunk indices along the other dimensions
+        other = [range(int(np.ceil(float(size) / chunk)))
+                 for size, chunk in zip(np.shape(data)[1:], chunks[1:])]
+        for tchunk in range(start // chunks[0], (end - 1) // chunks[0] + 1):
+            lower = max(start, tchunk * chunks[0])
+            upper = min(end, (tchunk + 1) * chunks[0])
+            full = (upper - lower) == chunks[0]
+            for index in itertools.product(*other):
+                region = tuple(slice(i * chunk, (i + 1) * chunk)
+                               for i, chunk in zip(index, chunks[1:]))
+                block = data[(slice(lower - start, upper - start),) + region]
+                if full:
+                    chunk = np.full(chunks, np.nan, dtype=meta['dtype'])
+                else:
+                    chunk = self._read_chunk(name, (tchunk,) + index)
+                chunk[(slice(lower - tchunk * chunks[0],
+                             upper - tchunk * chunks[0]),) +
+                      tuple(slice(0, size) for size
+                            in np.shape(block)[1:])] = block
+                self._write_chunk(name, (tchunk,) + index, chunk)
+
+    def read(self, name, start=0, end=None):
+        '''
+        Read array name from index start to end of the first dimension
+        '''
+        meta = self.metadata[name + '/.zarray']
+        shape, chunks = meta['shape'], meta['chunks']
+        end = shape[0] if end is None else min(end, shape[0])
+        data = np.full([max(end - start, 0)] + shape[1:], np.nan,
+                       dtype=meta['dtype'])
+        if end <= start:
+            return data
+        other = [range(int(np.ceil(float(size) / chunk)))
+                 for size, chunk in zip(shape[1:], chunks[1:])]
+        for tchunk in range(start // chunks[0], (end - 1) // chunks[0] + 1):
+            lower = max(start, tchunk * chunks[0])
+            upper = min(end, (tchunk + 1) * chunks[0])
+            for index in itertools.product(*other):
+                chunk = self._read_chunk(name, (tchunk,) + index)
+                region = tuple(slice(i * chunk_size, min((i + 1) * chunk_size,
+                                                         size))
+                               for i, chunk_size, size
+                               in zip(index, chunks[1:], shape[1:]))
+                data[(slice(lower - start, upper - start),) + region] = chunk[
+                    (slice(lower - tchunk * chunks[0],
+                           upper - tchunk * chunks[0]),) +
+                    tuple(slice(0, r.stop - r.start) for r in region)]
+        return data
+
+    def time_step(self, times=None):
+        '''
+        Return the time step of the store, taken from the first records
+        in the store or else from times. Returns None if it is unknown.
+        '''
+        step = self.metadata['time/.zattrs'].get('time_step')
+        if step:
+            return step
+        stored = self.read('time', 0, 2)
+        for candidate in [stored, np.asarray(times)]:
+            if candidate is not None and len(candidate) > 1:
+                return float(candidate[1] - candidate[0])
+        return None
+
+    def append(self, var, data, times):
+        '''
+        Write records of var with time coordinate times (same units as
+        the store) at their place on the regular time axis of the store.
+        Records with a time that is already in the store are skipped, so
+        appending the same data twice or appending days that overlap at
+        midnight is safe. Records after a gap are written at their own
+        time, the missing records read back as NaN (also in time) until
+        they are appended, e.g. by a rerun of a failed day.
+        Raises ValueError for records before the first record in the
+        store or off its time step.
+        Appending to the same store from concurrent processes is not safe,
+        the metadata written last wins. The archive writes a separate
+        store per variable and domain from a single job.
+        '''
+        stored = self.read('time')
+        data = np.asarray(data)
+        times = np.asarray(times, dtype=np.float64)
+        if not len(times):
+            return 0
+        if np.any(np.diff(times) <= 0):
+            message = 'Times appended to %s are not increasing' % self.path
+            utils.logger.error(message)
+            raise ValueError(message)
+        step = self.time_step(times)
+        if not len(stored):
+            index = np.arange(len(times))
+        elif step is None:
+            # single records, only appending is possible
+            index = len(stored) + np.arange(len(times))
+            index[np.isin(times, stored)] = -1
+        else:
+            position = (times - stored[0]) / step
+            index = np.round(position).astype(int)
+            if (np.any(index < 0) or
+                    np.any(np.abs(position - index) > 1e-6)):
+                message = ('Times appended to %s are before %s or not on '
+                           'its time step %s' % (self.path, stored[0], step))
+                utils.logger.error(message)
+                raise ValueError(message)
+            # skip records that are stored already
+            inside = index < len(stored)
+            index[inside & (stored[np.minimum(index, len(stored) - 1)] ==
+                            times)] = -1
+        new = index >= 0
+        if not np.any(new):
+            return 0
+        data, times, index = data[new], times[new], index[new]
+        # write every contiguous block of records
+        blocks = np.split(np.arange(len(index)),
+                          np.nonzero(np.diff(index) != 1)[0] + 1)
+        for block in blocks:
+            self._write_region(var, index[block[0]], data[block])
+            self._write_region('time', index[block[0]], times[block])
+        # update shapes and time step once all data is written
+        length = max(len(stored), int(index[-1]) + 1)
+        self.metadata[var + '/.zarray']['shape'][0] = length
+        self.metadata['time/.zarray']['shape'][0] = length
+        if step is not None:
+            self.metadata['time/.zattrs']['time_step'] = step
+        self._write_metadata()
+        return len(times)